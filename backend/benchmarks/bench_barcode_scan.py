@@ -0,0 +1,96 @@
+"""Çok kasalı barkod okutma yükünde okutma-cevap gecikmesini ölçer
+
+Her kasa sırayla barkod okutur (çoğu popüler ürünlerden, bir kısmı
+bilinmeyen barkod) ve her --basket okutmada bir satış yapar; satışlar
+önbellekteki stok miktarlarını günceller. Aynı yük barkod önbelleği
+kapalı ve açık olarak çalıştırılır; sonunda önbellekteki miktarlar
+veritabanıyla karşılaştırılır.
+
+    cd backend
+    DB_NAME=stokcrm_bench python -m benchmarks.bench_barcode_scan --products 20000 --tills 8
+"""
+import argparse
+import asyncio
+import random
+
+from benchmarks.common import api_client, bench_user, fake_product, print_table, reset_db, server, summarize, timed
+
+
+async def seed(count, batch=5000):
+    await reset_db("products", "sales", "sales_daily", "sales_daily_product", "users")
+    for start in range(0, count, batch):
+        await server.db.products.insert_many([fake_product(i) for i in range(start, min(start + batch, count))])
+
+
+def scan_sequence(rng, products, scans, hot, unknown_rate):
+    """Okutmaların %80'i ilk `hot` üründen; unknown_rate oranında kayıtlı olmayan barkod"""
+    for _ in range(scans):
+        if rng.random() < unknown_rate:
+            yield f"000{rng.randrange(50):03d}"  # tartı etiketi, kupon vb. kayıtsız kodlar
+        elif rng.random() < 0.8:
+            yield f"869{rng.randrange(hot):010d}"
+        else:
+            yield f"869{rng.randrange(products):010d}"
+
+
+async def till(c, seed_value, args, samples):
+    rng = random.Random(seed_value)
+    basket = []
+    for barcode in scan_sequence(rng, args.products, args.scans, args.hot, args.unknown_rate):
+        resp, ms = await timed(c.get(f"/api/products/barcode/{barcode}"))
+        samples.append(ms)
+        if resp.status_code == 200:
+            product = resp.json()
+            basket.append({"product_id": product["id"], "name": product["name"], "quantity": 1,
+                           "price": product["sale_price"], "total": product["sale_price"]})
+        if len(basket) >= args.basket:
+            total = sum(item["total"] for item in basket)
+            sale = await c.post("/api/sales", json={"items": basket, "total_amount": total, "payment_method": "nakit"})
+            sale.raise_for_status()
+            basket = []
+
+
+async def run(c, args, cache_size):
+    server.BARCODE_CACHE_SIZE = cache_size
+    server.invalidate_barcodes()
+    server.barcode_cache.clear()
+    server.barcode_miss_cache.clear()
+    samples = []
+    await asyncio.gather(*(till(c, i, args, samples) for i in range(args.tills)))
+    return samples
+
+
+async def main(args):
+    await seed(args.products)
+    headers = await bench_user()
+    cache_size = server.BARCODE_CACHE_SIZE
+    async with api_client(headers) as c:
+        uncached = await run(c, args, 0)
+        for key in server.barcode_cache_stats:
+            server.barcode_cache_stats[key] = 0
+        cached = await run(c, args, cache_size)
+
+    print_table(f"Barkod okutma - {args.products} ürün, {args.tills} kasa x {args.scans} okutma", {
+        "önbelleksiz": summarize(uncached),
+        "önbellekli": summarize(cached),
+    })
+    cached_products = dict(server.barcode_cache.items())
+    stale = 0
+    async for product in server.db.products.find({"barcode": {"$in": list(cached_products)}}, {"barcode": 1, "quantity": 1}):
+        stale += cached_products[product["barcode"]].quantity != product["quantity"]
+    print(f"\nönbellekteki {len(cached_products)} üründen {stale} tanesinin miktarı veritabanından farklı")
+    stats = server.barcode_cache_stats
+    lookups = sum(stats.values()) or 1
+    print(f"isabet {stats['hits']}, negatif isabet {stats['negative_hits']}, ıskalama {stats['misses']} "
+          f"(isabet oranı %{100 * (stats['hits'] + stats['negative_hits']) / lookups:.1f})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=20_000)
+    parser.add_argument("--tills", type=int, default=8)
+    parser.add_argument("--scans", type=int, default=500, help="Kasa başına okutma")
+    parser.add_argument("--hot", type=int, default=200, help="Okutmaların %%80'inin geldiği popüler ürün sayısı")
+    parser.add_argument("--unknown-rate", type=float, default=0.05)
+    parser.add_argument("--basket", type=int, default=10, help="Satış başına okutma")
+    asyncio.run(main(parser.parse_args()))
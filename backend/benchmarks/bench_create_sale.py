@@ -0,0 +1,60 @@
+"""create_sale gecikmesini sepet boyutuna göre ölçer
+
+Transaction yolu için replica set gerekir:
+    cd backend
+    MONGO_URL="mongodb://localhost:27017/?replicaSet=rs0" DB_NAME=stokcrm_bench \\
+        python -m benchmarks.bench_create_sale --sizes 1 5 10 30 --runs 100
+"""
+import argparse
+import asyncio
+
+from benchmarks.common import api_client, bench_user, fake_product, print_table, reset_db, server, summarize, timed
+
+
+async def seed_products(count):
+    products = [fake_product(i, quantity=10_000_000) for i in range(count)]
+    await server.db.products.insert_many([dict(p) for p in products])
+    return products
+
+
+def cart(products, size):
+    return {
+        "items": [{
+            "product_id": p["id"],
+            "name": p["name"],
+            "quantity": 1,
+            "price": p["sale_price"],
+            "total": p["sale_price"],
+        } for p in products[:size]],
+        "total_amount": sum(p["sale_price"] for p in products[:size]),
+        "payment_method": "nakit",
+    }
+
+
+async def main(sizes, runs):
+    await reset_db("products", "sales", "users")
+    products = await seed_products(max(sizes))
+    headers = await bench_user()
+    transactional = await server.transactions_supported()
+
+    rows = {}
+    async with api_client(headers) as c:
+        for size in sizes:
+            body = cart(products, size)
+            samples = []
+            for _ in range(runs):
+                resp, ms = await timed(c.post("/api/sales", json=body))
+                resp.raise_for_status()
+                samples.append(ms)
+            rows[f"{size} kalem"] = summarize(samples)
+
+    mode = "transaction" if transactional else "transaction yok (standalone)"
+    print_table(f"POST /api/sales - {mode}", rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 5, 10, 30])
+    parser.add_argument("--runs", type=int, default=100)
+    args = parser.parse_args()
+    asyncio.run(main(args.sizes, args.runs))
@@ -0,0 +1,61 @@
+"""Müşteri aramasını 100k müşteri üzerinde ölçer
+
+Eski yöntem (name/phone üzerinde başa sabitlenmemiş, büyük/küçük harf
+duyarsız $regex) ile indeksli önek aramasını aynı sorgularla karşılaştırır.
+
+    cd backend
+    DB_NAME=stokcrm_bench python -m benchmarks.bench_customer_search --customers 100000
+"""
+import argparse
+import asyncio
+import random
+
+from benchmarks.common import api_client, bench_user, fake_customer, print_table, reset_db, server, summarize, timed
+
+QUERIES = ["ahm", "İsma", "şük", "yıl", "ışıl", "özge ç", "kara", "0532", "5321", "0212 5"]
+
+
+async def seed(count, batch=5000):
+    await reset_db("customers", "users")
+    rng = random.Random(42)
+    for start in range(0, count, batch):
+        await server.db.customers.insert_many([
+            fake_customer(rng, deleted=rng.random() < 0.02) for _ in range(min(batch, count - start))
+        ])
+
+
+async def legacy_search(q):
+    query = {
+        "$and": [
+            {"$or": [{"deleted": {"$exists": False}}, {"deleted": False}]},
+            {"$or": [{"name": {"$regex": q, "$options": "i"}}, {"phone": {"$regex": q, "$options": "i"}}]},
+        ]
+    }
+    return await server.db.customers.find(query, {"_id": 0}).to_list(100)
+
+
+async def main(customers, rounds):
+    await seed(customers)
+    headers = await bench_user()
+    legacy, indexed = [], []
+    async with api_client(headers) as c:
+        for _ in range(rounds):
+            for q in QUERIES:
+                _, ms = await timed(legacy_search(q))
+                legacy.append(ms)
+                resp, ms = await timed(c.get("/api/customers/search", params={"q": q}))
+                resp.raise_for_status()
+                indexed.append(ms)
+
+    print_table(f"Müşteri araması - {customers} müşteri, {len(QUERIES)} sorgu x {rounds}", {
+        "eski $regex (DB)": summarize(legacy),
+        "indeksli önek (API)": summarize(indexed),
+    })
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--customers", type=int, default=100_000)
+    parser.add_argument("--rounds", type=int, default=10)
+    args = parser.parse_args()
+    asyncio.run(main(args.customers, args.rounds))
@@ -0,0 +1,99 @@
+"""Talep tahmini ve sipariş noktası motorunun katalog ölçeğinde süresi
+
+Ürün başına farklı hızlarda, yıllık mevsimselliği olan Poisson talep
+üretilir. Önce yalnızca NumPy hesabı (forecast_demand) ölçülür; ardından
+--compute-only verilmediyse aynı geçmiş sales_daily_product'a yazılır ve
+run_demand_forecast uçtan uca (okuma, hesap, products'a yazma) çalıştırılır.
+
+    cd backend
+    DB_NAME=stokcrm_bench python -m benchmarks.bench_forecast --products 50000 --days 730 --compute-only
+    DB_NAME=stokcrm_bench python -m benchmarks.bench_forecast --products 50000 --days 730
+"""
+import argparse
+import asyncio
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from benchmarks.common import fake_product, reset_db, server
+
+
+def demand_history(products, days, seed, chunk=5_000):
+    """(ages, quantities, rows): sıfır olmayan (ürün, gün) satırları"""
+    rng = np.random.default_rng(seed)
+    # Çoğu ürün yavaş, az sayıda ürün hızlı satar
+    base = rng.lognormal(mean=-1.5, sigma=1.5, size=products)
+    phase = rng.uniform(0, 2 * np.pi, size=products)
+    amplitude = rng.uniform(0, 0.8, size=products)
+    age = np.arange(1, days + 1)
+    ages, quantities, rows = [], [], []
+    for start in range(0, products, chunk):
+        stop = min(start + chunk, products)
+        season = 1 + amplitude[start:stop, None] * np.sin(2 * np.pi * age / 364 + phase[start:stop, None])
+        counts = rng.poisson(base[start:stop, None] * season)
+        row, column = np.nonzero(counts)
+        ages.append(age[column])
+        quantities.append(counts[row, column].astype(np.float64))
+        rows.append(row + start)
+    return np.concatenate(ages), np.concatenate(quantities), np.concatenate(rows)
+
+
+async def seed(ids, ages, quantities, rows, batch=10_000):
+    await reset_db("products", "sales_daily_product")
+    now = datetime.now(timezone.utc)
+    today = now.date()
+    created_at = now - timedelta(days=int(ages.max(initial=1)))
+    for start in range(0, len(ids), batch):
+        await server.db.products.insert_many([
+            fake_product(index, now, id=product_id, quantity=50, min_quantity=10, created_at=created_at)
+            for index, product_id in enumerate(ids[start:start + batch], start=start)
+        ])
+    for start in range(0, len(ages), batch):
+        docs = []
+        for age, quantity, row in zip(ages[start:start + batch].tolist(), quantities[start:start + batch].tolist(),
+                                      rows[start:start + batch].tolist()):
+            day = (today - timedelta(days=age)).isoformat()
+            docs.append({"_id": f"{day}:{ids[row]}", "day": day, "product_id": ids[row], "product_name": "",
+                         "quantity": quantity, "revenue": quantity * 15, "cost": quantity * 10,
+                         "profit": quantity * 5, "costed_quantity": quantity})
+        await server.db.sales_daily_product.insert_many(docs, ordered=False)
+
+
+async def main(args):
+    started = time.perf_counter()
+    ages, quantities, rows = demand_history(args.products, args.days, args.seed)
+    print(f"{args.products} ürün x {args.days} gün: {len(ages)} satır üretildi ({time.perf_counter() - started:.1f} sn)")
+
+    available = np.full(args.products, args.days)
+    stock = np.full(args.products, 50.0)
+    timings = []
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        forecast = server.forecast_demand(ages, quantities, rows, available, stock)
+        timings.append(time.perf_counter() - started)
+    print(f"forecast_demand: en iyi {min(timings) * 1000:.0f} ms, ortanca {sorted(timings)[len(timings) // 2] * 1000:.0f} ms")
+    print(f"talebi olan ürün {np.count_nonzero(forecast['daily_demand'] > 0)}, "
+          f"ortanca sipariş noktası {np.median(forecast['reorder_point']):.0f}")
+
+    if args.compute_only:
+        return
+    ids = [str(uuid.uuid4()) for _ in range(args.products)]
+    started = time.perf_counter()
+    await seed(ids, ages, quantities, rows)
+    print(f"\nVeri yazıldı ({time.perf_counter() - started:.1f} sn)")
+    summary = await server.run_demand_forecast()
+    seconds = summary["seconds"]
+    print(f"run_demand_forecast: okuma {seconds['load']:.2f} sn, hesap {seconds['compute']:.2f} sn, "
+          f"yazma {seconds['write']:.2f} sn ({summary['history_rows']} geçmiş satırı)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=50_000)
+    parser.add_argument("--days", type=int, default=730)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=5, help="Hesabın tekrar sayısı")
+    parser.add_argument("--compute-only", action="store_true", help="Veritabanına yazmadan yalnızca NumPy hesabını ölç")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,114 @@
+"""Vardiya değişimindeki giriş fırtınası sırasında diğer endpoint'lerin gecikmesini ölçer
+
+Eşzamanlı /auth/login istekleri çalışırken barkod sorguları gönderir ve
+barkod sorgularının p50/p95/p99 değerlerini raporlar. --inline ile bcrypt
+event loop üzerinde çalıştırılır (eski davranış) ve karşılaştırma yapılabilir.
+
+    cd backend
+    DB_NAME=stokcrm_bench python -m benchmarks.bench_login_storm --logins 200 --concurrency 20
+"""
+import argparse
+import asyncio
+import time
+import uuid
+from datetime import datetime, timezone
+
+from benchmarks.common import api_client, bench_user, print_table, reset_db, server, summarize
+
+PASSWORD = "Bench123!"
+
+
+def use_inline_bcrypt():
+    async def hash_password(password):
+        return server.pwd_context.hash(password)
+
+    async def verify_password(plain_password, hashed_password):
+        return server.pwd_context.verify(plain_password, hashed_password)
+
+    server.hash_password = hash_password
+    server.verify_password = verify_password
+
+
+async def seed():
+    await reset_db("users", "products")
+    now = datetime.now(timezone.utc)
+    await server.db.products.insert_one({
+        "id": str(uuid.uuid4()), "name": "Bench", "barcode": "BENCH0001", "quantity": 10,
+        "min_quantity": 1, "brand": "Bench", "category": "Bench", "purchase_price": 1.0,
+        "sale_price": 2.0, "unit_type": "adet", "created_at": now, "updated_at": now,
+    })
+    await server.db.users.insert_one({
+        "id": str(uuid.uuid4()), "username": "bench-login", "role": "satış", "created_at": now,
+        "password": server.pwd_context.hash(PASSWORD),
+    })
+
+
+async def probe(c, stop, samples, interval=0.01):
+    """Sabit aralıklı barkod sorgusu; gecikme planlanan zamandan itibaren ölçülür,
+    böylece event loop'un bloklandığı süre de örneklere yansır"""
+    scheduled = time.perf_counter()
+    while not stop.is_set():
+        resp = await c.get("/api/products/barcode/BENCH0001")
+        resp.raise_for_status()
+        samples.append((time.perf_counter() - scheduled) * 1000)
+        scheduled += interval
+        await asyncio.sleep(max(0.0, scheduled - time.perf_counter()))
+    # Loop hiç sıra vermediyse gönderilemeyen planlı istekler de gecikme olarak sayılır
+    now = time.perf_counter()
+    while scheduled < now:
+        samples.append((now - scheduled) * 1000)
+        scheduled += interval
+
+
+async def login_storm(c, total, concurrency):
+    queue = asyncio.Queue()
+    for _ in range(total):
+        queue.put_nowait(None)
+
+    async def worker():
+        while not queue.empty():
+            queue.get_nowait()
+            resp = await c.post("/api/auth/login", json={"username": "bench-login", "password": PASSWORD})
+            resp.raise_for_status()
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+
+async def main(logins, concurrency, inline):
+    if inline:
+        use_inline_bcrypt()
+    await seed()
+    headers = await bench_user()
+
+    async with api_client(headers) as c:
+        idle = []
+        stop = asyncio.Event()
+        task = asyncio.create_task(probe(c, stop, idle))
+        await asyncio.sleep(2)
+        stop.set()
+        await task
+
+        storm = []
+        stop = asyncio.Event()
+        task = asyncio.create_task(probe(c, stop, storm))
+        start = time.perf_counter()
+        await login_storm(c, logins, concurrency)
+        elapsed = time.perf_counter() - start
+        stop.set()
+        await task
+
+    mode = "event loop üzerinde bcrypt" if inline else f"bcrypt havuzu ({server.password_executor._max_workers} worker)"
+    print_table(f"GET /api/products/barcode - {mode}", {
+        "boşta": summarize(idle),
+        f"{logins} giriş sırasında": summarize(storm),
+    })
+    print(f"\nGiriş hızı: {logins / elapsed:.1f}/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--inline", action="store_true", help="bcrypt'i event loop üzerinde çalıştır (eski davranış)")
+    args = parser.parse_args()
+    asyncio.run(main(args.logins, args.concurrency, args.inline))
@@ -0,0 +1,136 @@
+"""Benchmark yardımcıları
+
+Benchmark'lar gerçek bir MongoDB'ye yazar ve koleksiyonları temizler; bu
+yüzden yalnızca adında "bench" geçen bir DB_NAME ile çalışırlar.
+
+BENCH_MONGO=memory verilirse MongoDB yerine süreç içi mongomock-motor
+kullanılır (pip install mongomock-motor). Sonuçlar gerçek MongoDB ile
+karşılaştırılamaz ve $merge gibi bazı aşamalar desteklenmez; betiklerin
+veritabanı kurmadan denenmesi içindir.
+"""
+import os
+import sys
+import time
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+
+import httpx
+
+if "bench" not in os.environ.get("DB_NAME", ""):
+    sys.exit("DB_NAME adında 'bench' geçmeli (örn. DB_NAME=stokcrm_bench); benchmark veritabanını temizler.")
+
+import server  # noqa: E402
+
+if os.environ.get("BENCH_MONGO") == "memory":
+    try:
+        from mongomock_motor import AsyncMongoMockClient
+    except ImportError:
+        sys.exit("BENCH_MONGO=memory için mongomock-motor gerekli: pip install mongomock-motor")
+    server.client = AsyncMongoMockClient()
+    server.db = server.client[os.environ["DB_NAME"]]
+
+
+FIRST_NAMES = ["Ahmet", "Mehmet", "Ayşe", "Fatma", "İsmail", "Şükrü", "Ömer", "Gülşen", "Çağrı", "Irmak",
+               "Işıl", "Özge", "Ümit", "Emine", "Hüseyin", "İbrahim", "Zeynep", "Elif", "Burak", "Doğan"]
+LAST_NAMES = ["Yılmaz", "Kaya", "Demir", "Şahin", "Çelik", "Yıldız", "Yıldırım", "Öztürk", "Aydın", "Özdemir",
+              "Arslan", "Doğan", "Kılıç", "Aslan", "Çetin", "Kara", "Koç", "Kurt", "Özkan", "Şimşek"]
+
+
+def barcode(index):
+    return f"869{index:010d}"
+
+
+def fake_product(index, now=None, **fields):
+    """Benchmark ürünü; fields varsayılan alanların üzerine yazılır"""
+    now = now or datetime.now(timezone.utc)
+    product = {
+        "id": str(uuid.uuid4()),
+        "name": f"Ürün {index}",
+        "barcode": barcode(index),
+        "quantity": 1_000_000,
+        "min_quantity": 5,
+        "brand": f"Marka {index % 50}",
+        "category": f"Kategori {index % 20}",
+        "purchase_price": 10.0,
+        "sale_price": 15.0,
+        "unit_type": "adet",
+        "created_at": now,
+        "updated_at": now,
+        **fields,
+    }
+    product["is_low_stock"] = server.is_low_stock(product["quantity"], product["min_quantity"])
+    return product
+
+
+def fake_customer(rng, now=None, **fields):
+    name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+    phone = f"0{rng.choice(['532', '533', '542', '555', '212'])} {rng.randint(100, 999)} {rng.randint(10, 99)} {rng.randint(10, 99)}"
+    return {
+        "id": str(uuid.uuid4()),
+        "name": name,
+        "phone": phone,
+        "total_spent": 0.0,
+        "created_at": now or datetime.now(timezone.utc),
+        **server.customer_search_fields(name, phone),
+        **fields,
+    }
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(samples_ms):
+    return {
+        "count": len(samples_ms),
+        "p50": percentile(samples_ms, 50),
+        "p95": percentile(samples_ms, 95),
+        "p99": percentile(samples_ms, 99),
+        "max": max(samples_ms) if samples_ms else 0.0,
+    }
+
+
+def print_table(title, rows):
+    """rows: {etiket: summarize() çıktısı}"""
+    print(f"\n{title}")
+    print(f"{'':<24}{'n':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for label, s in rows.items():
+        print(f"{label:<24}{s['count']:>7}{s['p50']:>10.2f}{s['p95']:>10.2f}{s['p99']:>10.2f}{s['max']:>10.2f}")
+
+
+async def reset_db(*collections):
+    for name in collections:
+        await server.db[name].delete_many({})
+    await server.ensure_indexes()
+
+
+async def bench_user(role="yönetici"):
+    """Benchmark kullanıcısı oluşturur, Authorization başlığını döndürür"""
+    user_id = str(uuid.uuid4())
+    await server.db.users.insert_one({
+        "id": user_id,
+        "username": f"bench-{user_id[:8]}",
+        "password": "-",
+        "role": role,
+        "created_at": datetime.now(timezone.utc),
+    })
+    return {"Authorization": f"Bearer {server.create_access_token({'sub': user_id})}"}
+
+
+@asynccontextmanager
+async def api_client(headers=None):
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", headers=headers, timeout=60) as c:
+        yield c
+
+
+async def timed(coro):
+    """(sonuç, süre ms)"""
+    start = time.perf_counter()
+    result = await coro
+    return result, (time.perf_counter() - start) * 1000
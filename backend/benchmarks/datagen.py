@@ -0,0 +1,157 @@
+"""Sentetik veri üreteci
+
+Benchmark veritabanını gerçekçi hacimlerle doldurur: medikal ürün kataloğu,
+müşteriler ve geçmiş satışlar. Satışlardaki ürün seçimi popülerliğe göre
+çarpıktır (az sayıda ürün satışların çoğunu oluşturur), sepetler 1-8
+kalemlidir ve satışlar --days gün boyunca mesai saatlerine dağılır. Aynı
+--seed ile aynı veri üretilir. Günlük ve ürün-gün satış toplamları ile müşteri
+toplamları gün gün uygulamanın sale_totals'ı ile hesaplanıp yazılır, böylece
+dashboard ve raporlar ek işlem olmadan çalışır.
+
+    cd backend
+    DB_NAME=stokcrm_bench python -m benchmarks.datagen --products 100000 --customers 20000 --sales 2000000
+"""
+import argparse
+import asyncio
+import itertools
+import random
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+from pymongo import UpdateOne
+
+from benchmarks.common import fake_customer, fake_product, reset_db, server
+
+BRANDS = ["Medisana", "Omron", "Beurer", "Braun", "Microlife", "Rossmax", "Hartmann", "3M", "B. Braun",
+          "Bayer", "Abbott", "Roche", "Accu-Chek", "Contour", "Sensodyne", "Durex", "Molicare", "Tena",
+          "Seni", "Coloplast", "Convatec", "Essity", "Paul Hartmann", "Medline", "Smith & Nephew"]
+CATEGORIES = ["Tansiyon Aleti", "Ateş Ölçer", "Şeker Ölçüm", "Test Stribi", "Lanset", "Yara Bakım",
+              "Hasta Bezi", "Ortopedi", "Kompresyon Çorabı", "Nebulizatör", "Enjektör", "Eldiven",
+              "Maske", "Dezenfektan", "Bandaj", "Sonda", "Stoma", "Solunum", "Tekerlekli Sandalye", "Baston"]
+BASKET_SIZES = [1, 2, 3, 4, 5, 6, 8]
+BASKET_WEIGHTS = [40, 25, 14, 9, 6, 4, 2]
+
+
+def make_product(rng, index, now):
+    category = CATEGORIES[index % len(CATEGORIES)]
+    brand = rng.choice(BRANDS)
+    purchase_price = round(rng.lognormvariate(4, 1), 2)
+    return fake_product(
+        index, now,
+        name=f"{brand} {category} {index}",
+        quantity=rng.randint(0, 500),
+        min_quantity=rng.randint(5, 20),
+        brand=brand,
+        category=category,
+        purchase_price=purchase_price,
+        sale_price=round(purchase_price * rng.uniform(1.2, 1.8), 2),
+        description=None,
+        unit_type="kutu" if rng.random() < 0.2 else "adet",
+    )
+
+
+def make_sale(rng, products, popularity, customers, cashier_id, day_start):
+    picked = {p["id"]: p for p in rng.choices(products, cum_weights=popularity, k=rng.choices(BASKET_SIZES, BASKET_WEIGHTS)[0])}
+    items = []
+    for product in picked.values():
+        quantity = 1 if rng.random() < 0.8 else rng.randint(2, 5)
+        items.append({
+            "product_id": product["id"],
+            "name": product["name"],
+            "quantity": quantity,
+            "price": product["sale_price"],
+            "total": round(product["sale_price"] * quantity, 2),
+            "purchase_price": product["purchase_price"],
+        })
+    total = round(sum(item["total"] for item in items), 2)
+    discount = round(total * 0.05, 2) if rng.random() < 0.1 else 0
+    # Mesai saatleri (09:00-19:00 yerel, UTC+3)
+    created_at = day_start + timedelta(seconds=rng.randrange(6 * 3600, 16 * 3600))
+    return {
+        "id": str(uuid.uuid4()),
+        "items": items,
+        "total_amount": total,
+        "discount": discount,
+        "final_amount": round(total - discount, 2),
+        "payment_method": "nakit" if rng.random() < 0.6 else "kredi_karti",
+        "customer_id": rng.choice(customers)["id"] if customers and rng.random() < 0.3 else None,
+        "cashier_id": cashier_id,
+        "created_at": created_at,
+    }
+
+
+async def insert_batches(collection, docs, batch_size):
+    batch = []
+    for doc in docs:
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            await server.db[collection].insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        await server.db[collection].insert_many(batch, ordered=False)
+
+
+async def write_day(day_sales, batch_size):
+    """Bir günün satışlarını ve uygulamanın sale_totals'ı ile hesaplanan toplamlarını yazar"""
+    await insert_batches("sales", iter(day_sales), batch_size)
+    spent, days, product_days = server.sale_totals(day_sales)
+    # Gün yeni olduğundan toplamlar upsert yerine doğrudan eklenir
+    await server.db.sales_daily.insert_many([{"_id": day, **totals} for day, totals in days.items()])
+    await insert_batches("sales_daily_product", (
+        {"_id": f"{day}:{product_id}", "day": day, "product_id": product_id,
+         "product_name": rollup["name"], **rollup["totals"]}
+        for (day, product_id), rollup in product_days.items()
+    ), batch_size)
+    if spent:
+        await server.db.customers.bulk_write([
+            UpdateOne({"id": customer_id}, {"$inc": {"total_spent": amount}})
+            for customer_id, amount in spent.items()
+        ], ordered=False)
+
+
+async def generate(products=10_000, customers=5_000, sales=100_000, days=365, seed=42, batch_size=5_000, quiet=False):
+    """Koleksiyonları temizleyip sentetik veriyle doldurur; üretilen ürünleri döndürür"""
+    def log(message):
+        if not quiet:
+            print(message, flush=True)
+
+    await reset_db("products", "customers", "sales", "sales_daily", "sales_daily_product", "users")
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    started = time.perf_counter()
+
+    catalog = [make_product(rng, i, now) for i in range(products)]
+    await insert_batches("products", iter(catalog), batch_size)
+    log(f"{products} ürün ({time.perf_counter() - started:.1f} sn)")
+
+    people = [fake_customer(rng, now) for _ in range(customers)]
+    await insert_batches("customers", iter(people), batch_size)
+    log(f"{customers} müşteri ({time.perf_counter() - started:.1f} sn)")
+
+    # Zipf benzeri popülerlik: sıradaki ürünün ağırlığı 1 / sıra^1.1
+    popularity = list(itertools.accumulate(1 / (rank + 1) ** 1.1 for rank in range(products)))
+    start = (now - timedelta(days=days)).replace(hour=0, minute=0, second=0, microsecond=0)
+    cashier_id = str(uuid.uuid4())
+    # Satışlar gün gün üretilir: bir günün toplamları o gün bitince kesinleşir ve
+    # bellekte yalnızca bir günün satışları ile toplamları tutulur
+    per_day = Counter(rng.randrange(days) for _ in range(sales))
+    for day_index in range(days):
+        day_sales = [make_sale(rng, catalog, popularity, people, cashier_id, start + timedelta(days=day_index))
+                     for _ in range(per_day[day_index])]
+        if day_sales:
+            await write_day(day_sales, batch_size)
+    log(f"{sales} satış ve toplamları ({time.perf_counter() - started:.1f} sn)")
+    return catalog
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=10_000)
+    parser.add_argument("--customers", type=int, default=5_000)
+    parser.add_argument("--sales", type=int, default=100_000)
+    parser.add_argument("--days", type=int, default=365, help="Satışların dağıtılacağı geçmiş gün sayısı")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    asyncio.run(generate(args.products, args.customers, args.sales, args.days, args.seed))
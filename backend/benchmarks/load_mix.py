@@ -0,0 +1,246 @@
+"""Gerçekçi trafik karışımıyla yük testi
+
+--users sanal kullanıcı --duration saniye boyunca, ağırlıklara göre seçilen
+senaryoları arka arkaya çalıştırır: POS barkod okutma ve satış, müşteri
+araması, dashboard, ürün filtreleri, düşük stok listesi ve raporlar. Her
+endpoint için istek/sn ve p50/p95/p99 raporlanır.
+
+--save-baseline sonuçları JSON olarak kaydeder; --baseline ile verilen
+kayıtla karşılaştırılır ve p95'i --tolerance oranından fazla kötüleşen veya
+istek/sn'si aynı oranda düşen endpoint'ler gerileme sayılır (çıkış kodu 1).
+
+Veri önce datagen ile üretilir; --generate aynı süreçte üretir (BENCH_MONGO=memory
+ile zorunlu, çünkü bellek içi veri süreçler arasında kalıcı değildir).
+
+    cd backend
+    DB_NAME=stokcrm_bench python -m benchmarks.datagen --products 100000 --sales 2000000
+    DB_NAME=stokcrm_bench python -m benchmarks.load_mix --duration 60 --users 16 \\
+        --save-baseline benchmarks/baselines/local.json
+    DB_NAME=stokcrm_bench python -m benchmarks.load_mix --duration 60 --users 16 \\
+        --baseline benchmarks/baselines/local.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+from benchmarks import datagen
+from benchmarks.common import api_client, bench_user, percentile, server
+
+SAMPLE_SIZE = 5_000
+SEARCH_PREFIXES = ["ahm", "meh", "ayş", "fat", "işıl", "ömer", "yıl", "kara", "özd", "0532", "0555 1"]
+
+
+async def load_context():
+    """Senaryoların kullandığı örnek barkodlar ve ürünler"""
+    products = await server.db.products.find(
+        {}, {"_id": 0, "id": 1, "name": 1, "barcode": 1, "sale_price": 1, "brand": 1, "category": 1}
+    ).limit(SAMPLE_SIZE).to_list(None)
+    if not products:
+        sys.exit("Veritabanında ürün yok: önce 'python -m benchmarks.datagen' çalıştırın veya --generate verin")
+    return {"products": products, "hot": products[:max(1, len(products) // 50)]}
+
+
+def report_range(rng):
+    end = datetime.now(timezone.utc)
+    start = end - timedelta(days=rng.choice([1, 7, 30]))
+    return {"start_date": start.isoformat(), "end_date": end.isoformat()}
+
+
+async def scan(c, ctx, rng):
+    # Okutmaların %80'i popüler ürünler, %5'i kayıtsız barkod
+    if rng.random() < 0.05:
+        return await c.get(f"/api/products/barcode/000{rng.randrange(50):03d}"), (200, 404)
+    product = rng.choice(ctx["hot"] if rng.random() < 0.8 else ctx["products"])
+    return await c.get(f"/api/products/barcode/{product['barcode']}"), (200,)
+
+
+async def sale(c, ctx, rng):
+    products = {p["id"]: p for p in rng.sample(ctx["hot"], min(len(ctx["hot"]), rng.choice([1, 2, 3, 5])))}
+    items = [{"product_id": p["id"], "name": p["name"], "quantity": 1, "price": p["sale_price"],
+              "total": p["sale_price"]} for p in products.values()]
+    body = {"items": items, "total_amount": sum(i["total"] for i in items), "payment_method": "nakit"}
+    # 409: stok yetmedi, beklenen iş sonucu
+    return await c.post("/api/sales", json=body), (200, 409)
+
+
+async def customer_search(c, ctx, rng):
+    return await c.get("/api/customers/search", params={"q": rng.choice(SEARCH_PREFIXES)}), (200,)
+
+
+async def dashboard(c, ctx, rng):
+    return await c.get("/api/reports/dashboard"), (200,)
+
+
+async def filters(c, ctx, rng):
+    return await c.get("/api/products/filters"), (200,)
+
+
+async def low_stock(c, ctx, rng):
+    return await c.get("/api/products/low-stock"), (200,)
+
+
+async def top_selling(c, ctx, rng):
+    return await c.get("/api/reports/top-selling", params=report_range(rng)), (200,)
+
+
+async def top_profit(c, ctx, rng):
+    return await c.get("/api/reports/top-profit", params=report_range(rng)), (200,)
+
+
+async def stock_report(c, ctx, rng):
+    product = rng.choice(ctx["products"])
+    return await c.get("/api/reports/stock", params={"category": product["category"]}), (200,)
+
+
+async def product_page(c, ctx, rng):
+    return await c.get("/api/products", params={"limit": 50}), (200,)
+
+
+# (ad, senaryo, ağırlık)
+SCENARIOS = [
+    ("GET barcode", scan, 50),
+    ("POST sales", sale, 10),
+    ("GET customers/search", customer_search, 10),
+    ("GET reports/dashboard", dashboard, 8),
+    ("GET products/filters", filters, 5),
+    ("GET products?limit=50", product_page, 5),
+    ("GET products/low-stock", low_stock, 4),
+    ("GET reports/top-selling", top_selling, 3),
+    ("GET reports/top-profit", top_profit, 3),
+    ("GET reports/stock", stock_report, 2),
+]
+
+
+async def virtual_user(c, ctx, seed, deadline, samples, errors):
+    rng = random.Random(seed)
+    names = [name for name, _, _ in SCENARIOS]
+    weights = [weight for _, _, weight in SCENARIOS]
+    scenarios = {name: scenario for name, scenario, _ in SCENARIOS}
+    while time.perf_counter() < deadline:
+        name = rng.choices(names, weights)[0]
+        start = time.perf_counter()
+        try:
+            resp, expected = await scenarios[name](c, ctx, rng)
+            ok = resp.status_code in expected
+        except Exception:
+            ok = False
+        elapsed = (time.perf_counter() - start) * 1000
+        samples.setdefault(name, []).append(elapsed)
+        if not ok:
+            errors[name] = errors.get(name, 0) + 1
+
+
+def summarize_run(samples, errors, duration):
+    results = {}
+    for name, _, _ in SCENARIOS:
+        values = samples.get(name, [])
+        results[name] = {
+            "count": len(values),
+            "rps": len(values) / duration,
+            "errors": errors.get(name, 0),
+            "p50": percentile(values, 50),
+            "p95": percentile(values, 95),
+            "p99": percentile(values, 99),
+        }
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Endpoint başına gerileme açıklamaları"""
+    regressions = {}
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous or not previous["count"] or not current["count"]:
+            continue
+        reasons = []
+        # 1 ms altındaki farklar ölçüm gürültüsü sayılır
+        if current["p95"] > previous["p95"] * (1 + tolerance) and current["p95"] - previous["p95"] > 1:
+            reasons.append(f"p95 {previous['p95']:.1f} -> {current['p95']:.1f} ms")
+        if current["rps"] < previous["rps"] * (1 - tolerance):
+            reasons.append(f"istek/sn {previous['rps']:.1f} -> {current['rps']:.1f}")
+        if reasons:
+            regressions[name] = ", ".join(reasons)
+    return regressions
+
+
+def print_results(title, results, baseline=None):
+    print(f"\n{title}")
+    header = f"{'':<26}{'n':>7}{'istek/sn':>10}{'hata':>6}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+    print(header + (f"{'p95 fark':>10}" if baseline else ""))
+    for name, r in results.items():
+        line = f"{name:<26}{r['count']:>7}{r['rps']:>10.1f}{r['errors']:>6}{r['p50']:>9.2f}{r['p95']:>9.2f}{r['p99']:>9.2f}"
+        previous = (baseline or {}).get(name)
+        if previous and previous["p95"]:
+            line += f"{(r['p95'] / previous['p95'] - 1) * 100:>+9.0f}%"
+        print(line)
+    total = sum(r["count"] for r in results.values())
+    print(f"{'toplam':<26}{total:>7}{sum(r['rps'] for r in results.values()):>10.1f}{sum(r['errors'] for r in results.values()):>6}")
+
+
+async def main(args):
+    if args.generate:
+        await datagen.generate(args.products, args.customers, args.sales, seed=args.seed)
+    elif os.environ.get("BENCH_MONGO") == "memory":
+        sys.exit("BENCH_MONGO=memory ile --generate gerekli")
+
+    ctx = await load_context()
+    headers = await bench_user()
+    samples, errors = {}, {}
+    async with api_client(headers) as c:
+        if args.warmup:
+            warmup_deadline = time.perf_counter() + args.warmup
+            await asyncio.gather(*(virtual_user(c, ctx, -i - 1, warmup_deadline, {}, {}) for i in range(args.users)))
+        started = time.perf_counter()
+        deadline = started + args.duration
+        await asyncio.gather(*(virtual_user(c, ctx, args.seed + i, deadline, samples, errors) for i in range(args.users)))
+        duration = time.perf_counter() - started
+
+    results = summarize_run(samples, errors, duration)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["endpoints"]
+    print_results(f"Trafik karışımı - {args.users} kullanıcı, {duration:.0f} sn", results, baseline)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.save_baseline) or ".", exist_ok=True)
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump({
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "settings": {"users": args.users, "duration": args.duration, "seed": args.seed,
+                             "mongo": os.environ.get("BENCH_MONGO", "mongodb"), "python": platform.python_version()},
+                "endpoints": results,
+            }, f, indent=2, ensure_ascii=False)
+        print(f"\nBaseline kaydedildi: {args.save_baseline}")
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print("\n❌ Gerileme:")
+            for name, reason in regressions.items():
+                print(f"  {name}: {reason}")
+            return 1
+        print(f"\n✅ Baseline'a göre %{args.tolerance * 100:.0f}'den fazla gerileme yok")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=16, help="Eşzamanlı sanal kullanıcı")
+    parser.add_argument("--duration", type=float, default=60, help="Ölçüm süresi (sn)")
+    parser.add_argument("--warmup", type=float, default=5, help="Ölçüme dahil edilmeyen ısınma süresi (sn)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--baseline", help="Karşılaştırılacak baseline JSON dosyası")
+    parser.add_argument("--save-baseline", help="Sonuçların yazılacağı baseline JSON dosyası")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="İzin verilen kötüleşme oranı")
+    parser.add_argument("--generate", action="store_true", help="Önce datagen ile veri üret")
+    parser.add_argument("--products", type=int, default=10_000)
+    parser.add_argument("--customers", type=int, default=5_000)
+    parser.add_argument("--sales", type=int, default=100_000)
+    sys.exit(asyncio.run(main(parser.parse_args())))
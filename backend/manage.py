@@ -0,0 +1,112 @@
+"""Yönetim komutları
+
+Kullanım:
+    python manage.py ensure-indexes
+    python manage.py verify-indexes
+    python manage.py backfill-sale-costs
+    python manage.py rebuild-daily-totals
+    python manage.py rebuild-product-daily-totals
+    python manage.py migrate-images
+    python manage.py migrate-dates
+    python manage.py index-customers
+    python manage.py refresh-low-stock
+    python manage.py forecast-demand
+"""
+import argparse
+import asyncio
+import json
+import sys
+
+import server
+
+
+async def ensure_indexes(args):
+    await server.ensure_indexes()
+
+
+async def verify_indexes(args):
+    try:
+        report = await server.verify_query_plans()
+    except RuntimeError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+    for row in report:
+        print(f"{row['collection']:<16} {json.dumps(row['query'])} -> {' > '.join(row['stages'])}")
+    print("✅ COLLSCAN yok")
+
+
+async def backfill_sale_costs(args):
+    updated = await server.backfill_sale_costs()
+    print(f"✅ {updated} satışa maliyet bilgisi yazıldı")
+
+
+async def rebuild_daily_totals(args):
+    await server.rebuild_daily_totals()
+    print("✅ Günlük satış toplamları yeniden hesaplandı")
+
+
+async def rebuild_product_daily_totals(args):
+    await server.rebuild_product_daily_totals()
+    print("✅ Ürün-gün satış toplamları yeniden hesaplandı")
+
+
+async def migrate_images(args):
+    migrated = await server.migrate_product_images()
+    print(f"✅ {migrated} ürün görseli görsel deposuna taşındı")
+
+
+async def migrate_dates(args):
+    converted = await server.migrate_dates()
+    for field, count in converted.items():
+        print(f"{field:<28} {count}")
+    print("✅ Metin tarihler BSON date'e çevrildi")
+
+
+async def index_customers(args):
+    updated = await server.index_customers()
+    print(f"✅ {updated} müşteriye arama alanları yazıldı")
+
+
+async def refresh_low_stock(args):
+    updated = await server.refresh_low_stock_flags()
+    print(f"✅ {updated} ürünün düşük stok bayrağı güncellendi")
+
+
+async def forecast_demand(args):
+    summary = await server.run_demand_forecast()
+    seconds = summary["seconds"]
+    print(f"{summary['products']} ürün, {summary['history_rows']} geçmiş satırı "
+          f"(okuma {seconds['load']:.2f} sn, hesap {seconds['compute']:.2f} sn, yazma {seconds['write']:.2f} sn)")
+    print(f"✅ {summary['with_demand']} ürünün talebi var, {summary['below_reorder_point']} ürün sipariş noktasında")
+
+
+COMMANDS = {
+    "ensure-indexes": (ensure_indexes, "INDEXES kayıt defterindeki indeksleri oluşturur"),
+    "verify-indexes": (verify_indexes, "Sık sorguların explain() planlarında COLLSCAN arar"),
+    "backfill-sale-costs": (backfill_sale_costs, "Eski satış kalemlerine maliyet (purchase_price) yazar"),
+    "rebuild-daily-totals": (rebuild_daily_totals, "Dashboard'un okuduğu günlük satış toplamlarını yeniden hesaplar"),
+    "rebuild-product-daily-totals": (rebuild_product_daily_totals, "Satış raporlarının okuduğu ürün-gün toplamlarını yeniden hesaplar"),
+    "migrate-images": (migrate_images, "Ürünlerdeki base64 görselleri GridFS görsel deposuna taşır"),
+    "migrate-dates": (migrate_dates, "ISO metin olarak saklanmış tarihleri BSON date'e çevirir"),
+    "index-customers": (index_customers, "Müşteri araması için normalize isim/telefon alanlarını yazar"),
+    "refresh-low-stock": (refresh_low_stock, "Ürünlerin is_low_stock ve needs_reorder bayraklarını yeniden hesaplar"),
+    "forecast-demand": (forecast_demand, "Talep tahminiyle ürünlerin önerilen sipariş noktasını ve kalan gününü yazar"),
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stok CRM yönetim komutları")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    for name, (_, help_text) in COMMANDS.items():
+        subparsers.add_parser(name, help=help_text)
+
+    args = parser.parse_args(argv)
+    handler, _ = COMMANDS[args.command]
+    try:
+        return asyncio.run(handler(args)) or 0
+    finally:
+        server.client.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
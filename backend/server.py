@@ -1,13 +1,29 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, UploadFile, File, Query
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, UploadFile, File, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from fastapi.routing import APIRoute
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+from starlette.exceptions import HTTPException as StarletteHTTPException
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorGridFSBucket
+from pymongo import ASCENDING, DESCENDING, IndexModel, InsertOne, ReturnDocument, UpdateOne
+from pymongo import monitoring
+from pymongo.errors import BulkWriteError, CollectionInvalid, DuplicateKeyError
+import gridfs
 import os
+import re
+import json
+import math
+import unicodedata
+import csv
+import tempfile
+import hashlib
+import binascii
 import logging
+import time
 from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict
-from typing import List, Optional
+from pydantic import BaseModel, Field, ConfigDict, ValidationError
+from typing import List, Optional, Tuple
 import uuid
 from datetime import datetime, timezone, timedelta
 from passlib.context import CryptContext
@@ -16,19 +32,137 @@ from emergentintegrations.llm.chat import LlmChat, UserMessage
 import aiohttp
 import asyncio
 import base64
-from io import BytesIO
-from PIL import Image
+import random
+import secrets
+import numpy as np
+from collections import deque
+from itertools import islice
+from statistics import NormalDist
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO, StringIO
+from PIL import Image, ImageOps, UnidentifiedImageError
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Gauge, Histogram, disable_created_metrics, generate_latest
+from cachetools import TTLCache
+from openpyxl import Workbook, load_workbook
+from starlette.background import BackgroundTask
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+# Metrics
+# /metrics Prometheus metin formatında route başına istek süreleri, koleksiyon
+# başına Mongo komut süreleri ve dış servis çağrı sürelerini verir. Metrikler
+# prometheus_client'ın varsayılan registry'sindedir; pymongo dinleyicileri
+# Motor'un thread havuzundan çağrılır, prometheus_client thread-safe'tir.
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+MONGO_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+EXTERNAL_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+# Seri sayısını artıran *_created zaman damgaları yayınlanmaz
+disable_created_metrics()
+
+http_request_seconds = Histogram(
+    "http_request_duration_seconds", "API request duration by route template.",
+    ("method", "route", "status"), buckets=LATENCY_BUCKETS
+)
+http_in_flight = Gauge("http_requests_in_flight", "API requests currently being served.", ("method", "route"))
+mongo_command_seconds = Histogram(
+    "mongodb_command_duration_seconds", "MongoDB command duration by collection.",
+    ("collection", "command", "outcome"), buckets=MONGO_BUCKETS
+)
+external_call_seconds = Histogram(
+    "external_call_duration_seconds", "Outbound call duration by service.",
+    ("service", "outcome"), buckets=EXTERNAL_BUCKETS
+)
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Sürücünün komut olaylarından koleksiyon başına süre; yavaş sorgular
+    profil kaydı için ayrıca bildirilir"""
+    def __init__(self):
+        self.pending = {}  # request_id -> (koleksiyon, komut, explain edilebilir komut)
+    
+    def started(self, event):
+        name = event.command_name
+        # find/aggregate/update... ilk alanda, getMore "collection" alanında koleksiyon adı taşır
+        collection = event.command.get("collection" if name == "getMore" else name)
+        collection = collection if isinstance(collection, str) else ""
+        profiled = SLOW_QUERY_THRESHOLD_MS > 0 and name in EXPLAINABLE_COMMANDS and collection != "slow_queries"
+        self.pending[event.request_id] = (collection, name, event.command if profiled else None)
+    
+    def succeeded(self, event):
+        self.finish(event, "ok")
+    
+    def failed(self, event):
+        self.finish(event, "error")
+    
+    def finish(self, event, outcome: str):
+        pending = self.pending.pop(event.request_id, None)
+        if pending:
+            collection, name, command = pending
+            mongo_command_seconds.labels(collection, name, outcome).observe(event.duration_micros / 1_000_000)
+            if command is not None and outcome == "ok" and event.duration_micros >= SLOW_QUERY_THRESHOLD_MS * 1000:
+                report_slow_query(collection, name, command, event.duration_micros / 1000)
+
+class MetricsRoute(APIRoute):
+    """Route şablonu başına süre ve eşzamanlı istek sayısı. Akıtılan yanıtlarda
+    süre son parça gönderilene kadardır; SSE akışları süre histogramına girmez."""
+    async def handle(self, scope, receive, send):
+        in_flight = http_in_flight.labels(scope["method"], self.path_format)
+        response = {"status": 500, "event_stream": False}
+        
+        async def timed_send(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["event_stream"] = any(
+                    key == b"content-type" and value.startswith(b"text/event-stream")
+                    for key, value in message.get("headers", ())
+                )
+            await send(message)
+        
+        in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await super().handle(scope, receive, timed_send)
+        except StarletteHTTPException as e:
+            # 405 gibi route dışında yanıtlanan hatalar
+            response["status"] = e.status_code
+            raise
+        finally:
+            in_flight.dec()
+            if not response["event_stream"]:
+                http_request_seconds.labels(scope["method"], self.path_format, str(response["status"])).observe(
+                    time.perf_counter() - started
+                )
+
+@contextmanager
+def external_call(service: str):
+    """Bloğun süresini servis ve sonuca göre kaydeder. Hata fırlatan bloklar
+    error sayılır; çağıran başarısız yanıtları call["outcome"] ile işaretler."""
+    call = {"outcome": "ok"}
+    started = time.perf_counter()
+    try:
+        yield call
+    except BaseException:
+        call["outcome"] = "error"
+        raise
+    finally:
+        external_call_seconds.labels(service, call["outcome"]).observe(time.perf_counter() - started)
+
 # MongoDB connection
+# Tarihler BSON date olarak saklanır; tz_aware ile okunan değerler UTC'dir
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(mongo_url, tz_aware=True, tzinfo=timezone.utc, event_listeners=[MongoCommandMetrics()])
 db = client[os.environ['DB_NAME']]
 
 # Security
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# bcrypt her çağrıda ~250 ms CPU harcar; event loop'u bloklamaması için ayrı
+# thread havuzunda ve en fazla PASSWORD_HASH_WORKERS eşzamanlı olarak çalışır
+password_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get('PASSWORD_HASH_WORKERS', 2)),
+    thread_name_prefix="bcrypt"
+)
 security = HTTPBearer()
 JWT_SECRET = os.environ.get('JWT_SECRET')
 JWT_ALGORITHM = os.environ.get('JWT_ALGORITHM', 'HS256')
@@ -38,7 +172,7 @@ JWT_EXPIRATION = int(os.environ.get('JWT_EXPIRATION_HOURS', 168))
 app = FastAPI()
 
 # Create a router with the /api prefix
-api_router = APIRouter(prefix="/api")
+api_router = APIRouter(prefix="/api", route_class=MetricsRoute)
 
 # Models
 class User(BaseModel):
@@ -76,9 +210,13 @@ class Product(BaseModel):
     purchase_price: float
     sale_price: float
     description: Optional[str] = None
-    image_url: Optional[str] = None
+    image_url: Optional[str] = None  # /api/images/{sha256}
+    thumbnail_url: Optional[str] = None  # /api/images/{sha256}/thumbnail
     unit_type: str = "adet"  # adet veya kutu
     package_quantity: Optional[int] = None  # Kutu içeriği adedi (sadece kutu için)
+    reorder_point: Optional[int] = None  # Talep tahmininin önerdiği sipariş noktası (bkz. run_demand_forecast)
+    days_of_cover: Optional[float] = None  # Güncel stoğun tahmini talep hızıyla kaç gün yeteceği
+    needs_reorder: bool = False  # Talebi olan ürünün stoğu sipariş noktasına indi (bkz. REORDER_FLAG)
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
@@ -113,13 +251,14 @@ class ProductUpdate(BaseModel):
 class Sale(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    items: List[dict]  # [{product_id, name, quantity, price, total}]
+    items: List[dict]  # [{product_id, name, quantity, price, total, purchase_price}]
     total_amount: float
     discount: float = 0
     final_amount: float
     payment_method: str  # nakit, kredi_karti
     customer_id: Optional[str] = None
     cashier_id: str
+    client_sale_id: Optional[str] = None  # çevrimdışı kuyruktan gelen satışlarda cihazın verdiği id
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class SaleCreate(BaseModel):
@@ -128,6 +267,15 @@ class SaleCreate(BaseModel):
     discount: float = 0
     payment_method: str
     customer_id: Optional[str] = None
+    # Kasa ilk denemeden önce üretir; cevap kaybolup satış tekrar gönderilirse ikinci kez kaydedilmez
+    client_sale_id: Optional[str] = Field(None, min_length=1, max_length=100)
+
+class SaleSyncItem(SaleCreate):
+    client_sale_id: str = Field(..., min_length=1, max_length=100)
+    created_at: Optional[datetime] = None  # satışın cihazda yapıldığı an
+
+class SaleSyncRequest(BaseModel):
+    sales: List[SaleSyncItem]
 
 class Customer(BaseModel):
     model_config = ConfigDict(extra="ignore")
@@ -164,12 +312,25 @@ class CalendarEventCreate(BaseModel):
     date: datetime
     alarm: bool = False
 
+class CatalogJobCreate(BaseModel):
+    """Katalog üzerinde çalışan toplu işlerin ürün filtresi"""
+    brand: Optional[str] = None
+    category: Optional[str] = None
+    
+    def product_query(self) -> dict:
+        return {key: value for key, value in (("brand", self.brand), ("category", self.category)) if value}
+
+class PriceComparisonJobCreate(CatalogJobCreate):
+    refresh: bool = False
+
 # Helper functions
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+async def hash_password(password: str) -> str:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(password_executor, pwd_context.hash, password)
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(password_executor, pwd_context.verify, plain_password, hashed_password)
 
 def create_access_token(data: dict) -> str:
     to_encode = data.copy()
@@ -177,6 +338,19 @@ def create_access_token(data: dict) -> str:
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, JWT_SECRET, algorithm=JWT_ALGORITHM)
 
+# Authenticated user cache
+# Her istekte users koleksiyonuna gitmemek için kısa ömürlü LRU önbellek.
+# Silme ve rol değişikliğinde invalidate_user() çağrılır; birden fazla
+# worker çalışıyorsa diğer worker'lar en geç TTL sonunda güncellenir.
+user_cache = TTLCache(
+    maxsize=int(os.environ.get('USER_CACHE_SIZE', 1024)),
+    ttl=int(os.environ.get('USER_CACHE_TTL_SECONDS', 60))
+)
+user_cache_stats = {"hits": 0, "misses": 0}
+
+def invalidate_user(user_id: str):
+    user_cache.pop(user_id, None)
+
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     try:
         token = credentials.credentials
@@ -184,15 +358,73 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
         user_id = payload.get("sub")
         if user_id is None:
             raise HTTPException(status_code=401, detail="Invalid token")
-        user = await db.users.find_one({"id": user_id}, {"_id": 0})
-        if user is None:
+        user = user_cache.get(user_id)
+        if user is not None:
+            user_cache_stats["hits"] += 1
+            return user
+        user_cache_stats["misses"] += 1
+        doc = await db.users.find_one({"id": user_id}, {"_id": 0, "password": 0})
+        if doc is None:
             raise HTTPException(status_code=401, detail="User not found")
-        return User(**user)
+        user = User(**doc)
+        user_cache[user_id] = user
+        return user
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expired")
     except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
+# Pagination helpers
+# Liste endpoint'leri (created_at, id) üzerinden keyset sayfalama yapar.
+# Sonraki sayfanın cursor'ı X-Next-Cursor başlığında döner. limit verilmezse
+# DEFAULT_PAGE_SIZE uygulanır; tüm kayıtlar stream=true (NDJSON) ile alınır.
+DEFAULT_PAGE_SIZE = int(os.environ.get('DEFAULT_PAGE_SIZE', 1000))
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} JSON'a çevrilemez")
+
+def encode_cursor(doc: dict) -> str:
+    raw = json.dumps([doc["created_at"], doc["id"]], default=_json_default)
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor: str):
+    try:
+        created_at, doc_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        created_at = datetime.fromisoformat(created_at)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Geçersiz cursor")
+    return created_at, doc_id
+
+def keyset_cursor(collection: str, query: dict, direction: int, after: Optional[str] = None,
+                  projection: Optional[dict] = None):
+    """(created_at, id) sırasıyla, verilen cursor'dan sonrasını döndüren Motor cursor'ı"""
+    if after:
+        created_at, doc_id = decode_cursor(after)
+        op = "$lt" if direction == DESCENDING else "$gt"
+        keyset = {"$or": [
+            {"created_at": {op: created_at}},
+            {"created_at": created_at, "id": {op: doc_id}}
+        ]}
+        query = {"$and": [query, keyset]} if query else keyset
+    return db[collection].find(query, projection or {"_id": 0}).sort([("created_at", direction), ("id", direction)])
+
+async def fetch_page(cursor, limit: Optional[int], response: Response) -> List[dict]:
+    limit = limit or DEFAULT_PAGE_SIZE
+    docs = await cursor.limit(limit + 1).to_list(limit + 1)
+    if len(docs) > limit:
+        docs = docs[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(docs[-1])
+    return docs
+
+def ndjson_response(cursor) -> StreamingResponse:
+    """Dokümanları cursor'dan geldikçe satır satır yazar, tüm sonucu belleğe almaz"""
+    async def lines():
+        async for doc in cursor:
+            yield json.dumps(doc, default=_json_default, ensure_ascii=False) + "\n"
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
 # Auth endpoints
 @api_router.post("/auth/register", response_model=User)
 async def register(user_data: UserCreate):
@@ -202,12 +434,11 @@ async def register(user_data: UserCreate):
     
     user_dict = user_data.model_dump()
     password = user_dict.pop("password")
-    hashed_password = hash_password(password)
+    hashed_password = await hash_password(password)
     
     user = User(**user_dict)
     doc = user.model_dump()
     doc["password"] = hashed_password
-    doc["created_at"] = doc["created_at"].isoformat()
     
     await db.users.insert_one(doc)
     return user
@@ -215,12 +446,10 @@ async def register(user_data: UserCreate):
 @api_router.post("/auth/login", response_model=Token)
 async def login(credentials: UserLogin):
     user = await db.users.find_one({"username": credentials.username}, {"_id": 0})
-    if not user or not verify_password(credentials.password, user["password"]):
+    if not user or not await verify_password(credentials.password, user["password"]):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
     user.pop("password")
-    if isinstance(user["created_at"], str):
-        user["created_at"] = datetime.fromisoformat(user["created_at"])
     
     user_obj = User(**user)
     token = create_access_token({"sub": user_obj.id})
@@ -229,9 +458,6 @@ async def login(credentials: UserLogin):
 @api_router.get("/users", response_model=List[User])
 async def get_users(current_user: User = Depends(get_current_user)):
     users = await db.users.find({}, {"_id": 0, "password": 0}).to_list(1000)
-    for u in users:
-        if isinstance(u["created_at"], str):
-            u["created_at"] = datetime.fromisoformat(u["created_at"])
     return users
 
 @api_router.delete("/users/{user_id}")
@@ -245,11 +471,547 @@ async def delete_user(user_id: str, current_user: User = Depends(get_current_use
         raise HTTPException(status_code=403, detail="Only administrators can delete users")
     
     result = await db.users.delete_one({"id": user_id})
+    invalidate_user(user_id)
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
     return {"message": "User deleted successfully"}
 
+@api_router.put("/users/{user_id}/role", response_model=User)
+async def update_user_role(user_id: str, data: dict, current_user: User = Depends(get_current_user)):
+    if current_user.role != "yönetici":
+        raise HTTPException(status_code=403, detail="Only administrators can change roles")
+    
+    role = data.get("role")
+    if role not in ("yönetici", "depo", "satış"):
+        raise HTTPException(status_code=400, detail="Invalid role")
+    
+    result = await db.users.update_one({"id": user_id}, {"$set": {"role": role}})
+    invalidate_user(user_id)
+    if result.matched_count == 0:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    user = await db.users.find_one({"id": user_id}, {"_id": 0, "password": 0})
+    return User(**user)
+
+@api_router.get("/admin/cache-stats")
+async def get_cache_stats(current_user: User = Depends(get_current_user)):
+    """Uygulama içi önbelleklerin isabet/ıskalama sayaçları"""
+    if current_user.role != "yönetici":
+        raise HTTPException(status_code=403, detail="Only administrators can view cache stats")
+    return {
+        "users": {**user_cache_stats, "size": len(user_cache), "maxsize": user_cache.maxsize, "ttl": user_cache.ttl},
+        "product_facets": {**product_facets_stats, "loaded": product_facets["data"] is not None, "ttl": PRODUCT_FACETS_TTL},
+        "barcodes": {
+            **barcode_cache_stats,
+            "size": len(barcode_cache),
+            "negative_size": len(barcode_miss_cache),
+            "maxsize": BARCODE_CACHE_SIZE,
+            "ttl": barcode_cache.ttl,
+            "negative_ttl": barcode_miss_cache.ttl
+        }
+    }
+
+
+
+# Slow query profiler
+# Komut dinleyicisi SLOW_QUERY_THRESHOLD_MS'ten uzun süren sorguları bildirir;
+# aynı sorgu şekli (değerleri atılmış komut) SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS
+# içinde bir kez explain("executionStats") ile yeniden çalıştırılır. Kayıtlar
+# sabit boyutlu (capped) slow_queries koleksiyonuna yazılır.
+SLOW_QUERY_THRESHOLD_MS = float(os.environ.get('SLOW_QUERY_THRESHOLD_MS', 100))
+SLOW_QUERY_EXAMINED_RATIO = float(os.environ.get('SLOW_QUERY_EXAMINED_RATIO', 100))
+SLOW_QUERY_LOG_BYTES = int(os.environ.get('SLOW_QUERY_LOG_BYTES', 16 * 1024 * 1024))
+EXPLAINABLE_COMMANDS = {"find", "aggregate", "count", "distinct", "findAndModify", "update", "delete"}
+# Explain'e taşınmayan oturum/işlem alanları ($ ile başlayanlar da atılır)
+EXPLAIN_DROP_FIELDS = {"lsid", "txnNumber", "autocommit", "startTransaction", "readConcern", "writeConcern"}
+slow_query_explained = TTLCache(
+    maxsize=1024, ttl=int(os.environ.get('SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS', 300))
+)
+slow_query_log = {"loop": None, "tasks": set()}
+
+def report_slow_query(collection: str, name: str, command: dict, duration_ms: float):
+    """Sürücü thread'inden çağrılır; kayıt event loop'ta yapılır"""
+    loop = slow_query_log["loop"]
+    if loop is not None and not loop.is_closed():
+        loop.call_soon_threadsafe(start_slow_query_record, collection, name, command, duration_ms)
+
+def start_slow_query_record(collection: str, name: str, command: dict, duration_ms: float):
+    task = asyncio.create_task(record_slow_query(collection, name, command, duration_ms))
+    slow_query_log["tasks"].add(task)
+    task.add_done_callback(slow_query_log["tasks"].discard)
+
+def query_shape(value):
+    """Değerleri '?' ile değiştirir; aynı sorgu deseni aynı şekli verir"""
+    if isinstance(value, dict):
+        return {key: query_shape(item) for key, item in value.items()}
+    if isinstance(value, list) and value and all(isinstance(item, dict) for item in value):
+        return [query_shape(item) for item in value]
+    return "?"
+
+def explain_summary(explain: dict) -> dict:
+    """Plan aşamaları, taranan/dönen doküman sayıları ve uyarılar"""
+    def find_stats(node):
+        # find'da üst seviyede, aggregate'te $cursor aşamasının içinde
+        if isinstance(node, dict):
+            if "executionStats" in node:
+                return node["executionStats"]
+            nodes = node.values()
+        elif isinstance(node, list):
+            nodes = node
+        else:
+            return None
+        for child in nodes:
+            found = find_stats(child)
+            if found is not None:
+                return found
+        return None
+    
+    stats = find_stats(explain) or {}
+    stages = list(dict.fromkeys(_plan_stages(explain)))
+    docs_examined = stats.get("totalDocsExamined", 0)
+    returned = stats.get("nReturned", 0)
+    ratio = docs_examined / max(returned, 1)
+    flags = []
+    if "COLLSCAN" in stages:
+        flags.append("COLLSCAN")
+    if ratio >= SLOW_QUERY_EXAMINED_RATIO:
+        flags.append("HIGH_EXAMINED_RATIO")
+    return {
+        "stages": stages,
+        "docs_examined": docs_examined,
+        "keys_examined": stats.get("totalKeysExamined", 0),
+        "returned": returned,
+        "examined_ratio": round(ratio, 2),
+        "flags": flags
+    }
 
+async def record_slow_query(collection: str, name: str, command: dict, duration_ms: float):
+    explain_command = {
+        key: value for key, value in command.items()
+        if not key.startswith("$") and key not in EXPLAIN_DROP_FIELDS
+    }
+    # Toplu yazmalarda explain tek ifade kabul eder
+    for field in ("updates", "deletes"):
+        if field in explain_command:
+            explain_command[field] = explain_command[field][:1]
+    shape = query_shape(explain_command)
+    shape[name] = collection
+    fingerprint = hashlib.sha1(json.dumps(shape, sort_keys=True).encode()).hexdigest()[:16]
+    doc = {
+        "fingerprint": fingerprint,
+        "collection": collection,
+        "command": name,
+        "shape": shape,
+        "duration_ms": round(duration_ms, 2),
+        "created_at": datetime.now(timezone.utc)
+    }
+    try:
+        if fingerprint not in slow_query_explained:
+            slow_query_explained[fingerprint] = True
+            try:
+                explain = await client[command.get("$db", db.name)].command(
+                    {"explain": explain_command, "verbosity": "executionStats"}
+                )
+                doc.update(explain_summary(explain))
+                doc["explain"] = {
+                    key: value for key, value in explain.items()
+                    if key not in ("serverInfo", "serverParameters", "command", "ok", "operationTime", "$clusterTime")
+                }
+            except Exception as e:
+                doc["explain_error"] = str(e)
+        await db.slow_queries.insert_one(doc)
+    except Exception as e:
+        logger.error(f"Yavaş sorgu kaydedilemedi ({collection}.{name}): {e}")
+
+async def ensure_slow_query_log():
+    slow_query_log["loop"] = asyncio.get_running_loop()
+    try:
+        await db.create_collection("slow_queries", capped=True, size=SLOW_QUERY_LOG_BYTES)
+    except CollectionInvalid:
+        pass  # zaten var
+    except Exception as e:
+        logger.error(f"❌ slow_queries koleksiyonu oluşturulamadı: {e}")
+
+@api_router.get("/admin/slow-queries")
+async def get_slow_queries(
+    limit: int = Query(20, ge=1, le=100),
+    current_user: User = Depends(get_current_user)
+):
+    """Toplam süreye göre en çok zaman harcayan sorgu şekilleri ve son explain özetleri"""
+    if current_user.role != "yönetici":
+        raise HTTPException(status_code=403, detail="Only administrators can view slow queries")
+    
+    offenders = await db.slow_queries.aggregate([
+        {"$sort": {"created_at": 1}},
+        {"$group": {
+            "_id": "$fingerprint",
+            "collection": {"$last": "$collection"},
+            "command": {"$last": "$command"},
+            "shape": {"$last": "$shape"},
+            "count": {"$sum": 1},
+            "total_ms": {"$sum": "$duration_ms"},
+            "max_ms": {"$max": "$duration_ms"},
+            "last_seen": {"$last": "$created_at"}
+        }},
+        {"$sort": {"total_ms": -1}},
+        {"$limit": limit}
+    ]).to_list(None)
+    
+    plans = {}
+    async for doc in db.slow_queries.find(
+        {
+            "fingerprint": {"$in": [o["_id"] for o in offenders]},
+            "$or": [{"stages": {"$exists": True}}, {"explain_error": {"$exists": True}}]
+        },
+        {"_id": 0, "shape": 0}
+    ).sort("created_at", DESCENDING):
+        plans.setdefault(doc["fingerprint"], doc)
+    
+    result = []
+    for offender in offenders:
+        fingerprint = offender.pop("_id")
+        plan = plans.get(fingerprint, {})
+        result.append({
+            "fingerprint": fingerprint,
+            **offender,
+            "avg_ms": round(offender["total_ms"] / offender["count"], 2),
+            "total_ms": round(offender["total_ms"], 2),
+            "flags": plan.get("flags", []),
+            "plan": {key: plan[key] for key in (
+                "stages", "docs_examined", "keys_examined", "returned", "examined_ratio",
+                "explain", "explain_error", "created_at"
+            ) if key in plan} or None
+        })
+    return result
+
+
+# Image store
+# Ürün görselleri GridFS'te içeriklerinin sha256 özeti adıyla saklanır; ürün
+# dokümanında yalnızca URL'ler durur. Aynı içerik aynı URL'e sahip olduğundan
+# görseller süresiz önbelleklenebilir.
+image_bucket = AsyncIOMotorGridFSBucket(db, bucket_name="product_images")
+IMAGE_URL_PREFIX = "/api/images/"
+THUMBNAIL_SIZE = (320, 320)
+
+def decode_image(data: str) -> bytes:
+    """data URL veya düz base64 metnini byte'a çevirir"""
+    if data.startswith("data:"):
+        data = data.split(",", 1)[-1]
+    try:
+        return base64.b64decode(data, validate=True)
+    except (binascii.Error, ValueError):
+        raise HTTPException(status_code=400, detail="Geçersiz görsel verisi")
+
+def process_image(raw: bytes) -> Tuple[str, bytes]:
+    """(orijinalin MIME tipi, WEBP küçük resim); CPU yoğun, thread'de çalıştırılır"""
+    try:
+        with Image.open(BytesIO(raw)) as img:
+            content_type = Image.MIME.get(img.format, "application/octet-stream")
+            thumb = ImageOps.exif_transpose(img)
+            thumb.thumbnail(THUMBNAIL_SIZE)
+            if thumb.mode not in ("RGB", "RGBA"):
+                thumb = thumb.convert("RGBA")
+            out = BytesIO()
+            thumb.save(out, format="WEBP", quality=80)
+    except (UnidentifiedImageError, OSError):
+        raise HTTPException(status_code=400, detail="Görsel okunamadı")
+    return content_type, out.getvalue()
+
+def image_urls(image_id: str) -> Tuple[str, str]:
+    return f"{IMAGE_URL_PREFIX}{image_id}", f"{IMAGE_URL_PREFIX}{image_id}/thumbnail"
+
+async def store_image(data: str) -> str:
+    """Görseli ve küçük resmini (yoksa) kaydeder, içerik hash'ini döndürür"""
+    raw = decode_image(data)
+    image_id = hashlib.sha256(raw).hexdigest()
+    if await db["product_images.files"].find_one({"filename": image_id}, {"_id": 1}):
+        return image_id
+    
+    loop = asyncio.get_running_loop()
+    content_type, thumbnail = await loop.run_in_executor(None, process_image, raw)
+    await image_bucket.upload_from_stream(
+        f"{image_id}.thumbnail", thumbnail, metadata={"contentType": "image/webp"}
+    )
+    # Orijinal en son yazılır: varlık kontrolü bu dosyaya bakar
+    await image_bucket.upload_from_stream(image_id, raw, metadata={"contentType": content_type})
+    return image_id
+
+async def apply_image(target: dict, image: Optional[str]):
+    """image_base64 alanını ürün dokümanındaki image_url/thumbnail_url alanlarına çevirir"""
+    if not image:
+        target["image_url"] = target["thumbnail_url"] = None
+    elif not image.startswith(IMAGE_URL_PREFIX):  # düzenleme formu mevcut URL'i geri gönderir
+        target["image_url"], target["thumbnail_url"] = image_urls(await store_image(image))
+
+async def serve_image(filename: str, request: Request):
+    etag = f'"{filename}"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    try:
+        grid_out = await image_bucket.open_download_stream_by_name(filename)
+    except gridfs.errors.NoFile:
+        raise HTTPException(status_code=404, detail="Görsel bulunamadı")
+    
+    async def chunks():
+        while chunk := await grid_out.readchunk():
+            yield chunk
+    
+    content_type = (grid_out.metadata or {}).get("contentType", "application/octet-stream")
+    headers["Content-Length"] = str(grid_out.length)
+    return StreamingResponse(chunks(), media_type=content_type, headers=headers)
+
+# <img> etiketleri Authorization başlığı gönderemediği için görseller herkese açıktır
+@api_router.get("/images/{image_id}")
+async def get_image(image_id: str, request: Request):
+    return await serve_image(image_id, request)
+
+@api_router.get("/images/{image_id}/thumbnail")
+async def get_image_thumbnail(image_id: str, request: Request):
+    return await serve_image(f"{image_id}.thumbnail", request)
+
+# Product facet cache
+# Marka/kategori listeleri ve ürün sayıları bellekte tutulur. Ürün ekleme ve
+# silme sayıları yerinde günceller, marka/kategori değiştiren güncellemeler
+# önbelleği boşaltır. Diğer worker'ların yazdıkları en geç TTL sonunda görülür.
+PRODUCT_FACETS_TTL = int(os.environ.get('PRODUCT_FACETS_TTL_SECONDS', 300))
+product_facets = {"data": None, "timestamp": None, "version": 0}
+product_facets_stats = {"hits": 0, "misses": 0}
+
+async def load_product_facets() -> dict:
+    version = product_facets["version"]
+    result = await db.products.aggregate([
+        {
+            "$facet": {
+                "brands": [{"$group": {"_id": "$brand", "count": {"$sum": 1}}}],
+                "categories": [{"$group": {"_id": "$category", "count": {"$sum": 1}}}]
+            }
+        }
+    ]).to_list(1)
+    data = {key: {f["_id"]: f["count"] for f in result[0][key] if f["_id"]} for key in ("brands", "categories")}
+    # Yükleme sürerken bir yazma olduysa sonuç eskidir, saklanmaz
+    if product_facets["version"] == version:
+        product_facets["data"] = data
+        product_facets["timestamp"] = datetime.now(timezone.utc)
+    return data
+
+async def get_product_facets() -> dict:
+    data, timestamp = product_facets["data"], product_facets["timestamp"]
+    if data is not None and (datetime.now(timezone.utc) - timestamp).total_seconds() < PRODUCT_FACETS_TTL:
+        product_facets_stats["hits"] += 1
+        return data
+    product_facets_stats["misses"] += 1
+    return await load_product_facets()
+
+def invalidate_product_facets():
+    product_facets["version"] += 1
+    product_facets["data"] = None
+
+def adjust_product_facets(brand: Optional[str], category: Optional[str], delta: int):
+    product_facets["version"] += 1
+    data = product_facets["data"]
+    if data is None:
+        return
+    for key, value in (("brands", brand), ("categories", category)):
+        if not value:
+            continue
+        counts = data[key]
+        counts[value] = counts.get(value, 0) + delta
+        if counts[value] <= 0:
+            del counts[value]
+
+# Barcode lookup cache
+# POS her okutmada /products/barcode/{barcode} çağırır. Bulunan ürünler hazır
+# Product nesnesi olarak, bilinmeyen barkodlar daha kısa süreli ayrı bir
+# önbellekte tutulur. Ürün yazımları ilgili barkodu düşürür; satışlar popüler
+# ürünleri önbellekten atmamak için yeni miktar ve sipariş bayraklarını
+# önbellekteki kayda yazar.
+# Okuma sürerken bir yazma olduysa veya satış sürüyorsa okunan sonuç saklanmaz.
+BARCODE_CACHE_SIZE = int(os.environ.get('BARCODE_CACHE_SIZE', 4096))
+barcode_cache = TTLCache(maxsize=max(BARCODE_CACHE_SIZE, 1), ttl=int(os.environ.get('BARCODE_CACHE_TTL_SECONDS', 300)))
+barcode_miss_cache = TTLCache(maxsize=max(BARCODE_CACHE_SIZE, 1), ttl=int(os.environ.get('BARCODE_MISS_TTL_SECONDS', 30)))
+barcode_cache_state = {"version": 0, "stock_writes": 0}
+barcode_cache_stats = {"hits": 0, "negative_hits": 0, "misses": 0}
+
+async def find_product_by_barcode(barcode: str) -> Optional[Product]:
+    product = barcode_cache.get(barcode)
+    if product is not None:
+        barcode_cache_stats["hits"] += 1
+        return product
+    if barcode in barcode_miss_cache:
+        barcode_cache_stats["negative_hits"] += 1
+        return None
+    barcode_cache_stats["misses"] += 1
+    
+    version = barcode_cache_state["version"]
+    doc = await db.products.find_one({"barcode": barcode}, {"_id": 0})
+    product = Product(**doc) if doc else None
+    if BARCODE_CACHE_SIZE and barcode_cache_state["version"] == version and not barcode_cache_state["stock_writes"]:
+        if product is None:
+            barcode_miss_cache[barcode] = True
+        else:
+            barcode_cache[barcode] = product
+    return product
+
+def invalidate_barcodes(*barcodes: Optional[str]):
+    barcode_cache_state["version"] += 1
+    for barcode in barcodes:
+        barcode_cache.pop(barcode, None)
+        barcode_miss_cache.pop(barcode, None)
+
+@contextmanager
+def barcode_stock_write():
+    """Satış süresince okunan ürünler önbelleğe alınmaz (düşüm iki kez uygulanmasın)"""
+    barcode_cache_state["stock_writes"] += 1
+    try:
+        yield
+    finally:
+        barcode_cache_state["stock_writes"] -= 1
+        barcode_cache_state["version"] += 1
+
+def refresh_cached_stock(doc: dict):
+    """Satıştan sonra okunan miktar ve bayrakları önbellekteki ürüne yazar"""
+    # Yerinde güncelleme: kaydın TTL'i uzamaz; değerler pipeline update'in
+    # hesapladığı haliyle veritabanından gelir (bkz. REORDER_FLAG)
+    product = barcode_cache.get(doc["barcode"])
+    if product is not None:
+        product.quantity = doc["quantity"]
+        product.needs_reorder = doc.get("needs_reorder", False)
+        product.days_of_cover = doc.get("days_of_cover")
+
+# Low stock flag
+# is_low_stock, quantity/min_quantity değiştiren her yazımda aynı update
+# içinde (pipeline update) yeniden hesaplanır; kısmi indeks yalnızca
+# düşük stoklu ürünleri içerir. Sipariş noktası raporunun needs_reorder ve
+# days_of_cover alanları da aynı şekilde stokla birlikte güncellenir.
+LOW_STOCK_FLAG = {"$set": {"is_low_stock": {"$lte": ["$quantity", "$min_quantity"]}}}
+HAS_DEMAND = {"$gt": ["$forecast.daily_demand", 0]}
+REORDER_FLAG = {"$set": {
+    "needs_reorder": {"$and": [HAS_DEMAND, {"$lte": ["$quantity", "$reorder_point"]}]},
+    "days_of_cover": {"$cond": [HAS_DEMAND, {"$divide": ["$quantity", "$forecast.daily_demand"]}, None]}
+}}
+STOCK_FLAGS = [LOW_STOCK_FLAG, REORDER_FLAG]
+STOCK_FLAG_FIELDS = ("is_low_stock", "needs_reorder", "days_of_cover")
+
+def is_low_stock(quantity: int, min_quantity: int) -> bool:
+    return quantity <= min_quantity
+
+def stock_delta_update(delta: int) -> list:
+    """quantity'yi delta kadar değiştirip düşük stok bayrağını güncelleyen pipeline update"""
+    return [{"$set": {"quantity": {"$add": ["$quantity", delta]}}}, *STOCK_FLAGS]
+
+def set_fields_update(fields: dict) -> list:
+    """$set'i pipeline update olarak yazar; değerler $literal ile "$" yorumundan korunur"""
+    return [{"$set": {key: {"$literal": value} for key, value in fields.items()}}, *STOCK_FLAGS]
+
+# Inventory change feed
+# Ürün ekleme/güncelleme/silme ve satışlardaki stok değişiklikleri süreç içi
+# bir yayıncıdan SSE ile dağıtılır; istemciler tüm kataloğu yeniden çekmek
+# yerine yerel kopyalarını günceller. Olay id'si "{epoch}-{seq}" biçimindedir:
+# son INVENTORY_FEED_BACKLOG olay Last-Event-ID ile yeniden gönderilir, daha
+# eski bir id veya yeniden başlamış bir süreç için istemciye "reset" gider.
+INVENTORY_FEED_BACKLOG = int(os.environ.get('INVENTORY_FEED_BACKLOG', 1000))
+INVENTORY_FEED_QUEUE_SIZE = int(os.environ.get('INVENTORY_FEED_QUEUE_SIZE', 256))
+INVENTORY_FEED_HEARTBEAT = 15
+# Olaylarda gönderilen ürün alanları (görsel verisi ve açıklama hariç)
+FEED_PRODUCT_FIELDS = (
+    "id", "name", "barcode", "brand", "category", "quantity", "min_quantity", "is_low_stock",
+    "needs_reorder", "days_of_cover", "purchase_price", "sale_price", "unit_type", "package_quantity", "image_url", "thumbnail_url", "updated_at"
+)
+
+inventory_feed = {
+    "epoch": secrets.token_hex(4),
+    "seq": 0,
+    "backlog": deque(maxlen=INVENTORY_FEED_BACKLOG),
+    "subscribers": set()
+}
+
+def publish_inventory(event: dict):
+    inventory_feed["seq"] += 1
+    event = {"seq": inventory_feed["seq"], **event}
+    inventory_feed["backlog"].append(event)
+    for queue in list(inventory_feed["subscribers"]):
+        try:
+            queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Yavaş istemci: kuyruk boşalınca bağlantı kapanır, Last-Event-ID ile devam eder
+            inventory_feed["subscribers"].discard(queue)
+
+def publish_product_changes(product_id: str, changes: dict, low_stock_changed: bool = False):
+    changes = {key: value for key, value in changes.items() if key in FEED_PRODUCT_FIELDS}
+    if changes:
+        publish_inventory({"type": "updated", "id": product_id, "changes": changes, "low_stock_changed": low_stock_changed})
+
+async def publish_stock_changes(stock: dict):
+    """Satış sonrası ürünlerin yeni miktarlarını yayınlar; stock = {product_id: düşülen miktar}"""
+    products = db.products.find(
+        {"id": {"$in": list(stock)}},
+        {"_id": 0, "id": 1, "barcode": 1, "quantity": 1, "min_quantity": 1, **dict.fromkeys(STOCK_FLAG_FIELDS, 1)}
+    )
+    async for product in products:
+        refresh_cached_stock(product)
+        was_low = is_low_stock(product["quantity"] + stock[product["id"]], product["min_quantity"])
+        publish_product_changes(
+            product["id"],
+            {"quantity": product["quantity"], **{key: product.get(key) for key in STOCK_FLAG_FIELDS}},
+            low_stock_changed=was_low != product["is_low_stock"]
+        )
+
+def sse_event(event: dict) -> str:
+    data = json.dumps(event, default=_json_default, ensure_ascii=False)
+    return f"id: {inventory_feed['epoch']}-{event['seq']}\nevent: {event['type']}\ndata: {data}\n\n"
+
+def feed_replay(last_event_id: Optional[str]) -> Optional[List[dict]]:
+    """Last-Event-ID sonrasındaki olaylar; kaçırılan olaylar artık tutulmuyorsa None"""
+    epoch, _, seq = (last_event_id or "").partition("-")
+    if epoch != inventory_feed["epoch"] or not seq.isdigit():
+        return None
+    seq = int(seq)
+    backlog = inventory_feed["backlog"]
+    if seq > inventory_feed["seq"] or (backlog and backlog[0]["seq"] > seq + 1):
+        return None
+    return [event for event in backlog if event["seq"] > seq]
+
+@api_router.get("/inventory/events")
+async def inventory_events(request: Request, current_user: User = Depends(get_current_user)):
+    """Envanter değişikliklerini Server-Sent Events olarak yayınlar"""
+    last_event_id = request.headers.get("last-event-id") or request.query_params.get("last_event_id")
+    
+    async def stream():
+        queue = asyncio.Queue(maxsize=INVENTORY_FEED_QUEUE_SIZE)
+        # Önce abone ol, sonra backlog'u oku: arada yayınlanan olay kaybolmaz
+        inventory_feed["subscribers"].add(queue)
+        last_seq = inventory_feed["seq"]
+        try:
+            yield "retry: 3000\n\n"
+            if last_event_id:
+                replay = feed_replay(last_event_id)
+                if replay is None:
+                    yield f"id: {inventory_feed['epoch']}-{last_seq}\nevent: reset\ndata: {{}}\n\n"
+                else:
+                    for event in replay:
+                        yield sse_event(event)
+                    last_seq = max([last_seq] + [event["seq"] for event in replay])
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), INVENTORY_FEED_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    if queue not in inventory_feed["subscribers"]:
+                        return
+                    yield ": ping\n\n"
+                    continue
+                if event["seq"] > last_seq:
+                    yield sse_event(event)
+                if queue not in inventory_feed["subscribers"] and queue.empty():
+                    return
+        finally:
+            inventory_feed["subscribers"].discard(queue)
+    
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 # Product endpoints
 @api_router.post("/products", response_model=Product)
@@ -263,54 +1025,177 @@ async def create_product(product_data: ProductCreate, current_user: User = Depen
     
     product = Product(**product_dict)
     if image_base64:
-        product.image_url = image_base64
+        product.image_url, product.thumbnail_url = image_urls(await store_image(image_base64))
     
     doc = product.model_dump()
-    doc["created_at"] = doc["created_at"].isoformat()
-    doc["updated_at"] = doc["updated_at"].isoformat()
+    doc["is_low_stock"] = is_low_stock(product.quantity, product.min_quantity)
     
     await db.products.insert_one(doc)
+    adjust_product_facets(product.brand, product.category, 1)
+    invalidate_barcodes(product.barcode)
+    publish_inventory({"type": "created", "product": {key: doc.get(key) for key in FEED_PRODUCT_FIELDS}})
     return product
 
-@api_router.post("/products/generate-description")
-async def generate_description(data: dict, current_user: User = Depends(get_current_user)):
-    try:
-        product_info = f"Ürün Adı: {data.get('name', '')}\nMarka: {data.get('brand', '')}\nKategori: {data.get('category', '')}"
+# AI product descriptions
+# Aynı isim/marka/kategori için LLM bir kez çağrılır; sonuç girdilerin
+# hash'i ile ai_descriptions koleksiyonunda saklanır. LLM_BACKEND=fake
+# ağ erişimi olmadan deterministik açıklamalar üretir (test/geliştirme).
+LLM_BACKEND = os.environ.get('LLM_BACKEND', 'emergent')
+LLM_MAX_ATTEMPTS = int(os.environ.get('LLM_MAX_ATTEMPTS', 3))
+LLM_BACKOFF_SECONDS = float(os.environ.get('LLM_BACKOFF_SECONDS', 1.0))
+LLM_CONCURRENCY = int(os.environ.get('LLM_CONCURRENCY', 4))
+LLM_FAKE_LATENCY = float(os.environ.get('LLM_FAKE_LATENCY_SECONDS', 0))
+LLM_FAKE_FAILURE_RATE = float(os.environ.get('LLM_FAKE_FAILURE_RATE', 0))
+DESCRIPTION_SYSTEM_MESSAGE = "Sen bir medikal ürünler uzmanısın. Kısa, çekici ve detaylı Türkçe ürün açıklamaları yazıyorsun. Maksimum 2-3 cümle."
+
+def description_prompt(name: str, brand: str, category: str) -> str:
+    product_info = f"Ürün Adı: {name}\nMarka: {brand}\nKategori: {category}"
+    return f"{product_info}\n\nBu medikal ürün için profesyonel ve çekici bir açıklama yaz (max 2-3 cümle):"
+
+def description_cache_key(name: str, brand: str, category: str) -> str:
+    normalized = [" ".join(fold_turkish(value or "").split()) for value in (name, brand, category)]
+    return hashlib.sha256("\x1f".join(normalized).encode("utf-8")).hexdigest()
+
+async def fake_llm_complete(system_message: str, prompt: str) -> str:
+    if LLM_FAKE_LATENCY:
+        await asyncio.sleep(LLM_FAKE_LATENCY)
+    if LLM_FAKE_FAILURE_RATE and random.random() < LLM_FAKE_FAILURE_RATE:
+        raise RuntimeError("Fake LLM failure")
+    fields = dict(line.split(": ", 1) for line in prompt.split("\n") if ": " in line)
+    return (f"{fields.get('Marka', '')} {fields.get('Ürün Adı', '')}, "
+            f"{fields.get('Kategori', '')} kategorisinde güvenilir bir medikal üründür.").strip()
+
+async def llm_complete(system_message: str, prompt: str) -> str:
+    with external_call(f"llm_{LLM_BACKEND}"):
+        if LLM_BACKEND == 'fake':
+            return await fake_llm_complete(system_message, prompt)
         
         chat = LlmChat(
             api_key=os.environ.get('EMERGENT_LLM_KEY'),
             session_id=str(uuid.uuid4()),
-            system_message="Sen bir medikal ürünler uzmanısın. Kısa, çekici ve detaylı Türkçe ürün açıklamaları yazıyorsun. Maksimum 2-3 cümle."
+            system_message=system_message
         ).with_model("gemini", "gemini-2.0-flash")
-        
-        message = UserMessage(text=f"{product_info}\n\nBu medikal ürün için profesyonel ve çekici bir açıklama yaz (max 2-3 cümle):")
-        response = await chat.send_message(message)
-        
-        return {"description": response}
+        return await chat.send_message(UserMessage(text=prompt))
+
+async def llm_complete_with_retry(system_message: str, prompt: str) -> str:
+    for attempt in range(LLM_MAX_ATTEMPTS):
+        try:
+            return await llm_complete(system_message, prompt)
+        except Exception as e:
+            if attempt == LLM_MAX_ATTEMPTS - 1:
+                raise
+            # Üstel bekleme + jitter: hız sınırına takılan istekler aynı anda tekrar denenmesin
+            delay = LLM_BACKOFF_SECONDS * (2 ** attempt) * (0.5 + random.random())
+            logging.warning(f"LLM call failed ({e}), retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+description_requests = {}  # önbellek anahtarı -> devam eden LLM görevi
+
+async def generate_description_cached(key: str, name: str, brand: str, category: str) -> str:
+    description = await llm_complete_with_retry(DESCRIPTION_SYSTEM_MESSAGE, description_prompt(name, brand, category))
+    await db.ai_descriptions.update_one(
+        {"_id": key},
+        {"$set": {"description": description, "created_at": datetime.now(timezone.utc)}},
+        upsert=True
+    )
+    return description
+
+async def product_description(name: str, brand: str, category: str) -> Tuple[str, bool]:
+    """(açıklama, önbellekten mi) döner; LLM tüm denemelerde başarısız olursa hata fırlatır"""
+    key = description_cache_key(name, brand, category)
+    cached = await db.ai_descriptions.find_one({"_id": key})
+    if cached:
+        return cached["description"], True
+    
+    # Aynı girdiler için eşzamanlı istekler tek LLM çağrısını bekler (single-flight)
+    task = description_requests.get(key)
+    if task is None:
+        task = asyncio.create_task(generate_description_cached(key, name, brand, category))
+        description_requests[key] = task
+        task.add_done_callback(lambda _: description_requests.pop(key, None))
+    # shield: bekleyenlerden biri iptal edilse de ortak çağrı sürer
+    return await asyncio.shield(task), False
+
+@api_router.post("/products/generate-description")
+async def generate_description(data: dict, current_user: User = Depends(get_current_user)):
+    try:
+        description, cached = await product_description(
+            data.get('name', ''), data.get('brand', ''), data.get('category', '')
+        )
+        return {"description": description, "cached": cached}
     except Exception as e:
         logging.error(f"AI description error: {e}")
         return {"description": f"{data.get('name', '')} - {data.get('category', '')} kategorisinde kaliteli bir üründür."}
 
+MISSING_DESCRIPTION_QUERY = {"description": {"$in": [None, ""]}}
+
+async def run_description_job(job_id: str, query: dict):
+    async def describe(product):
+        try:
+            description, _ = await product_description(product['name'], product['brand'], product['category'])
+        except Exception as e:
+            logging.warning(f"Description generation failed for {product['id']}: {e}")
+            await job_progress(job_id, processed=1, failed=1)
+            return
+        # Açıklama ürün ürün yazılır; iş yarıda kalırsa yeni iş kalan ürünlerden devam eder
+        await db.products.update_one(
+            {"id": product['id'], **MISSING_DESCRIPTION_QUERY},
+            {"$set": {"description": description}}
+        )
+        invalidate_barcodes(product['barcode'])
+        await job_progress(job_id, processed=1)
+    
+    projection = {"_id": 0, "id": 1, "barcode": 1, "name": 1, "brand": 1, "category": 1}
+    await for_each_bounded(db.products.find(query, projection), describe, LLM_CONCURRENCY)
+
+@api_router.post("/products/descriptions/jobs")
+async def create_description_job(data: Optional[CatalogJobCreate] = None, current_user: User = Depends(get_current_user)):
+    """Açıklaması boş olan ürünlere AI açıklaması yazan arka plan işi başlatır"""
+    if current_user.role != "yönetici":
+        raise HTTPException(status_code=403, detail="Only administrators can start description jobs")
+    job_id = running_job("descriptions")
+    if job_id:
+        raise HTTPException(status_code=409, detail={"message": "Açıklama işi zaten çalışıyor", "job_id": job_id})
+    
+    params = (data or CatalogJobCreate()).product_query()
+    query = {**MISSING_DESCRIPTION_QUERY, **params}
+    total = await db.products.count_documents(query)
+    job = await create_job("descriptions", params, total, current_user.id)
+    start_job(job, run_description_job(job["id"], query))
+    return job
+
+@api_router.post("/products/descriptions/jobs/{job_id}/resume")
+async def resume_description_job(job_id: str, current_user: User = Depends(get_current_user)):
+    """Yarıda kalan işi aynı id ile açıklaması hâlâ boş olan ürünlerden sürdürür"""
+    if current_user.role != "yönetici":
+        raise HTTPException(status_code=403, detail="Only administrators can start description jobs")
+    job = await resumable_job(job_id, "descriptions")
+    query = {**MISSING_DESCRIPTION_QUERY, **job["params"]}
+    job["total"] = await db.products.count_documents(query)
+    await job_progress(job_id, total=job["total"])
+    start_job(job, run_description_job(job_id, query))
+    return job
+
 @api_router.get("/products", response_model=List[Product])
-async def get_products(current_user: User = Depends(get_current_user)):
-    products = await db.products.find({}, {"_id": 0}).to_list(1000)
-    for p in products:
-        if isinstance(p["created_at"], str):
-            p["created_at"] = datetime.fromisoformat(p["created_at"])
-        if isinstance(p["updated_at"], str):
-            p["updated_at"] = datetime.fromisoformat(p["updated_at"])
+async def get_products(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Sayfa boyutu (varsayılan DEFAULT_PAGE_SIZE)"),
+    after: Optional[str] = Query(None, description="Önceki sayfanın X-Next-Cursor değeri"),
+    stream: bool = Query(False, description="NDJSON olarak akış halinde döndür"),
+    current_user: User = Depends(get_current_user)
+):
+    cursor = keyset_cursor("products", {}, ASCENDING, after)
+    if stream:
+        return ndjson_response(cursor.limit(limit or 0))
+    products = await fetch_page(cursor, limit, response)
     return products
 
 @api_router.get("/products/barcode/{barcode}", response_model=Product)
 async def get_product_by_barcode(barcode: str, current_user: User = Depends(get_current_user)):
-    product = await db.products.find_one({"barcode": barcode}, {"_id": 0})
-    if not product:
+    product = await find_product_by_barcode(barcode)
+    if product is None:
         raise HTTPException(status_code=404, detail="Ürün bulunamadı")
-    if isinstance(product["created_at"], str):
-        product["created_at"] = datetime.fromisoformat(product["created_at"])
-    if isinstance(product["updated_at"], str):
-        product["updated_at"] = datetime.fromisoformat(product["updated_at"])
-    return Product(**product)
+    return product
 
 @api_router.put("/products/{product_id}", response_model=Product)
 async def update_product(product_id: str, product_data: ProductUpdate, current_user: User = Depends(get_current_user)):
@@ -319,124 +1204,477 @@ async def update_product(product_id: str, product_data: ProductUpdate, current_u
         raise HTTPException(status_code=400, detail="No data to update")
     
     if "image_base64" in update_dict:
-        update_dict["image_url"] = update_dict.pop("image_base64")
+        await apply_image(update_dict, update_dict.pop("image_base64"))
     
-    update_dict["updated_at"] = datetime.now(timezone.utc).isoformat()
+    update_dict["updated_at"] = datetime.now(timezone.utc)
     
-    result = await db.products.update_one({"id": product_id}, {"$set": update_dict})
-    if result.matched_count == 0:
+    stock_changed = "quantity" in update_dict or "min_quantity" in update_dict
+    update = set_fields_update(update_dict) if stock_changed else {"$set": update_dict}
+    
+    # Güncelleme öncesi belge: düşük stok geçişi buradan anlaşılır
+    before = await db.products.find_one_and_update(
+        {"id": product_id},
+        update,
+        projection={"_id": 0},
+        return_document=ReturnDocument.BEFORE
+    )
+    if before is None:
         raise HTTPException(status_code=404, detail="Product not found")
+    product = {**before, **update_dict}
+    if stock_changed:
+        # Bayraklar (is_low_stock, needs_reorder, days_of_cover) pipeline'da hesaplandı
+        product = await db.products.find_one({"id": product_id}, {"_id": 0}) or product
+        changes = {**update_dict, **{key: product.get(key) for key in STOCK_FLAG_FIELDS}}
+    else:
+        changes = update_dict
     
-    product = await db.products.find_one({"id": product_id}, {"_id": 0})
-    if isinstance(product["created_at"], str):
-        product["created_at"] = datetime.fromisoformat(product["created_at"])
-    if isinstance(product["updated_at"], str):
-        product["updated_at"] = datetime.fromisoformat(product["updated_at"])
+    if "brand" in update_dict or "category" in update_dict:
+        invalidate_product_facets()
+    invalidate_barcodes(before["barcode"], product["barcode"])
+    publish_product_changes(
+        product_id,
+        changes,
+        low_stock_changed=is_low_stock(before["quantity"], before["min_quantity"])
+        != is_low_stock(product["quantity"], product["min_quantity"])
+    )
     return Product(**product)
 
 @api_router.delete("/products/{product_id}")
 async def delete_product(product_id: str, current_user: User = Depends(get_current_user)):
-    result = await db.products.delete_one({"id": product_id})
-    if result.deleted_count == 0:
+    product = await db.products.find_one_and_delete(
+        {"id": product_id},
+        projection={"_id": 0, "barcode": 1, "brand": 1, "category": 1}
+    )
+    if product is None:
         raise HTTPException(status_code=404, detail="Product not found")
+    adjust_product_facets(product.get("brand"), product.get("category"), -1)
+    invalidate_barcodes(product.get("barcode"))
+    publish_inventory({"type": "deleted", "id": product_id})
     return {"message": "Product deleted"}
 
 @api_router.get("/products/low-stock")
 async def get_low_stock_products(current_user: User = Depends(get_current_user)):
-    pipeline = [
-        {"$addFields": {"is_low_stock": {"$lte": ["$quantity", "$min_quantity"]}}},
-        {"$match": {"is_low_stock": True}},
-        {"$project": {"_id": 0}}
-    ]
-    products = await db.products.aggregate(pipeline).to_list(100)
-    for p in products:
-        if isinstance(p["created_at"], str):
-            p["created_at"] = datetime.fromisoformat(p["created_at"])
-        if isinstance(p["updated_at"], str):
-            p["updated_at"] = datetime.fromisoformat(p["updated_at"])
+    # low_stock_name kısmi indeksi: yalnızca düşük stoklu ürünler taranır
+    products = await db.products.find({"is_low_stock": True}, {"_id": 0}).sort("name", ASCENDING).to_list(None)
     return products
 
 # Sales endpoints
+class InsufficientStockError(Exception):
+    def __init__(self, items: List[dict]):
+        super().__init__("Yetersiz stok")
+        self.items = items
+
+_transactions_supported: Optional[bool] = None
+
+async def transactions_supported() -> bool:
+    """Transaction yalnızca replica set / sharded cluster üzerinde çalışır"""
+    global _transactions_supported
+    if _transactions_supported is None:
+        try:
+            hello = await client.admin.command("hello")
+            _transactions_supported = "setName" in hello or hello.get("msg") == "isdbgrid"
+        except Exception as e:
+            logging.warning(f"MongoDB topolojisi okunamadı, transaction kapalı: {e}")
+            _transactions_supported = False
+        if not _transactions_supported:
+            logging.warning("MongoDB standalone çalışıyor: satışlar transaction olmadan, telafi ederek yazılacak")
+    return _transactions_supported
+
+def cart_stock(items: List[dict]) -> dict:
+    """Sepet kalemlerini ürün başına toplam düşülecek miktara çevirir"""
+    stock = {}
+    for item in items:
+        if item["quantity"] <= 0:
+            raise HTTPException(status_code=400, detail=f"Geçersiz miktar: {item.get('name', item['product_id'])}")
+        stock[item["product_id"]] = stock.get(item["product_id"], 0) + item["quantity"]
+    return stock
+
+async def stock_shortages(stock: dict, session=None) -> List[dict]:
+    products = db.products.find(
+        {"id": {"$in": list(stock)}}, {"_id": 0, "id": 1, "name": 1, "quantity": 1}, session=session
+    )
+    found = {p["id"]: p async for p in products}
+    shortages = []
+    for product_id, requested in stock.items():
+        product = found.get(product_id)
+        available = product["quantity"] if product else 0
+        if available < requested:
+            shortages.append({
+                "product_id": product_id,
+                "name": product["name"] if product else None,
+                "requested": requested,
+                "available": available
+            })
+    return shortages
+
+async def commit_sale(doc: dict, stock: dict, session=None):
+    """Stok düşümü, müşteri toplamı ve satış kaydı; transaction içinde çağrılır"""
+    if stock:
+        # Koşullu düşüm: stok yetmiyorsa kalem eşleşmez, transaction geri alınır
+        result = await db.products.bulk_write([
+            UpdateOne({"id": product_id, "quantity": {"$gte": qty}}, stock_delta_update(-qty))
+            for product_id, qty in stock.items()
+        ], ordered=False, session=session)
+        if result.matched_count < len(stock):
+            raise InsufficientStockError(await stock_shortages(stock, session))
+    
+    # Önce satış: client_sale_id tekrarında DuplicateKeyError toplamlar yazılmadan atılır
+    await db.sales.insert_one(doc, session=session)
+    await apply_sale_totals([doc], session)
+
+def sale_totals(docs: List[dict]) -> Tuple[dict, dict, dict]:
+    """(müşteri -> tutar, gün -> toplamlar, (gün, ürün) -> {name, totals}) döner"""
+    customers, days, product_days = {}, {}, {}
+    for doc in docs:
+        if doc["customer_id"]:
+            customers[doc["customer_id"]] = customers.get(doc["customer_id"], 0) + doc["final_amount"]
+        day_key = doc["created_at"].date().isoformat()
+        day = days.setdefault(day_key, {"sales_count": 0, "revenue": 0})
+        day["sales_count"] += 1
+        day["revenue"] += doc["final_amount"]
+        for item in doc["items"]:
+            rollup = product_days.setdefault((day_key, item["product_id"]), {
+                "name": item["name"], "totals": dict.fromkeys(PRODUCT_ROLLUP_FIELDS, 0)
+            })
+            totals = rollup["totals"]
+            totals["quantity"] += item["quantity"]
+            totals["revenue"] += item["total"]
+            # Kâr yalnızca maliyet anlık görüntüsü olan kalemlerden (bkz. get_top_profit)
+            if item.get("purchase_price") is not None:
+                totals["cost"] += item["purchase_price"] * item["quantity"]
+                totals["profit"] += (item["price"] - item["purchase_price"]) * item["quantity"]
+                totals["costed_quantity"] += item["quantity"]
+    return customers, days, product_days
+
+async def apply_sale_totals(docs: List[dict], session=None):
+    """Müşteri, günlük ve ürün-gün satış toplamlarını satışlar üzerinden toplayıp tek $inc ile yazar"""
+    customers, days, product_days = sale_totals(docs)
+    if customers:
+        await db.customers.bulk_write([
+            UpdateOne({"id": customer_id}, {"$inc": {"total_spent": amount}})
+            for customer_id, amount in customers.items()
+        ], ordered=False, session=session)
+    
+    # Dashboard bu günlük toplamları okur (bkz. get_dashboard_stats)
+    if days:
+        await db.sales_daily.bulk_write([
+            UpdateOne({"_id": day}, {"$inc": totals}, upsert=True)
+            for day, totals in days.items()
+        ], ordered=False, session=session)
+    
+    # Satış raporları bu ürün-gün toplamlarını okur (bkz. product_sales_totals)
+    if product_days:
+        await db.sales_daily_product.bulk_write([
+            UpdateOne(
+                {"_id": f"{day}:{product_id}"},
+                {
+                    "$inc": rollup["totals"],
+                    "$set": {"product_name": rollup["name"]},
+                    "$setOnInsert": {"day": day, "product_id": product_id}
+                },
+                upsert=True
+            )
+            for (day, product_id), rollup in product_days.items()
+        ], ordered=False, session=session)
+
+async def commit_sale_without_transaction(doc: dict, stock: dict):
+    """Standalone MongoDB için: kalem kalem koşullu düşüm, hata olursa uygulananları geri ekler"""
+    applied = []
+    for product_id, qty in stock.items():
+        result = await db.products.update_one(
+            {"id": product_id, "quantity": {"$gte": qty}},
+            stock_delta_update(-qty)
+        )
+        if result.modified_count == 0:
+            if applied:
+                await db.products.bulk_write([
+                    UpdateOne({"id": pid}, stock_delta_update(q)) for pid, q in applied
+                ], ordered=False)
+            raise InsufficientStockError(await stock_shortages(stock))
+        applied.append((product_id, qty))
+    
+    try:
+        await commit_sale(doc, {})
+    except DuplicateKeyError:
+        # Aynı client_sale_id ile satış zaten kayıtlı: düşülen stoğu geri ekle
+        if applied:
+            await db.products.bulk_write([
+                UpdateOne({"id": pid}, stock_delta_update(q)) for pid, q in applied
+            ], ordered=False)
+        raise
+
+async def product_costs(product_ids: List[str]) -> dict:
+    return {
+        p["id"]: p["purchase_price"]
+        async for p in db.products.find({"id": {"$in": list(set(product_ids))}}, {"_id": 0, "id": 1, "purchase_price": 1})
+    }
+
+def new_sale(sale_dict: dict, cashier_id: str, costs: dict) -> Sale:
+    sale_dict["final_amount"] = sale_dict["total_amount"] - sale_dict["discount"]
+    sale_dict["cashier_id"] = cashier_id
+    # Satış anındaki maliyeti kalemlere yaz; kâr raporu bu değeri kullanır
+    for item in sale_dict["items"]:
+        item["purchase_price"] = costs.get(item["product_id"])
+    return Sale(**sale_dict)
+
+def sale_document(sale: Sale) -> dict:
+    doc = sale.model_dump()
+    # client_sale_id unique + sparse indekslidir: alanı olmayan satışlar indekse girmez
+    if doc["client_sale_id"] is None:
+        del doc["client_sale_id"]
+    return doc
+
+async def sale_by_client_id(client_sale_id: str) -> Optional[dict]:
+    return await db.sales.find_one({"client_sale_id": client_sale_id}, {"_id": 0})
+
 @api_router.post("/sales", response_model=Sale)
 async def create_sale(sale_data: SaleCreate, current_user: User = Depends(get_current_user)):
-    sale_dict = sale_data.model_dump()
-    sale_dict["final_amount"] = sale_dict["total_amount"] - sale_dict["discount"]
-    sale_dict["cashier_id"] = current_user.id
+    # Tekrar gönderilen satış: stok düşmeden ilk kaydı döndür
+    if sale_data.client_sale_id:
+        existing = await sale_by_client_id(sale_data.client_sale_id)
+        if existing:
+            return existing
     
-    sale = Sale(**sale_dict)
-    doc = sale.model_dump()
-    doc["created_at"] = doc["created_at"].isoformat()
+    costs = await product_costs([item["product_id"] for item in sale_data.items])
+    sale = new_sale(sale_data.model_dump(), current_user.id, costs)
+    doc = sale_document(sale)
     
-    # Update product quantities
-    for item in sale.items:
-        await db.products.update_one(
-            {"id": item["product_id"]},
-            {"$inc": {"quantity": -item["quantity"]}}
+    stock = cart_stock(sale.items)
+    with barcode_stock_write():
+        try:
+            if await transactions_supported():
+                async with await client.start_session() as session:
+                    await session.with_transaction(lambda s: commit_sale(doc, stock, s))
+            else:
+                await commit_sale_without_transaction(doc, stock)
+        except InsufficientStockError as e:
+            raise HTTPException(status_code=409, detail={"message": "Yetersiz stok", "items": e.items})
+        except DuplicateKeyError:
+            # Aynı satış eşzamanlı başka bir istekle kaydedildi; bu istek geri alındı
+            return await sale_by_client_id(sale_data.client_sale_id)
+        await publish_stock_changes(stock)
+    return sale
+
+# Offline sales sync
+# PWA çevrimdışıyken yaptığı satışları cihazda verdiği client_sale_id ile
+# kuyruğa alır ve bağlantı gelince toplu gönderir. sales.client_sale_id
+# üzerindeki unique indeks tekrar gönderilen satışları eler. Çevrimdışı
+# satış fiziken gerçekleşmiş olduğundan stok yetmese de kaydedilir; stoğu
+# eksiye düşen ürünler cevapta uyarı olarak döner.
+SALES_SYNC_MAX_BATCH = int(os.environ.get('SALES_SYNC_MAX_BATCH', 500))
+
+def sync_stock(docs: List[dict]) -> dict:
+    stock = {}
+    for doc in docs:
+        for item in doc["items"]:
+            stock[item["product_id"]] = stock.get(item["product_id"], 0) + item["quantity"]
+    return stock
+
+async def apply_synced_stock(stock: dict, session=None):
+    # Ürün başına tek koşulsuz düşüm; is_low_stock aynı update'te güncellenir
+    if stock:
+        await db.products.bulk_write([
+            UpdateOne({"id": product_id}, stock_delta_update(-qty)) for product_id, qty in stock.items()
+        ], ordered=False, session=session)
+
+async def insert_synced_sales(docs: List[dict]) -> List[dict]:
+    """Transaction'sız: önce satışlar yazılır, unique indekse takılanlar atlanır"""
+    try:
+        await db.sales.insert_many(docs, ordered=False)
+        inserted = docs
+    except BulkWriteError as e:
+        duplicates = {err["index"] for err in e.details["writeErrors"] if err.get("code") == 11000}
+        if len(duplicates) < len(e.details["writeErrors"]):
+            raise
+        inserted = [doc for index, doc in enumerate(docs) if index not in duplicates]
+    await apply_synced_stock(sync_stock(inserted))
+    await apply_sale_totals(inserted)
+    return inserted
+
+async def synced_sale_ids(client_sale_ids: List[str]) -> dict:
+    """client_sale_id -> kayıtlı satış id'si"""
+    return {
+        s["client_sale_id"]: s["id"]
+        async for s in db.sales.find(
+            {"client_sale_id": {"$in": client_sale_ids}},
+            {"_id": 0, "id": 1, "client_sale_id": 1}
         )
+    }
+
+async def commit_synced_sales(docs: List[dict], session):
+    await db.sales.insert_many(docs, session=session)
+    await apply_synced_stock(sync_stock(docs), session)
+    await apply_sale_totals(docs, session)
+
+@api_router.post("/sales/sync")
+async def sync_sales(data: SaleSyncRequest, current_user: User = Depends(get_current_user)):
+    """Çevrimdışı kuyruktaki satışları idempotent olarak toplu kaydeder"""
+    if len(data.sales) > SALES_SYNC_MAX_BATCH:
+        raise HTTPException(status_code=400, detail=f"En fazla {SALES_SYNC_MAX_BATCH} satış gönderilebilir")
     
-    # Update customer total spent
-    if sale.customer_id:
-        await db.customers.update_one(
-            {"id": sale.customer_id},
-            {"$inc": {"total_spent": sale.final_amount}}
-        )
+    results = {}
+    candidates = []
+    for sale_data in data.sales:
+        if sale_data.client_sale_id in results:
+            continue
+        results[sale_data.client_sale_id] = {"client_sale_id": sale_data.client_sale_id, "status": "pending"}
+        candidates.append(sale_data)
     
-    await db.sales.insert_one(doc)
-    return sale
+    product_ids = [item["product_id"] for sale_data in candidates for item in sale_data.items]
+    costs = await product_costs(product_ids)
+    
+    for attempt in range(2):
+        existing = await synced_sale_ids([sale_data.client_sale_id for sale_data in candidates])
+        docs = []
+        for sale_data in candidates:
+            result = results[sale_data.client_sale_id]
+            if sale_data.client_sale_id in existing:
+                result.update(status="duplicate", sale_id=existing[sale_data.client_sale_id])
+                continue
+            missing = [item["product_id"] for item in sale_data.items if item["product_id"] not in costs]
+            try:
+                cart_stock(sale_data.items)
+            except HTTPException as e:
+                result.update(status="rejected", error=e.detail)
+                continue
+            if missing:
+                result.update(status="rejected", error=f"Ürün bulunamadı: {', '.join(missing)}")
+                continue
+            sale_dict = sale_data.model_dump()
+            if sale_dict["created_at"] is None:
+                del sale_dict["created_at"]
+            elif sale_dict["created_at"].tzinfo is None:
+                sale_dict["created_at"] = sale_dict["created_at"].replace(tzinfo=timezone.utc)
+            else:
+                sale_dict["created_at"] = sale_dict["created_at"].astimezone(timezone.utc)
+            doc = sale_document(new_sale(sale_dict, current_user.id, costs))
+            docs.append(doc)
+            result.update(status="created", sale_id=doc["id"])
+        
+        if not docs:
+            break
+        try:
+            with barcode_stock_write():
+                if await transactions_supported():
+                    async with await client.start_session() as session:
+                        await session.with_transaction(lambda s: commit_synced_sales(docs, s))
+                    inserted = docs
+                else:
+                    inserted = await insert_synced_sales(docs)
+                await publish_stock_changes(sync_stock(inserted))
+        except BulkWriteError as e:
+            # Aynı satış başka bir istekle eşzamanlı kaydedildi: transaction geri alındı, bir kez daha dene
+            if attempt == 0 and all(err.get("code") == 11000 for err in e.details["writeErrors"]):
+                continue
+            raise
+        # Transaction'sız yolda başka istek tarafından aynı anda kaydedilmiş olanlar
+        inserted_ids = {doc["client_sale_id"] for doc in inserted}
+        skipped = [doc["client_sale_id"] for doc in docs if doc["client_sale_id"] not in inserted_ids]
+        for client_sale_id, sale_id in (await synced_sale_ids(skipped) if skipped else {}).items():
+            results[client_sale_id].update(status="duplicate", sale_id=sale_id)
+        break
+    
+    stock = sync_stock(docs)
+    negative = await db.products.find(
+        {"id": {"$in": list(stock)}, "quantity": {"$lt": 0}}, {"_id": 0, "id": 1, "name": 1, "quantity": 1}
+    ).to_list(None) if stock else []
+    
+    statuses = [result["status"] for result in results.values()]
+    return {
+        "results": list(results.values()),
+        "created": statuses.count("created"),
+        "duplicates": statuses.count("duplicate"),
+        "rejected": statuses.count("rejected"),
+        "stock_warnings": negative
+    }
 
 @api_router.get("/sales", response_model=List[Sale])
 async def get_sales(
+    response: Response,
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Sayfa boyutu (varsayılan DEFAULT_PAGE_SIZE)"),
+    after: Optional[str] = Query(None, description="Önceki sayfanın X-Next-Cursor değeri"),
+    stream: bool = Query(False, description="NDJSON olarak akış halinde döndür"),
     current_user: User = Depends(get_current_user)
 ):
     query = {}
     if start_date and end_date:
         query["created_at"] = {
-            "$gte": datetime.fromisoformat(start_date).isoformat(),
-            "$lte": datetime.fromisoformat(end_date).isoformat()
+            "$gte": datetime.fromisoformat(start_date),
+            "$lte": datetime.fromisoformat(end_date)
         }
     
-    sales = await db.sales.find(query, {"_id": 0}).sort("created_at", -1).to_list(1000)
-    for s in sales:
-        if isinstance(s["created_at"], str):
-            s["created_at"] = datetime.fromisoformat(s["created_at"])
+    cursor = keyset_cursor("sales", query, DESCENDING, after)
+    if stream:
+        return ndjson_response(cursor.limit(limit or 0))
+    sales = await fetch_page(cursor, limit, response)
     return sales
 
+# Customer search
+# Arama, müşteri dokümanında tutulan normalize alanlar üzerinde çalışır:
+# search_tokens (Türkçe küçük harfe çevrilmiş isim kelimeleri) ve
+# search_phones (telefonun yalnızca rakamlardan oluşan biçimleri).
+# Her ikisi de indekslidir; sorgular başa sabitlenmiş önek aramasıdır.
+CUSTOMER_PROJECTION = {"_id": 0, "search_name": 0, "search_tokens": 0, "search_phones": 0}
+
+def fold_turkish(text: str) -> str:
+    """Türkçe kurallarıyla küçük harfe çevirir (I→ı, İ→i)"""
+    text = unicodedata.normalize("NFC", text or "")
+    return " ".join(text.replace("I", "ı").replace("İ", "i").lower().split())
+
+def phone_keys(phone: str) -> List[str]:
+    """0532..., 532... ve +90 532... yazımlarının hepsi önekle bulunabilsin"""
+    digits = re.sub(r"\D", "", phone or "")
+    if digits.startswith("90") and len(digits) == 12:
+        digits = "0" + digits[2:]
+    return sorted({key for key in (digits, digits.lstrip("0")) if key})
+
+def customer_search_fields(name: Optional[str] = None, phone: Optional[str] = None) -> dict:
+    fields = {}
+    if name is not None:
+        fields["search_name"] = fold_turkish(name)
+        fields["search_tokens"] = sorted(set(fields["search_name"].split()))
+    if phone is not None:
+        fields["search_phones"] = phone_keys(phone)
+    return fields
+
 # Customer endpoints
 @api_router.post("/customers", response_model=Customer)
 async def create_customer(customer_data: CustomerCreate, current_user: User = Depends(get_current_user)):
     customer = Customer(**customer_data.model_dump())
     doc = customer.model_dump()
-    doc["created_at"] = doc["created_at"].isoformat()
+    doc.update(customer_search_fields(customer.name, customer.phone))
     
     await db.customers.insert_one(doc)
     return customer
 
 @api_router.get("/customers", response_model=List[Customer])
-async def get_customers(current_user: User = Depends(get_current_user)):
-    customers = await db.customers.find({"deleted": {"$ne": True}}, {"_id": 0}).to_list(1000)
-    for c in customers:
-        if isinstance(c["created_at"], str):
-            c["created_at"] = datetime.fromisoformat(c["created_at"])
+async def get_customers(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Sayfa boyutu (varsayılan DEFAULT_PAGE_SIZE)"),
+    after: Optional[str] = Query(None, description="Önceki sayfanın X-Next-Cursor değeri"),
+    stream: bool = Query(False, description="NDJSON olarak akış halinde döndür"),
+    current_user: User = Depends(get_current_user)
+):
+    cursor = keyset_cursor("customers", {"deleted": {"$ne": True}}, ASCENDING, after, CUSTOMER_PROJECTION)
+    if stream:
+        return ndjson_response(cursor.limit(limit or 0))
+    customers = await fetch_page(cursor, limit, response)
     return customers
 
 @api_router.get("/customers/{customer_id}/purchases")
 async def get_customer_purchases(customer_id: str, current_user: User = Depends(get_current_user)):
     sales = await db.sales.find({"customer_id": customer_id}, {"_id": 0}).sort("created_at", -1).to_list(100)
-    for s in sales:
-        if isinstance(s["created_at"], str):
-            s["created_at"] = datetime.fromisoformat(s["created_at"])
     return sales
 
 @api_router.put("/customers/{customer_id}")
 async def update_customer(customer_id: str, customer_data: dict, current_user: User = Depends(get_current_user)):
-    result = await db.customers.update_one({"id": customer_id}, {"$set": customer_data})
+    update = {**customer_data, **customer_search_fields(customer_data.get("name"), customer_data.get("phone"))}
+    result = await db.customers.update_one({"id": customer_id}, {"$set": update})
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Customer not found")
-    customer = await db.customers.find_one({"id": customer_id}, {"_id": 0})
-    if isinstance(customer["created_at"], str):
-        customer["created_at"] = datetime.fromisoformat(customer["created_at"])
+    customer = await db.customers.find_one({"id": customer_id}, CUSTOMER_PROJECTION)
     return customer
 
 @api_router.delete("/customers/{customer_id}")
@@ -457,23 +1695,142 @@ async def delete_customer(customer_id: str, current_user: User = Depends(get_cur
 @api_router.get("/customers/search")
 async def search_customers(
     q: str = Query(..., description="Arama terimi (isim veya telefon)"),
+    limit: int = Query(100, ge=1, le=100),
     current_user: User = Depends(get_current_user)
 ):
-    """Müşterileri isim veya telefon numarasına göre arar"""
-    search_query = {
-        "$and": [
-            {"$or": [{"deleted": {"$exists": False}}, {"deleted": False}]},
-            {
-                "$or": [
-                    {"name": {"$regex": q, "$options": "i"}},
-                    {"phone": {"$regex": q, "$options": "i"}}
-                ]
-            }
-        ]
+    """Müşterileri isim veya telefon numarasının başına göre arar"""
+    words = fold_turkish(q).split()
+    if not words:
+        return []
+    
+    digits = re.sub(r"\D", "", q)
+    if q.strip().startswith("+90"):
+        digits = "0" + digits[2:]
+    if digits and not re.search(r"[^\d\s+()-]", q):
+        # Telefon araması: baştaki 0 yazılsa da yazılmasa da eşleşir
+        match = {"search_phones": {"$regex": f"^{digits}"}}
+    else:
+        # Her kelime, isimdeki kelimelerden birinin başıyla eşleşmeli
+        match = {"$and": [{"search_tokens": {"$regex": f"^{re.escape(word)}"}} for word in words]}
+    
+    projection = {k: v for k, v in CUSTOMER_PROJECTION.items() if k != "search_name"}
+    candidates = await db.customers.find(
+        {**match, "deleted": {"$ne": True}}, projection
+    ).limit(limit * 2).to_list(limit * 2)
+    
+    # Sıralama: ismin başı eşleşenler, sonra tam kelime eşleşenler, sonra kısa isimler
+    phrase = " ".join(words)
+    def rank(customer):
+        name = customer.get("search_name", "")
+        return (not name.startswith(phrase), words[0] not in name.split(), len(name), name)
+    
+    candidates.sort(key=rank)
+    for customer in candidates:
+        customer.pop("search_name", None)
+    return candidates[:limit]
+
+# Product daily rollups
+# sales_daily_product: gün (UTC) ve ürün başına satılan miktar, ciro, maliyet ve
+# kâr. apply_sale_totals her satışta artırır; raporlar tarih aralığının tam
+# günlerini buradan, gün ortasına düşen uçlarını satışlardan okur. Böylece
+# okunan satır sayısı satış hacminden bağımsızdır (en fazla gün x ürün).
+PRODUCT_ROLLUP_FIELDS = ("quantity", "revenue", "cost", "profit", "costed_quantity")
+
+def sale_items_rollup_group(group_id) -> dict:
+    """$unwind edilmiş satış kalemlerinden apply_sale_totals ile aynı toplamlar"""
+    # purchase_price sayı veya null'dur (maliyeti bilinmeyen ürün), eski satışlarda hiç yoktur
+    costed = {"$ne": [{"$ifNull": ["$items.purchase_price", None]}, None]}
+    return {
+        "$group": {
+            "_id": group_id,
+            "product_name": {"$first": "$items.name"},
+            "quantity": {"$sum": "$items.quantity"},
+            "revenue": {"$sum": "$items.total"},
+            "cost": {"$sum": {"$cond": [costed, {"$multiply": ["$items.purchase_price", "$items.quantity"]}, 0]}},
+            "profit": {"$sum": {"$cond": [
+                costed,
+                {"$multiply": [{"$subtract": ["$items.price", "$items.purchase_price"]}, "$items.quantity"]},
+                0
+            ]}},
+            "costed_quantity": {"$sum": {"$cond": [costed, "$items.quantity", 0]}}
+        }
+    }
+
+PRODUCT_ROLLUP_GROUP = {
+    "$group": {
+        "_id": "$product_id",
+        "product_name": {"$first": "$product_name"},
+        **{field: {"$sum": f"${field}"} for field in PRODUCT_ROLLUP_FIELDS}
     }
+}
+
+def report_datetime(value: str) -> datetime:
+    value = datetime.fromisoformat(value)
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+def start_of_day(value: datetime) -> datetime:
+    return value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def report_range(start: datetime, end: datetime) -> Tuple[Optional[dict], List[dict]]:
+    """[start, end] aralığını rollup'tan okunacak tam günlere ve satışlardan okunacak uçlara böler
     
-    customers = await db.customers.find(search_query, {"_id": 0}).to_list(100)
-    return customers
+    Rollup kullanan tüm raporlar aynı sınırı kullanır: start ve end dahil, tam
+    zaman damgası. Tam gün yoksa gün filtresi None'dır.
+    """
+    first_day = start_of_day(start)
+    if first_day < start:
+        first_day += timedelta(days=1)
+    days_end = start_of_day(end)  # tam günler: first_day <= gün < days_end
+    if first_day < days_end:
+        days = {"$gte": first_day.date().isoformat(), "$lt": days_end.date().isoformat()}
+        return days, [{"created_at": {"$gte": start, "$lt": first_day}}, {"created_at": {"$gte": days_end, "$lte": end}}]
+    return None, [{"created_at": {"$gte": start, "$lte": end}}]
+
+async def product_sales_totals(start: datetime, end: datetime, sort_field: str, limit: int, costed_only: bool = False) -> List[dict]:
+    """[start, end] aralığında sort_field'a göre ilk limit ürünün toplamları"""
+    days, edges = report_range(start, end)
+    
+    edge_totals = {
+        row["_id"]: row
+        async for row in db.sales.aggregate([
+            {"$match": {"$or": edges}},
+            {"$unwind": "$items"},
+            sale_items_rollup_group("$items.product_id")
+        ])
+    }
+    
+    totals = {}
+    if days:
+        day_match = {"day": days}
+        having = [{"$match": {"costed_quantity": {"$gt": 0}}}] if costed_only else []
+        # Uçlardaki satışlar yalnızca edge_totals'taki ürünlerin sırasını değiştirir:
+        # diğerlerinden ilk limit tanesi tam günlerin ilk limit + len(edge_totals) satırındadır
+        top = db.sales_daily_product.aggregate([
+            {"$match": day_match},
+            PRODUCT_ROLLUP_GROUP,
+            *having,
+            {"$sort": {sort_field: -1}},
+            {"$limit": limit + len(edge_totals)}
+        ])
+        async for row in top:
+            totals[row["_id"]] = row
+        if edge_totals:
+            async for row in db.sales_daily_product.aggregate([
+                {"$match": {**day_match, "product_id": {"$in": list(edge_totals)}}},
+                PRODUCT_ROLLUP_GROUP
+            ]):
+                totals[row["_id"]] = row
+    
+    for product_id, edge in edge_totals.items():
+        if product_id in totals:
+            for field in PRODUCT_ROLLUP_FIELDS:
+                totals[product_id][field] += edge[field]
+        else:
+            totals[product_id] = edge
+    
+    rows = [row for row in totals.values() if not costed_only or row["costed_quantity"] > 0]
+    rows.sort(key=lambda row: row[sort_field], reverse=True)
+    return rows[:limit]
 
 # Reports endpoints
 @api_router.get("/reports/top-selling")
@@ -483,30 +1840,16 @@ async def get_top_selling(
     limit: int = 10,
     current_user: User = Depends(get_current_user)
 ):
-    pipeline = [
+    rows = await product_sales_totals(report_datetime(start_date), report_datetime(end_date), "quantity", limit)
+    return [
         {
-            "$match": {
-                "created_at": {
-                    "$gte": datetime.fromisoformat(start_date).isoformat(),
-                    "$lte": datetime.fromisoformat(end_date).isoformat()
-                }
-            }
-        },
-        {"$unwind": "$items"},
-        {
-            "$group": {
-                "_id": "$items.product_id",
-                "product_name": {"$first": "$items.name"},
-                "total_quantity": {"$sum": "$items.quantity"},
-                "total_revenue": {"$sum": "$items.total"}
-            }
-        },
-        {"$sort": {"total_quantity": -1}},
-        {"$limit": limit}
+            "_id": row["_id"],
+            "product_name": row["product_name"],
+            "total_quantity": row["quantity"],
+            "total_revenue": row["revenue"]
+        }
+        for row in rows
     ]
-    
-    results = await db.sales.aggregate(pipeline).to_list(limit)
-    return results
 
 @api_router.get("/reports/top-profit")
 async def get_top_profit(
@@ -515,71 +1858,300 @@ async def get_top_profit(
     limit: int = 10,
     current_user: User = Depends(get_current_user)
 ):
-    sales = await db.sales.find({
-        "created_at": {
-            "$gte": datetime.fromisoformat(start_date).isoformat(),
-            "$lte": datetime.fromisoformat(end_date).isoformat()
+    # Kâr, satış kalemindeki maliyet anlık görüntüsünden (purchase_price) hesaplanır.
+    # Bu alanı olmayan eski satışlar için: python manage.py backfill-sale-costs,
+    # ardından python manage.py rebuild-product-daily-totals
+    rows = await product_sales_totals(
+        report_datetime(start_date), report_datetime(end_date), "profit", limit, costed_only=True
+    )
+    return [
+        {
+            "product_id": row["_id"],
+            "product_name": row["product_name"],
+            "total_profit": row["profit"],
+            "total_quantity": row["costed_quantity"]
         }
-    }, {"_id": 0}).to_list(10000)
-    
-    product_profits = {}
-    for sale in sales:
-        for item in sale["items"]:
-            product = await db.products.find_one({"id": item["product_id"]}, {"_id": 0})
-            if product:
-                profit = (item["price"] - product["purchase_price"]) * item["quantity"]
-                if item["product_id"] in product_profits:
-                    product_profits[item["product_id"]]["total_profit"] += profit
-                    product_profits[item["product_id"]]["total_quantity"] += item["quantity"]
-                else:
-                    product_profits[item["product_id"]] = {
-                        "product_name": item["name"],
-                        "total_profit": profit,
-                        "total_quantity": item["quantity"]
-                    }
+        for row in rows
+    ]
+
+@api_router.get("/reports/sales-over-time")
+async def get_sales_over_time(
+    start_date: str,
+    end_date: str,
+    product_id: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """Gün başına satış miktarı, ciro ve kâr; product_id verilirse tek ürün için"""
+    days, edges = report_range(report_datetime(start_date), report_datetime(end_date))
+    item_match = [{"$match": {"items.product_id": product_id}}] if product_id else []
     
-    sorted_profits = sorted(product_profits.items(), key=lambda x: x[1]["total_profit"], reverse=True)[:limit]
-    return [{"product_id": k, **v} for k, v in sorted_profits]
+    # Uç günler kısmidir: satışlardan, apply_sale_totals ile aynı UTC gününe göre toplanır
+    totals = {
+        row["_id"]: row
+        async for row in db.sales.aggregate([
+            {"$match": {"$or": edges}},
+            {"$unwind": "$items"},
+            *item_match,
+            sale_items_rollup_group({"$dateToString": {"format": "%Y-%m-%d", "date": "$created_at"}})
+        ])
+    }
+    if days:
+        match = {"day": days}
+        if product_id:
+            match["product_id"] = product_id
+        async for row in db.sales_daily_product.aggregate([
+            {"$match": match},
+            {"$group": {"_id": "$day", **{field: {"$sum": f"${field}"} for field in PRODUCT_ROLLUP_FIELDS}}}
+        ]):
+            totals[row["_id"]] = row
+    
+    return [
+        {"day": day, **{field: totals[day][field] for field in ("quantity", "revenue", "cost", "profit")}}
+        for day in sorted(totals)
+    ]
 
-@api_router.get("/products/filters")
-async def get_product_filters(current_user: User = Depends(get_current_user)):
-    """Ürünlerden benzersiz marka ve kategori listesini döndürür"""
-    brands = await db.products.distinct("brand")
-    categories = await db.products.distinct("category")
+# Demand forecast
+# Ürün başına günlük talep hızı, emniyet stoğu ve önerilen sipariş noktası.
+# Geçmiş sales_daily_product'tan tek aggregate ile ürün başına dizi olarak
+# okunur; hesap tüm katalog için NumPy vektörleriyle tek geçişte yapılır:
+#   hareketli ortalama: son FORECAST_WINDOW_DAYS günün günlük ortalaması
+#   mevsimsel: geçen yılın önümüzdeki FORECAST_WINDOW_DAYS günü, son dönemin
+#     geçen yılın aynı dönemine oranıyla (0.5-2 arası) ölçeklenir; bir yıllık
+#     geçmişi olan ürünlerde tahmin iki hızın ortalamasıdır
+#   emniyet stoğu: z(REORDER_SERVICE_LEVEL) x günlük talebin son
+#     FORECAST_VARIABILITY_DAYS gündeki standart sapması x sqrt(tedarik süresi)
+# Günler UTC'dir ve bugün (yarım gün) hesaba girmez.
+FORECAST_WINDOW_DAYS = int(os.environ.get('FORECAST_WINDOW_DAYS', 28))
+FORECAST_VARIABILITY_DAYS = int(os.environ.get('FORECAST_VARIABILITY_DAYS', 91))
+REORDER_LEAD_TIME_DAYS = float(os.environ.get('REORDER_LEAD_TIME_DAYS', 7))
+REORDER_SERVICE_LEVEL = float(os.environ.get('REORDER_SERVICE_LEVEL', 0.95))
+SEASON_DAYS = 364  # 52 hafta: haftanın günleri hizalı kalır
+FORECAST_WRITE_BATCH = 1000
+
+def forecast_demand(ages: np.ndarray, quantities: np.ndarray, rows: np.ndarray,
+                    available_days: np.ndarray, stock: np.ndarray) -> dict:
+    """ages: satış satırının kaç gün önce olduğu (1 = dün), rows: satırın ürün
+    indeksi, available_days: ürünün kaç gündür satışta olduğu; ürün başına diziler döner"""
+    count = len(stock)
+    window, variability = FORECAST_WINDOW_DAYS, FORECAST_VARIABILITY_DAYS
+    
+    def window_sum(first: int, last: int, weights: np.ndarray = quantities) -> np.ndarray:
+        mask = (ages >= first) & (ages <= last)
+        return np.bincount(rows[mask], weights=weights[mask], minlength=count)
+    
+    def ratio(numerator, denominator, where):
+        return np.divide(numerator, denominator, out=np.zeros(count), where=where)
     
+    # Yeni ürünlerde ortalama yalnızca satışta olduğu günler üzerinden alınır
+    recent_days = np.clip(available_days, 0, window)
+    moving_average = ratio(window_sum(1, window), recent_days, recent_days > 0)
+    
+    variability_days = np.clip(available_days, 0, variability)
+    mean = ratio(window_sum(1, variability), variability_days, variability_days > 0)
+    sum_squares = window_sum(1, variability, quantities * quantities)
+    variance = ratio(sum_squares - variability_days * mean ** 2, variability_days - 1, variability_days > 1)
+    deviation = np.sqrt(np.clip(variance, 0, None))
+    
+    last_year_recent = window_sum(SEASON_DAYS + 1, SEASON_DAYS + window) / window
+    last_year_ahead = window_sum(SEASON_DAYS - window + 1, SEASON_DAYS) / window
+    seasonal_known = (available_days >= SEASON_DAYS + window) & (last_year_recent > 0)
+    trend = np.clip(ratio(moving_average, last_year_recent, seasonal_known), 0.5, 2)
+    seasonal = np.where(seasonal_known, last_year_ahead * trend, np.nan)
+    rate = np.where(seasonal_known, (moving_average + np.nan_to_num(seasonal)) / 2, moving_average)
+    
+    safety_stock = NormalDist().inv_cdf(REORDER_SERVICE_LEVEL) * deviation * np.sqrt(REORDER_LEAD_TIME_DAYS)
+    reorder_point = np.ceil(rate * REORDER_LEAD_TIME_DAYS + safety_stock)
+    days_of_cover = np.divide(stock, rate, out=np.full(count, np.nan), where=rate > 0)
     return {
-        "brands": sorted([b for b in brands if b]),  # Boş olmayan markalar
-        "categories": sorted([c for c in categories if c])  # Boş olmayan kategoriler
+        "daily_demand": rate,
+        "moving_average": moving_average,
+        "seasonal": seasonal,
+        "safety_stock": safety_stock,
+        "reorder_point": reorder_point,
+        "days_of_cover": days_of_cover
     }
 
-@api_router.get("/reports/stock")
-async def get_stock_report(
-    brand: Optional[str] = Query(None, description="Marka filtresi"),
-    category: Optional[str] = Query(None, description="Kategori filtresi"),
-    current_user: User = Depends(get_current_user)
-):
-    """Stok raporunu filtrelerle birlikte döndürür"""
-    query = {}
+async def load_demand_history(today, product_index: dict) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(ages, quantities, rows): tahminin ihtiyaç duyduğu son SEASON_DAYS + pencere günü"""
+    since = (today - timedelta(days=SEASON_DAYS + FORECAST_WINDOW_DAYS)).isoformat()
+    days, quantities, rows, lengths = [], [], [], []
+    # Ürün başına tek doküman: milyonlarca satırın Python nesnesine çevrilmesi yerine diziler
+    async for doc in db.sales_daily_product.aggregate([
+        {"$match": {"day": {"$gte": since, "$lt": today.isoformat()}}},
+        {"$group": {"_id": "$product_id", "days": {"$push": "$day"}, "quantities": {"$push": "$quantity"}}}
+    ], allowDiskUse=True):
+        row = product_index.get(doc["_id"])
+        if row is None:
+            continue  # silinmiş ürün
+        days.extend(doc["days"])
+        quantities.extend(doc["quantities"])
+        rows.append(row)
+        lengths.append(len(doc["days"]))
+    ages = (np.datetime64(today, "D") - np.array(days, dtype="datetime64[D]")).astype(np.int64)
+    return ages, np.array(quantities, dtype=np.float64), np.repeat(np.array(rows, dtype=np.int64), lengths)
+
+async def run_demand_forecast(apply_min_quantity: bool = False, job_id: Optional[str] = None) -> dict:
+    """Tüm ürünlerin sipariş noktasını hesaplayıp products'a yazar; apply_min_quantity
+    verilirse talebi olan ürünlerin min_quantity'si de önerilen sipariş noktasına çekilir"""
+    timings = {}
+    started = time.perf_counter()
+    now = datetime.now(timezone.utc)
+    today = now.date()
+    horizon = SEASON_DAYS + FORECAST_WINDOW_DAYS
     
-    if brand:
-        query["brand"] = {"$regex": brand, "$options": "i"}
+    products = await db.products.find({}, {"_id": 0, "id": 1, "quantity": 1, "created_at": 1}).to_list(None)
+    product_index = {product["id"]: row for row, product in enumerate(products)}
+    ages, quantities, rows = await load_demand_history(today, product_index)
+    timings["load"] = time.perf_counter() - started
     
-    if category:
-        query["category"] = {"$regex": category, "$options": "i"}
+    # Satışta olunan gün: oluşturulma tarihi veya (içe aktarılmış ürünlerde) ilk satış, hangisi eskiyse
+    available_days = np.array([
+        (today - product["created_at"].date()).days if product.get("created_at") else horizon
+        for product in products
+    ], dtype=np.int64)
+    oldest_sale = np.zeros(len(products), dtype=np.int64)
+    np.maximum.at(oldest_sale, rows, ages)
+    available_days = np.clip(np.maximum(available_days, oldest_sale), 0, horizon)
+    stock = np.array([product["quantity"] for product in products], dtype=np.float64)
+    
+    computed = time.perf_counter()
+    forecast = await asyncio.get_running_loop().run_in_executor(
+        None, forecast_demand, ages, quantities, rows, available_days, stock
+    )
+    timings["compute"] = time.perf_counter() - computed
+    
+    written = time.perf_counter()
+    columns = {key: forecast[key].tolist() for key in forecast}
+    below = 0
+    operations = []
+    for row, product in enumerate(products):
+        reorder_point = int(columns["reorder_point"][row])
+        seasonal = columns["seasonal"][row]
+        below += columns["daily_demand"][row] > 0 and product["quantity"] <= reorder_point
+        fields = {
+            "reorder_point": reorder_point,
+            "forecast": {
+                "daily_demand": round(columns["daily_demand"][row], 3),
+                "moving_average": round(columns["moving_average"][row], 3),
+                "seasonal": None if math.isnan(seasonal) else round(seasonal, 3),
+                "safety_stock": round(columns["safety_stock"][row], 2),
+                "updated_at": now
+            }
+        }
+        # Talebi görülmeyen ürünlerin elle girilmiş minimumu korunur
+        if apply_min_quantity and columns["daily_demand"][row] > 0:
+            fields["min_quantity"] = reorder_point
+        # needs_reorder/days_of_cover yazım anındaki stoktan hesaplanır
+        operations.append(UpdateOne({"id": product["id"]}, set_fields_update(fields)))
+        if len(operations) >= FORECAST_WRITE_BATCH:
+            await db.products.bulk_write(operations, ordered=False)
+            operations = []
+            if job_id:
+                await job_progress(job_id, processed=FORECAST_WRITE_BATCH)
+    if operations:
+        await db.products.bulk_write(operations, ordered=False)
+        if job_id:
+            await job_progress(job_id, processed=len(operations))
+    timings["write"] = time.perf_counter() - written
     
-    products = await db.products.find(query, {"_id": 0}).sort("name", 1).to_list(10000)
+    invalidate_barcodes()
+    barcode_cache.clear()
+    if apply_min_quantity:
+        publish_inventory({"type": "reset"})
     
-    # Stok raporunu hazırla
-    report_data = []
-    total_value = 0
-    total_items = 0
+    return {
+        "products": len(products),
+        "history_rows": len(ages),
+        "with_demand": int(np.count_nonzero(forecast["daily_demand"] > 0)),
+        "below_reorder_point": int(below),
+        "seconds": {key: round(value, 3) for key, value in timings.items()}
+    }
+
+async def run_forecast_job(job_id: str, apply_min_quantity: bool):
+    summary = await run_demand_forecast(apply_min_quantity, job_id)
+    await job_progress(job_id, summary=summary)
+
+@api_router.post("/reports/reorder/jobs")
+async def create_forecast_job(data: Optional[dict] = None, current_user: User = Depends(get_current_user)):
+    """Talep tahmini ve sipariş noktası hesaplama işini başlatır"""
+    apply_min_quantity = bool((data or {}).get("apply_min_quantity"))
+    if apply_min_quantity and current_user.role != "yönetici":
+        raise HTTPException(status_code=403, detail="Only administrators can change minimum stock levels")
+    job_id = running_job("forecast")
+    if job_id:
+        raise HTTPException(status_code=409, detail={"message": "Tahmin işi zaten çalışıyor", "job_id": job_id})
     
+    total = await db.products.estimated_document_count()
+    job = await create_job("forecast", {"apply_min_quantity": apply_min_quantity}, total, current_user.id)
+    start_job(job, run_forecast_job(job["id"], apply_min_quantity))
+    return job
+
+@api_router.get("/reports/reorder")
+async def get_reorder_report(
+    only_needed: bool = Query(True, description="Yalnızca stoğu sipariş noktasına inmiş ürünler"),
+    limit: int = Query(100, ge=1, le=1000),
+    current_user: User = Depends(get_current_user)
+):
+    """Stoğu en erken bitecek ürünler; kalan gün stokla birlikte güncellenir (bkz. REORDER_FLAG)"""
+    # Kısmi indeksler days_of_cover sırasıyla yalnızca ilgili ürünleri tarar
+    query = {"needs_reorder": True} if only_needed else {"forecast.daily_demand": {"$gt": 0}}
+    projection = {
+        "_id": 0, "id": 1, "name": 1, "barcode": 1, "brand": 1, "category": 1,
+        "quantity": 1, "min_quantity": 1, "reorder_point": 1, "days_of_cover": 1, "forecast": 1
+    }
+    products = await db.products.find(query, projection).sort("days_of_cover", ASCENDING).limit(limit).to_list(limit)
     for product in products:
+        # Bu alan eklenmeden önce tahmini yazılmış ürünlerde yoktur (bkz. manage.py refresh-low-stock)
+        if product.get("days_of_cover") is not None:
+            product["days_of_cover"] = round(product["days_of_cover"], 1)
+    
+    return {
+        "products": products,
+        "settings": {
+            "window_days": FORECAST_WINDOW_DAYS,
+            "variability_days": FORECAST_VARIABILITY_DAYS,
+            "lead_time_days": REORDER_LEAD_TIME_DAYS,
+            "service_level": REORDER_SERVICE_LEVEL
+        }
+    }
+
+@api_router.get("/products/filters")
+async def get_product_filters(current_user: User = Depends(get_current_user)):
+    """Ürünlerden benzersiz marka ve kategori listesini, ürün sayılarıyla döndürür"""
+    facets = await get_product_facets()
+    
+    return {
+        "brands": sorted(facets["brands"]),  # Boş olmayan markalar
+        "categories": sorted(facets["categories"]),  # Boş olmayan kategoriler
+        "brand_counts": dict(facets["brands"]),
+        "category_counts": dict(facets["categories"])
+    }
+
+# Stock report
+STOCK_REPORT_COLUMNS = [
+    ("name", "Ürün Adı"),
+    ("barcode", "Barkod"),
+    ("brand", "Marka"),
+    ("category", "Kategori"),
+    ("quantity", "Miktar"),
+    ("unit_type", "Birim"),
+    ("min_quantity", "Minimum Stok"),
+    ("purchase_price", "Alış Fiyatı"),
+    ("sale_price", "Satış Fiyatı"),
+    ("stock_value", "Stok Değeri"),
+    ("status", "Durum"),
+]
+# Görsel ve açıklama gibi rapora girmeyen alanlar okunmaz
+STOCK_REPORT_PROJECTION = {"_id": 0, **{key: 1 for key, _ in STOCK_REPORT_COLUMNS if key not in ("stock_value", "status")}}
+
+async def stock_report_rows(query: dict, totals: dict):
+    """Rapor satırlarını cursor'dan geldikçe üretir, toplamları yol üzerinde biriktirir"""
+    async for product in db.products.find(query, STOCK_REPORT_PROJECTION).sort("name", 1):
         item_value = product["quantity"] * product["purchase_price"]
-        total_value += item_value
-        total_items += product["quantity"]
-        
-        report_data.append({
+        totals["total_products"] += 1
+        totals["total_items"] += product["quantity"]
+        totals["total_value"] += item_value
+        yield {
             "name": product["name"],
             "barcode": product["barcode"],
             "brand": product["brand"],
@@ -591,14 +2163,97 @@ async def get_stock_report(
             "sale_price": product["sale_price"],
             "stock_value": item_value,
             "status": "Düşük Stok" if product["quantity"] <= product["min_quantity"] else "Normal"
-        })
+        }
+
+STOCK_REPORT_SUMMARY_LABELS = ("Toplam Ürün", "Toplam Adet", "Toplam Değer")
+
+def stock_report_summary_rows(totals: dict) -> List[list]:
+    return [
+        [],
+        [STOCK_REPORT_SUMMARY_LABELS[0], totals["total_products"]],
+        [STOCK_REPORT_SUMMARY_LABELS[1], totals["total_items"]],
+        [STOCK_REPORT_SUMMARY_LABELS[2], round(totals["total_value"], 2)],
+    ]
+
+async def stock_report_csv(query: dict):
+    totals = {"total_products": 0, "total_items": 0, "total_value": 0.0}
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    
+    def flush() -> str:
+        chunk = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+        return chunk
+    
+    # BOM: Excel'in Türkçe karakterleri doğru açması için
+    buffer.write("\ufeff")
+    writer.writerow([label for _, label in STOCK_REPORT_COLUMNS])
+    async for row in stock_report_rows(query, totals):
+        writer.writerow([row[key] for key, _ in STOCK_REPORT_COLUMNS])
+        if buffer.tell() > 64 * 1024:
+            yield flush()
+    writer.writerows(stock_report_summary_rows(totals))
+    yield flush()
+
+async def stock_report_xlsx(query: dict):
+    """write_only çalışma kitabı satırları geçici dosyaya yazar; bellek kullanımı sabittir"""
+    totals = {"total_products": 0, "total_items": 0, "total_value": 0.0}
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Stok Raporu")
+    sheet.append([label for _, label in STOCK_REPORT_COLUMNS])
+    async for row in stock_report_rows(query, totals):
+        sheet.append([row[key] for key, _ in STOCK_REPORT_COLUMNS])
+    for row in stock_report_summary_rows(totals):
+        sheet.append(row)
+    
+    output = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+    await asyncio.get_running_loop().run_in_executor(None, workbook.save, output)
+    output.seek(0)
+    return output
+
+@api_router.get("/reports/stock")
+async def get_stock_report(
+    brand: Optional[str] = Query(None, description="Marka filtresi"),
+    category: Optional[str] = Query(None, description="Kategori filtresi"),
+    output: str = Query("json", alias="format", pattern="^(json|csv|xlsx)$", description="json, csv veya xlsx"),
+    current_user: User = Depends(get_current_user)
+):
+    """Stok raporunu filtrelerle birlikte döndürür; csv/xlsx tüm depoyu dosya olarak akıtır"""
+    # Filtre değerleri /products/filters listesinden seçilir: birebir ve indeksli eşleşme
+    query = {}
+    
+    if brand:
+        query["brand"] = brand
+    
+    if category:
+        query["category"] = category
+    
+    if output == "csv":
+        return StreamingResponse(
+            stock_report_csv(query),
+            media_type="text/csv; charset=utf-8",
+            headers={"Content-Disposition": 'attachment; filename="stok-raporu.csv"'}
+        )
+    
+    if output == "xlsx":
+        workbook = await stock_report_xlsx(query)
+        return StreamingResponse(
+            iter(lambda: workbook.read(64 * 1024), b""),
+            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            headers={"Content-Disposition": 'attachment; filename="stok-raporu.xlsx"'},
+            background=BackgroundTask(workbook.close)
+        )
+    
+    totals = {"total_products": 0, "total_items": 0, "total_value": 0.0}
+    report_data = [row async for row in stock_report_rows(query, totals)]
     
     return {
         "products": report_data,
         "summary": {
-            "total_products": len(report_data),
-            "total_items": total_items,
-            "total_value": round(total_value, 2),
+            "total_products": totals["total_products"],
+            "total_items": totals["total_items"],
+            "total_value": round(totals["total_value"], 2),
             "filters_applied": {
                 "brand": brand,
                 "category": category
@@ -608,110 +2263,646 @@ async def get_stock_report(
 
 @api_router.get("/reports/dashboard")
 async def get_dashboard_stats(current_user: User = Depends(get_current_user)):
-    total_products = await db.products.count_documents({})
-    low_stock = await db.products.count_documents({"$expr": {"$lte": ["$quantity", "$min_quantity"]}})
+    total_products = await db.products.estimated_document_count()
+    low_stock = await db.products.count_documents({"is_low_stock": True})
     
     today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
     week_ago = today - timedelta(days=7)
     
-    today_sales = await db.sales.find({
-        "created_at": {"$gte": today.isoformat()}
-    }, {"_id": 0}).to_list(1000)
-    
-    week_sales = await db.sales.find({
-        "created_at": {"$gte": week_ago.isoformat()}
-    }, {"_id": 0}).to_list(1000)
-    
-    today_revenue = sum(s["final_amount"] for s in today_sales)
-    week_revenue = sum(s["final_amount"] for s in week_sales)
+    # Satış hacminden bağımsız olarak en fazla 8 günlük toplam dokümanı okunur
+    days = await db.sales_daily.find(
+        {"_id": {"$gte": week_ago.date().isoformat(), "$lte": today.date().isoformat()}}
+    ).to_list(8)
+    today_totals = next((d for d in days if d["_id"] == today.date().isoformat()), {})
     
     return {
         "total_products": total_products,
         "low_stock_count": low_stock,
-        "today_sales_count": len(today_sales),
-        "today_revenue": today_revenue,
-        "week_sales_count": len(week_sales),
-        "week_revenue": week_revenue
+        "today_sales_count": today_totals.get("sales_count", 0),
+        "today_revenue": today_totals.get("revenue", 0),
+        "week_sales_count": sum(d["sales_count"] for d in days),
+        "week_revenue": sum(d["revenue"] for d in days)
     }
 
+# Product import
+# Tedarikçi kataloğu CSV/XLSX/NDJSON olarak yüklenir. Satırlar
+# PRODUCT_IMPORT_CHUNK_SIZE'lık parçalarla işlenir: parça başına tek barkod
+# sorgusu ve tek sırasız bulk_write. Cevap NDJSON akışıdır: satır hataları,
+# parça ilerlemesi ve en sonda özet (rows_per_second dahil). Dosya okuma ve
+# satır ayrıştırma (özellikle XLSX) thread havuzunda, parça parça yapılır;
+# event loop'ta yalnızca veritabanı yazımları çalışır.
+IMPORT_CHUNK_SIZE = int(os.environ.get('PRODUCT_IMPORT_CHUNK_SIZE', 1000))
+IMPORT_FIELDS = (
+    "name", "barcode", "quantity", "min_quantity", "brand", "category",
+    "purchase_price", "sale_price", "description", "unit_type", "package_quantity"
+)
+IMPORT_NUMERIC_FIELDS = ("quantity", "min_quantity", "purchase_price", "sale_price", "package_quantity")
+# Başlıklar alan adı veya stok raporundaki Türkçe etiket olabilir: rapor dosyası geri yüklenebilir
+IMPORT_HEADERS = {
+    **{fold_turkish(field): field for field in IMPORT_FIELDS},
+    **{fold_turkish(label): key for key, label in STOCK_REPORT_COLUMNS if key in IMPORT_FIELDS}
+}
+
+def import_table(content: bytes, file_format: str):
+    """(satır no, değerler) üretir; dosya okunamıyorsa ValueError"""
+    if file_format == "ndjson":
+        return None, enumerate(content.decode("utf-8-sig").splitlines(), start=1)
+    if file_format == "csv":
+        text = content.decode("utf-8-sig")
+        try:
+            dialect = csv.Sniffer().sniff(text[:4096], delimiters=",;\t")
+        except csv.Error:
+            dialect = csv.excel
+        rows = csv.reader(StringIO(text), dialect)
+    else:
+        try:
+            workbook = load_workbook(BytesIO(content), read_only=True, data_only=True)
+        except Exception as e:
+            raise ValueError(f"Excel dosyası okunamadı: {e}")
+        rows = workbook.active.iter_rows(values_only=True)
+    
+    numbered = enumerate(rows, start=1)
+    _, header = next(numbered, (0, []))
+    fields = [IMPORT_HEADERS.get(fold_turkish(str(value or ""))) for value in header]
+    if "barcode" not in fields:
+        raise ValueError("Başlık satırında barkod sütunu bulunamadı")
+    return fields, numbered
+
+def import_records(fields: Optional[list], numbered):
+    """(satır no, alanlar, hata) üretir; boş satırlar ve rapor özet satırları atlanır"""
+    for number, values in numbered:
+        if fields is None:
+            if not values.strip():
+                continue
+            try:
+                row = json.loads(values)
+            except json.JSONDecodeError as e:
+                yield number, None, f"Geçersiz JSON: {e}"
+                continue
+            if not isinstance(row, dict):
+                yield number, None, "Satır bir JSON nesnesi olmalı"
+                continue
+        else:
+            if values and values[0] in STOCK_REPORT_SUMMARY_LABELS:
+                continue
+            row = dict(zip(fields, values))
+        
+        record = {}
+        for key, value in row.items():
+            if key not in IMPORT_FIELDS or value is None or value == "":
+                continue
+            if isinstance(value, float) and value.is_integer() and key not in ("purchase_price", "sale_price"):
+                value = int(value)  # Excel sayıları float okur: 8690001 -> 8690001.0
+            if isinstance(value, str):
+                value = value.strip()
+                if key in IMPORT_NUMERIC_FIELDS and "." not in value:
+                    value = value.replace(",", ".")
+            record[key] = str(value) if key == "barcode" else value
+        if not record:
+            continue
+        if not record.get("barcode"):
+            yield number, None, "Barkod eksik"
+            continue
+        yield number, record, None
+
+def next_records(records, count: int) -> list:
+    """import_records'tan en fazla count kayıt; thread havuzunda çağrılır"""
+    return list(islice(records, count))
+
+def validation_message(error: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in error.errors())
+
+async def import_chunk(chunk: List[tuple], mode: str, stats: dict) -> List[dict]:
+    """Bir parçayı tek barkod sorgusu ve tek bulk_write ile yazar; satır hatalarını döner"""
+    errors = []
+    barcodes = [record["barcode"] for _, record in chunk]
+    existing = {
+        p["barcode"] async for p in db.products.find({"barcode": {"$in": barcodes}}, {"_id": 0, "barcode": 1})
+    }
+    now = datetime.now(timezone.utc)
+    operations, operation_rows = [], []
+    for number, record in chunk:
+        try:
+            if record["barcode"] in existing:
+                if mode == "insert":
+                    raise ValueError("Barkod zaten mevcut")
+                # Mevcut ürünlerde yalnızca dosyada dolu olan alanlar güncellenir
+                update = ProductUpdate(**record).model_dump(exclude_none=True, exclude={"image_base64"})
+                update["updated_at"] = now
+                operations.append(UpdateOne({"barcode": record["barcode"]}, set_fields_update(update)))
+                operation_rows.append((number, record["barcode"], "updated"))
+            else:
+                product = Product(**ProductCreate(**record).model_dump(exclude={"image_base64"}))
+                doc = product.model_dump()
+                doc["is_low_stock"] = is_low_stock(product.quantity, product.min_quantity)
+                operations.append(InsertOne(doc))
+                operation_rows.append((number, record["barcode"], "inserted"))
+        except ValidationError as e:
+            errors.append({"row": number, "barcode": record["barcode"], "error": validation_message(e)})
+        except ValueError as e:
+            errors.append({"row": number, "barcode": record["barcode"], "error": str(e)})
+    
+    write_errors = {}
+    if operations:
+        try:
+            await db.products.bulk_write(operations, ordered=False)
+        except BulkWriteError as e:
+            write_errors = {err["index"]: err for err in e.details["writeErrors"]}
+        invalidate_barcodes(*(barcode for _, barcode, _ in operation_rows))
+    
+    for index, (number, barcode, outcome) in enumerate(operation_rows):
+        if index in write_errors:
+            err = write_errors[index]
+            message = "Barkod zaten mevcut" if err.get("code") == 11000 else err.get("errmsg", "Yazma hatası")
+            errors.append({"row": number, "barcode": barcode, "error": message})
+        else:
+            stats[outcome] += 1
+    stats["failed"] += len(errors)
+    return errors
+
+@api_router.post("/products/import")
+async def import_products(
+    file: UploadFile = File(...),
+    input_format: Optional[str] = Query(None, alias="format", pattern="^(csv|xlsx|ndjson)$", description="Boşsa dosya uzantısından anlaşılır"),
+    mode: str = Query("upsert", pattern="^(upsert|insert)$", description="insert: mevcut barkodlar hata sayılır"),
+    current_user: User = Depends(get_current_user)
+):
+    """Ürünleri toplu ekler/günceller; sonuç satır satır NDJSON olarak akar"""
+    extension = os.path.splitext(file.filename or "")[1].lower().lstrip(".")
+    file_format = input_format or {"jsonl": "ndjson"}.get(extension, extension)
+    if file_format not in ("csv", "xlsx", "ndjson"):
+        raise HTTPException(status_code=400, detail="Desteklenen biçimler: csv, xlsx, ndjson")
+    
+    # Yanıt akarken UploadFile kapanmış olur; içerik baştan okunur
+    content = await file.read()
+    loop = asyncio.get_running_loop()
+    try:
+        fields, numbered = await loop.run_in_executor(None, import_table, content, file_format)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    async def run_import():
+        started = time.perf_counter()
+        stats = {"rows": 0, "inserted": 0, "updated": 0, "failed": 0}
+        seen = set()
+        chunk = []
+        
+        def progress(kind: str) -> str:
+            elapsed = time.perf_counter() - started
+            return json.dumps({
+                "type": kind,
+                **stats,
+                "elapsed_seconds": round(elapsed, 3),
+                "rows_per_second": round(stats["rows"] / elapsed, 1) if elapsed else None
+            }) + "\n"
+        
+        async def flush():
+            lines = [json.dumps({"type": "error", **error}, ensure_ascii=False) + "\n" for error in await import_chunk(chunk, mode, stats)]
+            chunk.clear()
+            return lines
+        
+        records = import_records(fields, numbered)
+        while batch := await loop.run_in_executor(None, next_records, records, IMPORT_CHUNK_SIZE):
+            for number, record, error in batch:
+                stats["rows"] += 1
+                if error is None and record["barcode"] in seen:
+                    error = "Dosyada tekrar eden barkod"
+                if error is not None:
+                    stats["failed"] += 1
+                    yield json.dumps({"type": "error", "row": number, "barcode": (record or {}).get("barcode"), "error": error}, ensure_ascii=False) + "\n"
+                    continue
+                seen.add(record["barcode"])
+                chunk.append((number, record))
+                if len(chunk) >= IMPORT_CHUNK_SIZE:
+                    for line in await flush():
+                        yield line
+                    yield progress("progress")
+        if chunk:
+            for line in await flush():
+                yield line
+        
+        if stats["inserted"] or stats["updated"]:
+            invalidate_product_facets()
+            # Çok sayıda ürün değişti: istemciler tek tek olay yerine listeyi yeniden çeker
+            publish_inventory({"type": "reset"})
+        yield progress("summary")
+    
+    return StreamingResponse(run_import(), media_type="application/x-ndjson")
+
+# Shared HTTP client
+# Dış servis çağrıları uygulama ömrü boyunca açık tek bir bağlantı havuzunu kullanır
+http_session: Optional[aiohttp.ClientSession] = None
+
+def get_http_session() -> aiohttp.ClientSession:
+    global http_session
+    if http_session is None or http_session.closed:
+        http_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=int(os.environ.get('HTTP_POOL_SIZE', 20)), ttl_dns_cache=300),
+            timeout=aiohttp.ClientTimeout(total=10)
+        )
+    return http_session
+
+HTTP_RETRY_STATUSES = {429, 500, 502, 503, 504}
+HTTP_RETRY_BACKOFF_SECONDS = float(os.environ.get('HTTP_RETRY_BACKOFF_SECONDS', 1.0))
+
+class RateLimiter:
+    """Çağrıları en fazla rate/sn olacak şekilde aralıklar (0: sınırsız)"""
+    def __init__(self, rate: float):
+        self.interval = 1 / rate if rate > 0 else 0
+        self.next_at = 0.0
+    
+    async def wait(self):
+        if not self.interval:
+            return
+        now = time.monotonic()
+        # Sıradaki boş zaman dilimi await'ten önce ayrılır; eşzamanlı çağıranlar sıraya girer
+        at = max(now, self.next_at)
+        self.next_at = at + self.interval
+        if at > now:
+            await asyncio.sleep(at - now)
+
+def retry_delay(attempt: int, retry_after: Optional[str]) -> float:
+    """Retry-After saniye olarak verildiyse ona uyulur, yoksa üstel bekleme + jitter"""
+    if retry_after and retry_after.isdigit():
+        return float(retry_after)
+    return HTTP_RETRY_BACKOFF_SECONDS * (2 ** attempt) * (0.5 + random.random())
+
+async def get_json(url: str, service: str, attempts: int = 1, limiter: Optional[RateLimiter] = None, **kwargs) -> Optional[dict]:
+    """200 dışındaki yanıtlarda None döner; bağlantı hataları yukarı iletilir.
+    attempts > 1 ise 429/5xx yanıtları beklenerek tekrar denenir."""
+    for attempt in range(attempts):
+        if limiter:
+            await limiter.wait()
+        with external_call(service) as call:
+            async with get_http_session().get(url, **kwargs) as resp:
+                if resp.status == 200:
+                    return await resp.json()
+                logging.warning(f"{url} -> HTTP {resp.status}")
+                call["outcome"] = "error"
+                status, retry_after = resp.status, resp.headers.get("Retry-After")
+        if status not in HTTP_RETRY_STATUSES or attempt == attempts - 1:
+            return None
+        await asyncio.sleep(retry_delay(attempt, retry_after))
+
 # Currency endpoint
+# Kurlar arka planda CURRENCY_REFRESH_SECONDS aralıkla yenilenir. İstekler her
+# zaman önbellekten cevaplanır; önbellek CURRENCY_TTL_SECONDS'tan eskiyse eski
+# veri dönülür ve yenileme tetiklenir (stale-while-revalidate). Aynı anda
+# gelen yenileme istekleri tek bir dış çağrıyı bekler.
+EXCHANGE_RATE_API_URL = os.environ.get('EXCHANGE_RATE_API_URL', 'https://api.exchangerate-api.com/v4/latest/TRY')
+METAL_PRICE_API_URL = os.environ.get('METAL_PRICE_API_URL', 'https://api.metalpriceapi.com/v1/latest?base=USD&currencies=XAU,XAG')
+CURRENCY_TTL = int(os.environ.get('CURRENCY_TTL_SECONDS', 3600))
+CURRENCY_REFRESH_INTERVAL = int(os.environ.get('CURRENCY_REFRESH_SECONDS', 1800))
+CURRENCY_FALLBACK = {
+    "usd_try": 35.50,
+    "eur_try": 38.20,
+    "gold_try": 3250.00,
+    "silver_try": 38.50
+}
+
 currency_cache = {"data": None, "timestamp": None}
+currency_refresh: Optional[asyncio.Task] = None
+currency_refresher: Optional[asyncio.Task] = None
+
+async def fetch_currency_rates() -> dict:
+    # İki servis paralel çağrılır; döviz servisine ulaşılamazsa hata yukarı iletilir
+    fx_data, metal_data = await asyncio.gather(
+        get_json(EXCHANGE_RATE_API_URL, "exchange_rate"),
+        get_json(METAL_PRICE_API_URL, "metal_price"),
+        return_exceptions=True
+    )
+    if isinstance(fx_data, BaseException):
+        raise fx_data
+    if fx_data is None:
+        # HTTP hatası: önbellekteki son geçerli kurlar korunur
+        raise RuntimeError("Exchange rate API returned an error response")
+    
+    # Get USD/EUR to TRY
+    rates = (fx_data or {}).get("rates", {})
+    usd_try = round(1 / rates["USD"], 2) if rates.get("USD") else 35.50
+    eur_try = round(1 / rates["EUR"], 2) if rates.get("EUR") else 38.20
+    
+    # Get Gold and Silver prices in TRY (per gram)
+    gold_try = 5400.00  # Updated fallback
+    silver_try = 62.50  # Updated fallback
+    
+    if isinstance(metal_data, BaseException):
+        logging.warning(f"Metal price API error: {metal_data}, using fallback")
+    elif metal_data and metal_data.get("success"):
+        rates_metal = metal_data.get("rates", {})
+        # rates_metal["XAU"] = how many XAU per 1 USD (e.g., 0.000385 XAU per USD)
+        # We need USD per XAU (per troy ounce), so: 1 / rates_metal["XAU"]
+        # Then convert to TRY per gram: (USD_per_ounce * usd_try) / 31.1035
+        
+        if rates_metal.get("XAU"):
+            usd_per_ounce_gold = 1 / rates_metal["XAU"]  # USD per troy ounce
+            gold_try = round((usd_per_ounce_gold * usd_try) / 31.1035, 2)  # TRY per gram
+        
+        if rates_metal.get("XAG"):
+            usd_per_ounce_silver = 1 / rates_metal["XAG"]  # USD per troy ounce
+            silver_try = round((usd_per_ounce_silver * usd_try) / 31.1035, 2)  # TRY per gram
+    
+    return {
+        "usd_try": usd_try,
+        "eur_try": eur_try,
+        "gold_try": gold_try,
+        "silver_try": silver_try,
+        "timestamp": datetime.now(timezone.utc).isoformat()
+    }
+
+async def _refresh_currency_rates() -> dict:
+    result = await fetch_currency_rates()
+    currency_cache["data"] = result
+    currency_cache["timestamp"] = datetime.now(timezone.utc)
+    return result
+
+def _log_currency_refresh(task: asyncio.Task):
+    if not task.cancelled() and task.exception():
+        logging.error(f"Currency API error: {task.exception()}")
+
+def start_currency_refresh() -> asyncio.Task:
+    """Devam eden bir yenileme varsa onu, yoksa yenisini döndürür (single-flight)"""
+    global currency_refresh
+    if currency_refresh is None or currency_refresh.done():
+        currency_refresh = asyncio.create_task(_refresh_currency_rates())
+        currency_refresh.add_done_callback(_log_currency_refresh)
+    return currency_refresh
+
+async def run_currency_refresher():
+    while True:
+        try:
+            await asyncio.shield(start_currency_refresh())
+        except Exception:
+            pass  # _log_currency_refresh loglar; sonraki turda tekrar denenir
+        await asyncio.sleep(CURRENCY_REFRESH_INTERVAL)
 
 @api_router.get("/currency")
 async def get_currency_rates():
-    global currency_cache
+    data, timestamp = currency_cache["data"], currency_cache["timestamp"]
+    if data:
+        if (datetime.now(timezone.utc) - timestamp).total_seconds() >= CURRENCY_TTL:
+            start_currency_refresh()
+        return data
+    
+    try:
+        # shield: istemci bağlantıyı kesse de ortak yenileme iptal olmaz
+        return await asyncio.shield(start_currency_refresh())
+    except Exception:
+        pass
+    
+    # Fallback data
+    return {**CURRENCY_FALLBACK, "timestamp": datetime.now(timezone.utc).isoformat()}
+
+# Background jobs
+# Uzun süren toplu işler arka planda asyncio görevi olarak çalışır. İlerleme
+# jobs koleksiyonunda tutulur ve GET /jobs/{job_id} ile izlenir.
+background_jobs = {}  # job_id -> (type, asyncio.Task); görevler çöp toplayıcıya gitmesin
+
+async def create_job(job_type: str, params: dict, total: int, user_id: str) -> dict:
+    job = {
+        "id": str(uuid.uuid4()),
+        "type": job_type,
+        "params": params,
+        "status": "running",
+        "total": total,
+        "processed": 0,
+        "failed": 0,
+        "error": None,
+        "created_by": user_id,
+        "created_at": datetime.now(timezone.utc),
+        "finished_at": None
+    }
+    await db.jobs.insert_one(job)
+    job.pop("_id")
+    return job
+
+async def job_progress(job_id: str, processed: int = 0, failed: int = 0, **fields):
+    update = {"$inc": {"processed": processed, "failed": failed}}
+    if fields:
+        update["$set"] = fields
+    await db.jobs.update_one({"id": job_id}, update)
+
+def start_job(job: dict, coro):
+    async def run():
+        try:
+            await coro
+            await db.jobs.update_one(
+                {"id": job_id},
+                {"$set": {"status": "completed", "finished_at": datetime.now(timezone.utc)}}
+            )
+        except Exception as e:
+            logging.error(f"Job {job_id} failed: {e}")
+            await db.jobs.update_one(
+                {"id": job_id},
+                {"$set": {"status": "failed", "error": str(e), "finished_at": datetime.now(timezone.utc)}}
+            )
+        finally:
+            background_jobs.pop(job_id, None)
+    
+    job_id = job["id"]
+    background_jobs[job_id] = (job["type"], asyncio.create_task(run()))
+
+async def for_each_bounded(cursor, worker, concurrency: int):
+    """cursor'daki her belge için worker'ı en fazla concurrency eşzamanlı görevle çalıştırır"""
+    semaphore = asyncio.Semaphore(concurrency)
     
-    # Cache for 1 hour
-    if currency_cache["data"] and currency_cache["timestamp"]:
-        if (datetime.now(timezone.utc) - currency_cache["timestamp"]).seconds < 3600:
-            return currency_cache["data"]
+    async def run(doc):
+        async with semaphore:
+            await worker(doc)
     
+    pending = set()
     try:
-        async with aiohttp.ClientSession() as session:
-            # Get USD/EUR to TRY
-            async with session.get("https://api.exchangerate-api.com/v4/latest/TRY") as resp:
-                if resp.status == 200:
-                    data = await resp.json()
-                    rates = data.get("rates", {})
-                    
-                    usd_try = round(1 / rates.get("USD", 0.03), 2) if rates.get("USD") else 35.50
-                    eur_try = round(1 / rates.get("EUR", 0.028), 2) if rates.get("EUR") else 38.20
-                else:
-                    usd_try = 35.50
-                    eur_try = 38.20
-            
-            # Get Gold and Silver prices in TRY (per gram)
-            gold_try = 5400.00  # Updated fallback
-            silver_try = 62.50  # Updated fallback
-            
-            try:
-                # Try metalpriceapi.com - base USD to get XAU/XAG in USD, then convert to TRY
-                async with session.get("https://api.metalpriceapi.com/v1/latest?base=USD&currencies=XAU,XAG") as metal_resp:
-                    if metal_resp.status == 200:
-                        metal_data = await metal_resp.json()
-                        if metal_data.get("success"):
-                            rates_metal = metal_data.get("rates", {})
-                            # rates_metal["XAU"] = how many XAU per 1 USD (e.g., 0.000385 XAU per USD)
-                            # We need USD per XAU (per troy ounce), so: 1 / rates_metal["XAU"]
-                            # Then convert to TRY per gram: (USD_per_ounce * usd_try) / 31.1035
-                            
-                            if rates_metal.get("XAU"):
-                                usd_per_ounce_gold = 1 / rates_metal["XAU"]  # USD per troy ounce
-                                gold_try = round((usd_per_ounce_gold * usd_try) / 31.1035, 2)  # TRY per gram
-                            
-                            if rates_metal.get("XAG"):
-                                usd_per_ounce_silver = 1 / rates_metal["XAG"]  # USD per troy ounce
-                                silver_try = round((usd_per_ounce_silver * usd_try) / 31.1035, 2)  # TRY per gram
-            except Exception as metal_error:
-                logging.warning(f"Metal price API error: {metal_error}, using fallback")
+        async for doc in cursor:
+            # Cursor'dan okuma da sınırlanır: aynı anda en fazla 2 x eşzamanlılık kadar görev bekler
+            if len(pending) >= concurrency * 2:
+                _, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            pending.add(asyncio.create_task(run(doc)))
+        if pending:
+            await asyncio.wait(pending)
+    finally:
+        # İş iptal edilirse (kapanış) başlatılmış görevler de durdurulur
+        for task in pending:
+            task.cancel()
+
+def running_job(job_type: str) -> Optional[str]:
+    """Bu süreçte çalışan aynı türde bir iş varsa id'si"""
+    for job_id, (task_type, task) in background_jobs.items():
+        if task_type == job_type and not task.done():
+            return job_id
+    return None
+
+async def resumable_job(job_id: str, job_type: str) -> dict:
+    """Yarıda kalmış işi sayaçlarını sıfırlayıp yeniden running yapar.
+    İşler kaldıkları yeri kendi kayıtlarından bulur; sayaçlar baştan sayılır."""
+    running = running_job(job_type)
+    if running:
+        raise HTTPException(status_code=409, detail={"message": "Aynı türde bir iş zaten çalışıyor", "job_id": running})
+    job = await db.jobs.find_one_and_update(
+        {"id": job_id, "type": job_type, "status": {"$in": ["interrupted", "failed"]}},
+        {
+            "$set": {"status": "running", "processed": 0, "failed": 0, "error": None, "finished_at": None},
+            "$inc": {"resumed": 1}
+        },
+        return_document=ReturnDocument.AFTER
+    )
+    if not job:
+        raise HTTPException(status_code=404, detail="Devam ettirilebilecek iş bulunamadı")
+    job.pop("_id")
+    return job
+
+@api_router.get("/jobs/{job_id}")
+async def get_job(job_id: str, current_user: User = Depends(get_current_user)):
+    job = await db.jobs.find_one({"id": job_id}, {"_id": 0})
+    if not job:
+        raise HTTPException(status_code=404, detail="İş bulunamadı")
+    return job
+
+# Product price comparison endpoint (SerpAPI Google Shopping)
+# Başarılı SerpAPI sonuçları ürün başına price_comparisons koleksiyonunda
+# saklanır; created_at üzerindeki TTL indeksi PRICE_COMPARISON_TTL_SECONDS
+# sonra kayıtları siler. Ürün adı/markası değişirse kayıt kullanılmaz.
+# SerpAPI istekleri süreç genelinde SERPAPI_RATE_PER_SECOND ile sınırlanır;
+# 429/5xx yanıtları SERPAPI_MAX_ATTEMPTS kez denenir.
+SERPAPI_URL = os.environ.get('SERPAPI_URL', 'https://serpapi.com/search.json')
+SERPAPI_MAX_ATTEMPTS = int(os.environ.get('SERPAPI_MAX_ATTEMPTS', 3))
+PRICE_COMPARISON_TTL = int(os.environ.get('PRICE_COMPARISON_TTL_SECONDS', 24 * 3600))
+PRICE_COMPARISON_CONCURRENCY = int(os.environ.get('PRICE_COMPARISON_CONCURRENCY', 4))
+serpapi_limiter = RateLimiter(float(os.environ.get('SERPAPI_RATE_PER_SECOND', 2)))
+
+def parse_shopping_results(data: dict) -> List[dict]:
+    results = []
+    shopping_results = data.get('shopping_results', [])
+    
+    for item in shopping_results[:20]:  # Process up to 20 items
+        try:
+            # Extract price - handle different price formats
+            price_str = item.get('price', '0')
+            # Remove currency symbols and commas
+            price_str = price_str.replace('₺', '').replace('TL', '').replace('.', '').replace(',', '.').strip()
+            price = float(price_str)
             
-            result = {
-                "usd_try": usd_try,
-                "eur_try": eur_try,
-                "gold_try": gold_try,
-                "silver_try": silver_try,
-                "timestamp": datetime.now(timezone.utc).isoformat()
-            }
+            # Check if in stock
+            delivery = item.get('delivery', '')
+            available = 'stok' not in delivery.lower() or 'mevcut' in delivery.lower()
             
-            currency_cache["data"] = result
-            currency_cache["timestamp"] = datetime.now(timezone.utc)
-            return result
+            results.append({
+                'site': item.get('source', 'Bilinmeyen'),
+                'price': round(price, 2),
+                'url': item.get('link', '#'),
+                'available': available,
+                'title': item.get('title', '')
+            })
+        except (ValueError, TypeError) as e:
+            logging.warning(f"Price parsing error: {e}")
+            continue
+    
+    # Sort by price, get top 10 lowest prices
+    results.sort(key=lambda x: x['price'])
+    return results[:10]
+
+async def search_serpapi(search_query: str, serpapi_key: str) -> List[dict]:
+    """Boş liste: sonuç yok veya SerpAPI'ye ulaşılamadı"""
+    params = {
+        'engine': 'google_shopping',
+        'q': search_query,
+        'api_key': serpapi_key,
+        'gl': 'tr',  # Turkey
+        'hl': 'tr',  # Turkish language
+        'num': 20    # Get more results to filter
+    }
+    try:
+        data = await get_json(SERPAPI_URL, "serpapi", attempts=SERPAPI_MAX_ATTEMPTS, limiter=serpapi_limiter, params=params)
+    except asyncio.TimeoutError:
+        logging.error("SerpAPI timeout")
+        return []
     except Exception as e:
-        logging.error(f"Currency API error: {e}")
+        logging.error(f"SerpAPI request error: {e}")
+        return []
+    return parse_shopping_results(data) if data else []
+
+def fallback_price_results(product: dict) -> List[dict]:
+    """SerpAPI sonuç vermezse büyük sitelerde arama bağlantıları"""
+    major_sites = [
+        {'site': 'Hepsiburada', 'base_url': 'https://www.hepsiburada.com/ara?q='},
+        {'site': 'Trendyol', 'base_url': 'https://www.trendyol.com/sr?q='},
+        {'site': 'N11', 'base_url': 'https://www.n11.com/arama?q='},
+        {'site': 'Amazon TR', 'base_url': 'https://www.amazon.com.tr/s?k='},
+        {'site': 'GittiGidiyor', 'base_url': 'https://www.gittigidiyor.com/arama/?k='},
+        {'site': 'Çiçeksepeti', 'base_url': 'https://www.ciceksepeti.com/ara?q='},
+        {'site': 'Akakçe', 'base_url': 'https://www.akakce.com/arama/?q='},
+        {'site': 'Cimri', 'base_url': 'https://www.cimri.com/arama?q='},
+        {'site': 'Epttavm', 'base_url': 'https://www.epttavm.com/arama?q='},
+        {'site': 'Google Shopping', 'base_url': 'https://www.google.com/search?tbm=shop&q='}
+    ]
     
-    # Fallback data
+    search_term = f"{product['brand']}+{product['name']}".replace(' ', '+')
+    return [{
+        'site': site_info['site'],
+        'price': product['sale_price'],
+        'url': site_info['base_url'] + search_term,
+        'available': True,
+        'title': f"{product['name']} - Manuel arama"
+    } for site_info in major_sites]
+
+async def compare_product_prices(product: dict, serpapi_key: str, refresh: bool = False,
+                                 fresh_after: Optional[datetime] = None) -> dict:
+    """fresh_after verilirse yalnızca o andan sonra alınmış kayıtlar önbellekten kullanılır"""
+    search_query = f"{product['brand']} {product['name']}"
+    base = {
+        'product_id': product['id'],
+        'product_name': product['name'],
+        'brand': product['brand'],
+        'category': product['category'],
+        'current_price': product['sale_price'],
+        'barcode': product.get('barcode', '')
+    }
+    
+    if not refresh:
+        cache_query = {"_id": product['id'], "query": search_query}
+        if fresh_after:
+            cache_query["created_at"] = {"$gte": fresh_after}
+        cached = await db.price_comparisons.find_one(cache_query)
+        if cached:
+            return {
+                **base,
+                'price_results': cached['price_results'],
+                'result_count': len(cached['price_results']),
+                'source': 'SerpAPI Google Shopping',
+                'cached': True,
+                'checked_at': cached['created_at']
+            }
+    
+    price_results = await search_serpapi(search_query, serpapi_key)
+    if price_results:
+        now = datetime.now(timezone.utc)
+        await db.price_comparisons.replace_one(
+            {"_id": product['id']},
+            {"query": search_query, "price_results": price_results, "created_at": now},
+            upsert=True
+        )
+        return {
+            **base,
+            'price_results': price_results,
+            'result_count': len(price_results),
+            'source': 'SerpAPI Google Shopping',
+            'cached': False,
+            'checked_at': now
+        }
+    
+    # Fallback: If SerpAPI fails, provide search links to major sites
+    fallback_results = fallback_price_results(product)
     return {
-        "usd_try": 35.50,
-        "eur_try": 38.20,
-        "gold_try": 3250.00,
-        "silver_try": 38.50,
-        "timestamp": datetime.now(timezone.utc).isoformat()
+        **base,
+        'price_results': fallback_results,
+        'result_count': len(fallback_results),
+        'source': 'Manuel Arama (SerpAPI mevcut değil)',
+        'info': 'Gerçek fiyatlar için siteleri ziyaret edin'
     }
 
-# Product price comparison endpoint (SerpAPI Google Shopping)
 @api_router.get("/products/{product_id}/price-comparison")
 async def get_product_price_comparison(
     product_id: str,
+    refresh: bool = Query(False, description="Önbelleği atlayıp SerpAPI'yi yeniden sorgula"),
     current_user: User = Depends(get_current_user)
 ):
     """
@@ -728,128 +2919,61 @@ async def get_product_price_comparison(
         raise HTTPException(status_code=500, detail="SerpAPI key bulunamadı")
     
     try:
-        # Prepare search query for Turkish market
-        search_query = f"{product['brand']} {product['name']}"
-        
-        # Call SerpAPI Google Shopping
-        async with aiohttp.ClientSession() as session:
-            params = {
-                'engine': 'google_shopping',
-                'q': search_query,
-                'api_key': serpapi_key,
-                'gl': 'tr',  # Turkey
-                'hl': 'tr',  # Turkish language
-                'num': 20    # Get more results to filter
-            }
-            
-            serpapi_url = 'https://serpapi.com/search.json'
-            
-            try:
-                async with session.get(serpapi_url, params=params, timeout=10) as resp:
-                    if resp.status == 200:
-                        data = await resp.json()
-                        
-                        results = []
-                        shopping_results = data.get('shopping_results', [])
-                        
-                        for item in shopping_results[:20]:  # Process up to 20 items
-                            try:
-                                # Extract price - handle different price formats
-                                price_str = item.get('price', '0')
-                                # Remove currency symbols and commas
-                                price_str = price_str.replace('₺', '').replace('TL', '').replace('.', '').replace(',', '.').strip()
-                                price = float(price_str)
-                                
-                                # Extract source/site name
-                                source = item.get('source', 'Bilinmeyen')
-                                
-                                # Get product link
-                                link = item.get('link', '#')
-                                
-                                # Check if in stock
-                                delivery = item.get('delivery', '')
-                                available = 'stok' not in delivery.lower() or 'mevcut' in delivery.lower()
-                                
-                                results.append({
-                                    'site': source,
-                                    'price': round(price, 2),
-                                    'url': link,
-                                    'available': available,
-                                    'title': item.get('title', '')
-                                })
-                            except (ValueError, TypeError) as e:
-                                logging.warning(f"Price parsing error: {e}")
-                                continue
-                        
-                        # Sort by price
-                        results.sort(key=lambda x: x['price'])
-                        
-                        # Get top 10 lowest prices
-                        top_results = results[:10]
-                        
-                        if len(top_results) > 0:
-                            return {
-                                'product_id': product['id'],
-                                'product_name': product['name'],
-                                'brand': product['brand'],
-                                'category': product['category'],
-                                'current_price': product['sale_price'],
-                                'barcode': product.get('barcode', ''),
-                                'price_results': top_results,
-                                'result_count': len(top_results),
-                                'source': 'SerpAPI Google Shopping'
-                            }
-                    else:
-                        logging.error(f"SerpAPI error: Status {resp.status}")
-                        
-            except asyncio.TimeoutError:
-                logging.error("SerpAPI timeout")
-            except Exception as e:
-                logging.error(f"SerpAPI request error: {e}")
-        
-        # Fallback: If SerpAPI fails, provide search links to major sites
-        major_sites = [
-            {'site': 'Hepsiburada', 'base_url': 'https://www.hepsiburada.com/ara?q='},
-            {'site': 'Trendyol', 'base_url': 'https://www.trendyol.com/sr?q='},
-            {'site': 'N11', 'base_url': 'https://www.n11.com/arama?q='},
-            {'site': 'Amazon TR', 'base_url': 'https://www.amazon.com.tr/s?k='},
-            {'site': 'GittiGidiyor', 'base_url': 'https://www.gittigidiyor.com/arama/?k='},
-            {'site': 'Çiçeksepeti', 'base_url': 'https://www.ciceksepeti.com/ara?q='},
-            {'site': 'Akakçe', 'base_url': 'https://www.akakce.com/arama/?q='},
-            {'site': 'Cimri', 'base_url': 'https://www.cimri.com/arama?q='},
-            {'site': 'Epttavm', 'base_url': 'https://www.epttavm.com/arama?q='},
-            {'site': 'Google Shopping', 'base_url': 'https://www.google.com/search?tbm=shop&q='}
-        ]
-        
-        search_term = f"{product['brand']}+{product['name']}".replace(' ', '+')
-        fallback_results = []
-        
-        for site_info in major_sites:
-            fallback_results.append({
-                'site': site_info['site'],
-                'price': product['sale_price'],
-                'url': site_info['base_url'] + search_term,
-                'available': True,
-                'title': f"{product['name']} - Manuel arama"
-            })
-        
-        return {
-            'product_id': product['id'],
-            'product_name': product['name'],
-            'brand': product['brand'],
-            'category': product['category'],
-            'current_price': product['sale_price'],
-            'barcode': product.get('barcode', ''),
-            'price_results': fallback_results[:10],
-            'result_count': len(fallback_results[:10]),
-            'source': 'Manuel Arama (SerpAPI mevcut değil)',
-            'info': 'Gerçek fiyatlar için siteleri ziyaret edin'
-        }
-            
+        return await compare_product_prices(product, serpapi_key, refresh)
     except Exception as e:
         logging.error(f"Price comparison error: {e}")
         raise HTTPException(status_code=500, detail=f"Fiyat karşılaştırması hatası: {str(e)}")
 
+async def run_price_comparison_job(job_id: str, query: dict, serpapi_key: str, fresh_after: Optional[datetime]):
+    async def compare(product):
+        try:
+            result = await compare_product_prices(product, serpapi_key, fresh_after=fresh_after)
+            failed = 0 if result.get('source') == 'SerpAPI Google Shopping' else 1
+        except Exception as e:
+            logging.warning(f"Price comparison failed for {product['id']}: {e}")
+            failed = 1
+        await job_progress(job_id, processed=1, failed=failed)
+    
+    projection = {"_id": 0, "id": 1, "name": 1, "brand": 1, "category": 1, "sale_price": 1, "barcode": 1}
+    await for_each_bounded(db.products.find(query, projection), compare, PRICE_COMPARISON_CONCURRENCY)
+
+@api_router.post("/price-comparison/jobs")
+async def create_price_comparison_job(data: PriceComparisonJobCreate, current_user: User = Depends(get_current_user)):
+    """Tüm katalog veya bir marka/kategori için toplu fiyat karşılaştırması başlatır"""
+    if current_user.role != "yönetici":
+        raise HTTPException(status_code=403, detail="Only administrators can start price comparison jobs")
+    job_id = running_job("price_comparison")
+    if job_id:
+        raise HTTPException(status_code=409, detail={"message": "Fiyat karşılaştırma işi zaten çalışıyor", "job_id": job_id})
+    serpapi_key = os.environ.get('SERPAPI_KEY')
+    if not serpapi_key:
+        raise HTTPException(status_code=500, detail="SerpAPI key bulunamadı")
+    
+    query = data.product_query()
+    total = await db.products.count_documents(query)
+    job = await create_job("price_comparison", {**query, "refresh": data.refresh}, total, current_user.id)
+    # refresh: bu işten önce alınmış sonuçlar yeniden sorgulanır; devam eden iş aynı anı kullanır
+    fresh_after = job["created_at"] if data.refresh else None
+    if fresh_after:
+        await job_progress(job["id"], fresh_after=fresh_after)
+        job["fresh_after"] = fresh_after
+    start_job(job, run_price_comparison_job(job["id"], query, serpapi_key, fresh_after))
+    return job
+
+@api_router.post("/price-comparison/jobs/{job_id}/resume")
+async def resume_price_comparison_job(job_id: str, current_user: User = Depends(get_current_user)):
+    """Yarıda kalan işi aynı id ile sürdürür; sonucu önbellekte olan ürünler SerpAPI'ye tekrar sorulmaz"""
+    if current_user.role != "yönetici":
+        raise HTTPException(status_code=403, detail="Only administrators can start price comparison jobs")
+    serpapi_key = os.environ.get('SERPAPI_KEY')
+    if not serpapi_key:
+        raise HTTPException(status_code=500, detail="SerpAPI key bulunamadı")
+    
+    job = await resumable_job(job_id, "price_comparison")
+    query = {key: job["params"][key] for key in ("brand", "category") if key in job["params"]}
+    start_job(job, run_price_comparison_job(job_id, query, serpapi_key, job.get("fresh_after")))
+    return job
+
 # Calendar endpoints
 @api_router.post("/calendar", response_model=CalendarEvent)
 async def create_calendar_event(event_data: CalendarEventCreate, current_user: User = Depends(get_current_user)):
@@ -858,8 +2982,6 @@ async def create_calendar_event(event_data: CalendarEventCreate, current_user: U
     
     event = CalendarEvent(**event_dict)
     doc = event.model_dump()
-    doc["date"] = doc["date"].isoformat()
-    doc["created_at"] = doc["created_at"].isoformat()
     
     await db.calendar_events.insert_one(doc)
     return event
@@ -873,16 +2995,11 @@ async def get_calendar_events(
     query = {"user_id": current_user.id}
     if start_date and end_date:
         query["date"] = {
-            "$gte": datetime.fromisoformat(start_date).isoformat(),
-            "$lte": datetime.fromisoformat(end_date).isoformat()
+            "$gte": datetime.fromisoformat(start_date),
+            "$lte": datetime.fromisoformat(end_date)
         }
     
     events = await db.calendar_events.find(query, {"_id": 0}).sort("date", 1).to_list(1000)
-    for e in events:
-        if isinstance(e["date"], str):
-            e["date"] = datetime.fromisoformat(e["date"])
-        if isinstance(e["created_at"], str):
-            e["created_at"] = datetime.fromisoformat(e["created_at"])
     return events
 
 @api_router.delete("/calendar/{event_id}")
@@ -892,6 +3009,15 @@ async def delete_calendar_event(event_id: str, current_user: User = Depends(get_
         raise HTTPException(status_code=404, detail="Event not found")
     return {"message": "Event deleted"}
 
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics(request: Request):
+    """Prometheus metin formatı; METRICS_TOKEN verilmişse Bearer token ister"""
+    if METRICS_TOKEN and not secrets.compare_digest(
+        request.headers.get("authorization", "").encode(), f"Bearer {METRICS_TOKEN}".encode()
+    ):
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return Response(generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
+
 # Include the router in the main app
 app.include_router(api_router)
 
@@ -901,6 +3027,7 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 logging.basicConfig(
@@ -909,6 +3036,289 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Index registry
+# Her koleksiyon için API'nin sorguladığı alanlar. Yeni bir sorgu deseni
+# eklendiğinde indeksi buraya, örnek sorguyu da HOT_QUERIES listesine ekleyin.
+INDEXES = {
+    "users": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("username", ASCENDING)], name="username_unique", unique=True),
+    ],
+    "products": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("barcode", ASCENDING)], name="barcode_unique", unique=True),
+        IndexModel([("created_at", ASCENDING), ("id", ASCENDING)], name="created_at_id"),
+        IndexModel([("name", ASCENDING)], name="name"),
+        IndexModel([("brand", ASCENDING), ("name", ASCENDING)], name="brand_name"),
+        IndexModel([("category", ASCENDING), ("name", ASCENDING)], name="category_name"),
+        IndexModel(
+            [("is_low_stock", ASCENDING), ("name", ASCENDING)],
+            name="low_stock_name",
+            partialFilterExpression={"is_low_stock": True}
+        ),
+        IndexModel(
+            [("needs_reorder", ASCENDING), ("days_of_cover", ASCENDING)],
+            name="needs_reorder_days_of_cover",
+            partialFilterExpression={"needs_reorder": True}
+        ),
+        IndexModel(
+            [("days_of_cover", ASCENDING)],
+            name="demand_days_of_cover",
+            partialFilterExpression={"forecast.daily_demand": {"$gt": 0}}
+        ),
+    ],
+    "sales": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("created_at", DESCENDING), ("id", DESCENDING)], name="created_at_id"),
+        IndexModel([("customer_id", ASCENDING), ("created_at", DESCENDING)], name="customer_created_at"),
+        IndexModel(
+            [("client_sale_id", ASCENDING)],
+            name="client_sale_id_unique",
+            unique=True,
+            sparse=True
+        ),
+    ],
+    "customers": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("created_at", ASCENDING), ("id", ASCENDING)], name="created_at_id"),
+        IndexModel([("search_tokens", ASCENDING)], name="search_tokens"),
+        IndexModel([("search_phones", ASCENDING)], name="search_phones"),
+    ],
+    "calendar_events": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("user_id", ASCENDING), ("date", ASCENDING)], name="user_date"),
+    ],
+    "jobs": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+    ],
+    "sales_daily_product": [
+        IndexModel([("day", ASCENDING), ("product_id", ASCENDING)], name="day_product"),
+    ],
+    "price_comparisons": [
+        # Süre değiştirilirse mevcut indeks collMod ile güncellenmelidir
+        IndexModel([("created_at", ASCENDING)], name="created_at_ttl", expireAfterSeconds=PRICE_COMPARISON_TTL),
+    ],
+}
+
+# (koleksiyon, filtre, sıralama) - endpoint'lerin sık çalıştırdığı sorgular
+HOT_QUERIES = [
+    ("users", {"id": ""}, None),
+    ("users", {"username": ""}, None),
+    ("products", {"id": ""}, None),
+    ("products", {"barcode": ""}, None),
+    ("products", {}, [("created_at", 1), ("id", 1)]),
+    ("products", {}, [("name", 1)]),
+    ("products", {"brand": ""}, [("name", 1)]),
+    ("products", {"category": ""}, [("name", 1)]),
+    ("products", {"is_low_stock": True}, [("name", 1)]),
+    ("products", {"needs_reorder": True}, [("days_of_cover", 1)]),
+    ("products", {"forecast.daily_demand": {"$gt": 0}}, [("days_of_cover", 1)]),
+    ("sales", {}, [("created_at", -1), ("id", -1)]),
+    ("sales", {"created_at": {"$gte": "", "$lte": ""}}, [("created_at", -1), ("id", -1)]),
+    ("sales", {"customer_id": ""}, [("created_at", -1)]),
+    ("sales", {"client_sale_id": {"$in": [""]}}, None),
+    ("sales_daily_product", {"day": {"$gte": "", "$lt": ""}}, None),
+    ("sales_daily_product", {"day": {"$gte": "", "$lt": ""}, "product_id": {"$in": [""]}}, None),
+    ("customers", {"id": ""}, None),
+    ("customers", {"deleted": {"$ne": True}}, [("created_at", 1), ("id", 1)]),
+    ("customers", {"search_tokens": {"$regex": "^a"}, "deleted": {"$ne": True}}, None),
+    ("customers", {"search_phones": {"$regex": "^5"}, "deleted": {"$ne": True}}, None),
+    ("calendar_events", {"user_id": "", "date": {"$gte": "", "$lte": ""}}, [("date", 1)]),
+]
+
+async def ensure_indexes():
+    """INDEXES içindeki tüm indeksleri oluşturur (mevcut olanlar atlanır)"""
+    for collection, indexes in INDEXES.items():
+        try:
+            names = await db[collection].create_indexes(indexes)
+            logger.info(f"Indeksler hazır: {collection} -> {', '.join(names)}")
+        except Exception as e:
+            # Örn. mevcut verideki tekrar eden barkodlar unique indeksi engeller
+            logger.error(f"❌ {collection} indeksleri oluşturulamadı: {e}")
+
+def _plan_stages(plan) -> List[str]:
+    stages = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for value in plan.values():
+            stages.extend(_plan_stages(value))
+    elif isinstance(plan, list):
+        for value in plan:
+            stages.extend(_plan_stages(value))
+    return stages
+
+async def verify_query_plans() -> List[dict]:
+    """HOT_QUERIES için explain() çalıştırır, COLLSCAN varsa RuntimeError fırlatır"""
+    report = []
+    for collection, query, sort in HOT_QUERIES:
+        cursor = db[collection].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        explain = await cursor.explain()
+        stages = _plan_stages(explain.get("queryPlanner", {}).get("winningPlan", {}))
+        report.append({"collection": collection, "query": query, "sort": sort, "stages": stages})
+    collscans = [r for r in report if "COLLSCAN" in r["stages"]]
+    if collscans:
+        details = "; ".join(f"{r['collection']} {r['query']} sort={r['sort']}" for r in collscans)
+        raise RuntimeError(f"COLLSCAN tespit edildi: {details}")
+    return report
+
+async def backfill_sale_costs(batch_size: int = 1000) -> int:
+    """Maliyet anlık görüntüsü olmayan satış kalemlerine ürünün güncel alış fiyatını yazar"""
+    costs = {
+        p["id"]: p["purchase_price"]
+        async for p in db.products.find({}, {"_id": 0, "id": 1, "purchase_price": 1})
+    }
+    query = {"items": {"$elemMatch": {"purchase_price": {"$exists": False}}}}
+    updated = 0
+    batch = []
+    async for sale in db.sales.find(query, {"_id": 1, "items": 1}):
+        items = sale["items"]
+        for item in items:
+            if "purchase_price" not in item:
+                item["purchase_price"] = costs.get(item.get("product_id"))
+        batch.append(UpdateOne({"_id": sale["_id"]}, {"$set": {"items": items}}))
+        if len(batch) >= batch_size:
+            updated += (await db.sales.bulk_write(batch, ordered=False)).modified_count
+            batch = []
+    if batch:
+        updated += (await db.sales.bulk_write(batch, ordered=False)).modified_count
+    return updated
+
+async def rebuild_daily_totals():
+    """sales_daily koleksiyonunu mevcut satışlardan yeniden hesaplar"""
+    await db.sales.aggregate([
+        {
+            "$group": {
+                "_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$created_at"}},
+                "sales_count": {"$sum": 1},
+                "revenue": {"$sum": "$final_amount"}
+            }
+        },
+        {"$merge": {"into": "sales_daily", "whenMatched": "replace", "whenNotMatched": "insert"}}
+    ]).to_list(None)
+
+async def rebuild_product_daily_totals():
+    """sales_daily_product koleksiyonunu mevcut satışlardan yeniden hesaplar"""
+    await db.sales.aggregate([
+        {"$unwind": "$items"},
+        sale_items_rollup_group({
+            "day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$created_at"}},
+            "product_id": "$items.product_id"
+        }),
+        {
+            "$project": {
+                "_id": {"$concat": ["$_id.day", ":", "$_id.product_id"]},
+                "day": "$_id.day",
+                "product_id": "$_id.product_id",
+                "product_name": 1,
+                **{field: 1 for field in PRODUCT_ROLLUP_FIELDS}
+            }
+        },
+        {"$merge": {"into": "sales_daily_product", "whenMatched": "replace", "whenNotMatched": "insert"}}
+    ], allowDiskUse=True).to_list(None)
+
+async def migrate_product_images() -> int:
+    """Ürün dokümanlarındaki base64 görselleri görsel deposuna taşır"""
+    query = {"image_url": {"$nin": [None, ""], "$not": {"$regex": f"^{IMAGE_URL_PREFIX}"}}}
+    migrated = 0
+    # Yalnızca id'ler okunur; görseller tek tek çekilir ki bellek kullanımı sabit kalsın
+    product_ids = [p["id"] async for p in db.products.find(query, {"_id": 0, "id": 1})]
+    for product_id in product_ids:
+        product = await db.products.find_one({"id": product_id}, {"_id": 0, "image_url": 1})
+        update = {}
+        try:
+            await apply_image(update, product["image_url"])
+        except HTTPException as e:
+            logger.warning(f"Görsel taşınamadı ({product_id}): {e.detail}")
+            continue
+        await db.products.update_one({"id": product_id}, {"$set": update})
+        migrated += 1
+    return migrated
+
+async def index_customers(batch_size: int = 1000) -> int:
+    """Arama alanları olmayan müşterilere search_* alanlarını yazar"""
+    updated = 0
+    batch = []
+    query = {"search_tokens": {"$exists": False}}
+    async for customer in db.customers.find(query, {"_id": 1, "name": 1, "phone": 1}):
+        fields = customer_search_fields(customer.get("name", ""), customer.get("phone", ""))
+        batch.append(UpdateOne({"_id": customer["_id"]}, {"$set": fields}))
+        if len(batch) >= batch_size:
+            updated += (await db.customers.bulk_write(batch, ordered=False)).modified_count
+            batch = []
+    if batch:
+        updated += (await db.customers.bulk_write(batch, ordered=False)).modified_count
+    return updated
+
+async def refresh_low_stock_flags() -> int:
+    """Tüm ürünlerde is_low_stock ve needs_reorder bayraklarını stoktan yeniden hesaplar"""
+    result = await db.products.update_many({}, STOCK_FLAGS)
+    return result.modified_count
+
+# Eski sürümlerin ISO metin olarak yazdığı tarih alanları
+DATE_FIELDS = {
+    "users": ["created_at"],
+    "products": ["created_at", "updated_at"],
+    "sales": ["created_at"],
+    "customers": ["created_at"],
+    "calendar_events": ["date", "created_at"],
+}
+
+async def migrate_dates(batch_size: int = 1000) -> dict:
+    """Metin tarihleri BSON date'e çevirir; uygulama çalışırken çalıştırılabilir"""
+    converted = {}
+    for collection, fields in DATE_FIELDS.items():
+        for field in fields:
+            count = 0
+            batch = []
+            async for doc in db[collection].find({field: {"$type": "string"}}, {"_id": 1, field: 1}):
+                try:
+                    value = datetime.fromisoformat(doc[field])
+                except ValueError:
+                    logger.warning(f"Tarih okunamadı: {collection}.{field} = {doc[field]!r}")
+                    continue
+                if value.tzinfo is None:
+                    value = value.replace(tzinfo=timezone.utc)
+                # Filtrede eski değer de var: bu arada alan değiştiyse dokunulmaz
+                batch.append(UpdateOne({"_id": doc["_id"], field: doc[field]}, {"$set": {field: value}}))
+                if len(batch) >= batch_size:
+                    count += (await db[collection].bulk_write(batch, ordered=False)).modified_count
+                    batch = []
+            if batch:
+                count += (await db[collection].bulk_write(batch, ordered=False)).modified_count
+            converted[f"{collection}.{field}"] = count
+    return converted
+
+@app.on_event("startup")
+async def startup_ensure_indexes():
+    """Indeksleri oluşturur; VERIFY_INDEXES=1 ise sorgu planlarını da doğrular"""
+    await ensure_indexes()
+    if os.environ.get("VERIFY_INDEXES") == "1":
+        # Hata yakalanmaz: COLLSCAN varsa uygulama başlamaz
+        await verify_query_plans()
+        logger.info("✅ Sorgu planları doğrulandı, COLLSCAN yok")
+
+@app.on_event("startup")
+async def startup_slow_query_log():
+    await ensure_slow_query_log()
+
+@app.on_event("startup")
+async def startup_mark_interrupted_jobs():
+    """Önceki süreç kapanırken yarım kalan işler"""
+    await db.jobs.update_many(
+        {"status": "running"},
+        {"$set": {"status": "interrupted", "finished_at": datetime.now(timezone.utc)}}
+    )
+
+@app.on_event("startup")
+async def startup_currency_refresher():
+    """Kurları arka planda güncel tutar; CURRENCY_REFRESH_SECONDS=0 ise kapalıdır"""
+    global currency_refresher
+    if CURRENCY_REFRESH_INTERVAL > 0:
+        currency_refresher = asyncio.create_task(run_currency_refresher())
+
 @app.on_event("startup")
 async def startup_create_admin():
     """Create default admin user if not exists"""
@@ -919,7 +3329,7 @@ async def startup_create_admin():
         if not existing_admin:
             # Create admin user
             admin_password = "Admin123!"  # Strong default password
-            hashed_password = pwd_context.hash(admin_password)
+            hashed_password = await hash_password(admin_password)
             
             admin_user = {
                 "id": str(uuid.uuid4()),
@@ -943,4 +3353,9 @@ async def startup_create_admin():
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    if currency_refresher:
+        currency_refresher.cancel()
+    if http_session:
+        await http_session.close()
+    client.close()
+    password_executor.shutdown(wait=False)
\ No newline at end of file
@@ -18,6 +18,9 @@ import PWAInstallBanner from './components/PWAInstallBanner';
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
 
+// Backend'in döndürdüğü /api/images/... yollarını tam adrese çevirir
+const imageUrl = (url) => (url && url.startsWith('/api/') ? `${BACKEND_URL}${url}` : url);
+
 const AuthContext = createContext(null);
 
 export const useAuth = () => useContext(AuthContext);
@@ -100,4 +103,4 @@ function App() {
 }
 
 export default App;
-export { API };
\ No newline at end of file
+export { API, imageUrl };
\ No newline at end of file
@@ -31,7 +31,10 @@ function Layout({ children }) {
 
   useEffect(() => {
     fetchCurrency();
-    const interval = setInterval(fetchCurrency, 300000); // Update every 5 minutes
+    // Update every 5 minutes, only while the tab is visible
+    const interval = setInterval(() => {
+      if (!document.hidden) fetchCurrency();
+    }, 300000);
     return () => clearInterval(interval);
   }, []);
 
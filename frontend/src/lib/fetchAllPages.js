@@ -0,0 +1,18 @@
+import axios from 'axios';
+import { API } from '../App';
+
+// Sayfalı liste endpoint'lerini X-Next-Cursor başlığı bitene kadar okur.
+// limit verilmeyen istek sunucuda DEFAULT_PAGE_SIZE ile kesilir; tarayıcıda
+// süzülen ekranlar tüm listeye ihtiyaç duyduğu için sayfalar birleştirilir.
+export async function fetchAllPages(path, params = {}) {
+  const items = [];
+  let after = null;
+  do {
+    const response = await axios.get(`${API}${path}`, {
+      params: after ? { ...params, after } : params
+    });
+    items.push(...response.data);
+    after = response.headers['x-next-cursor'] || null;
+  } while (after);
+  return items;
+}
@@ -0,0 +1,66 @@
+import { API } from '../App';
+
+// /inventory/events SSE akışına abone olur. EventSource Authorization başlığı
+// gönderemediği için fetch ile okunur; bağlantı koparsa Last-Event-ID ile
+// kaldığı yerden devam eder. Dönen fonksiyon aboneliği kapatır.
+export function subscribeInventory(onEvent) {
+  const controller = new AbortController();
+  let lastEventId = null;
+  let retryMs = 3000;
+
+  const dispatch = (block) => {
+    let type = 'message';
+    let data = '';
+    for (const line of block.split('\n')) {
+      if (line.startsWith('id: ')) lastEventId = line.slice(4);
+      else if (line.startsWith('event: ')) type = line.slice(7);
+      else if (line.startsWith('data: ')) data += line.slice(6);
+      else if (line.startsWith('retry: ')) retryMs = Number(line.slice(7)) || retryMs;
+    }
+    if (data) onEvent(type, JSON.parse(data));
+  };
+
+  const connect = async () => {
+    while (!controller.signal.aborted) {
+      try {
+        const headers = { Authorization: `Bearer ${localStorage.getItem('token')}` };
+        if (lastEventId) headers['Last-Event-ID'] = lastEventId;
+        const response = await fetch(`${API}/inventory/events`, { headers, signal: controller.signal });
+        if (!response.ok) throw new Error(`HTTP ${response.status}`);
+
+        const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+        let buffer = '';
+        for (;;) {
+          const { value, done } = await reader.read();
+          if (done) break;
+          buffer += value;
+          let boundary;
+          while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            dispatch(buffer.slice(0, boundary));
+            buffer = buffer.slice(boundary + 2);
+          }
+        }
+      } catch (error) {
+        if (controller.signal.aborted) return;
+      }
+      await new Promise((resolve) => setTimeout(resolve, retryMs));
+    }
+  };
+
+  connect();
+  return () => controller.abort();
+}
+
+// Akıştaki olayı ürün listesine uygular
+export function applyInventoryEvent(products, type, event) {
+  switch (type) {
+    case 'created':
+      return products.some((p) => p.id === event.product.id) ? products : [...products, event.product];
+    case 'updated':
+      return products.map((p) => (p.id === event.id ? { ...p, ...event.changes } : p));
+    case 'deleted':
+      return products.filter((p) => p.id !== event.id);
+    default:
+      return products;
+  }
+}
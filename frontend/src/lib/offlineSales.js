@@ -0,0 +1,50 @@
+import axios from 'axios';
+import { API } from '../App';
+
+// Bağlantı yokken yapılan satışlar localStorage'da kuyruğa alınır ve bağlantı
+// gelince /sales/sync ile toplu gönderilir. client_sale_id satış ilk kez
+// POST /sales ile denenmeden önce verilir; sunucu isteği işleyip cevap
+// kaybolduysa bile aynı satış sunucuda bir kez kaydedilir.
+const QUEUE_KEY = 'offlineSales';
+const BATCH_SIZE = 500;
+
+const readQueue = () => JSON.parse(localStorage.getItem(QUEUE_KEY) || '[]');
+const writeQueue = (queue) => localStorage.setItem(QUEUE_KEY, JSON.stringify(queue));
+
+export const queuedSaleCount = () => readQueue().length;
+
+export function queueSale(sale) {
+  writeQueue([
+    ...readQueue(),
+    { client_sale_id: crypto.randomUUID(), ...sale, created_at: new Date().toISOString() }
+  ]);
+}
+
+let flushing = null;
+
+// Kuyruğu boşaltır; gönderilecek satış yoksa null döner
+export function flushQueuedSales() {
+  if (!flushing) {
+    flushing = (async () => {
+      const totals = { created: 0, duplicates: 0, rejected: 0, stock_warnings: [] };
+      let queue = readQueue();
+      if (queue.length === 0) return null;
+      while (queue.length > 0) {
+        const batch = queue.slice(0, BATCH_SIZE);
+        const { data } = await axios.post(`${API}/sales/sync`, { sales: batch });
+        // Cevaptaki her satış kesin sonuçtur (kaydedildi/zaten vardı/reddedildi)
+        const done = new Set(data.results.map((r) => r.client_sale_id));
+        writeQueue(readQueue().filter((sale) => !done.has(sale.client_sale_id)));
+        totals.created += data.created;
+        totals.duplicates += data.duplicates;
+        totals.rejected += data.rejected;
+        totals.stock_warnings.push(...data.stock_warnings);
+        queue = queue.slice(BATCH_SIZE);
+      }
+      return totals;
+    })().finally(() => {
+      flushing = null;
+    });
+  }
+  return flushing;
+}
@@ -2,6 +2,7 @@ import React, { useState, useEffect } from 'react';
 import axios from 'axios';
 import { API } from '../App';
 import { useAuth } from '../App';
+import { fetchAllPages } from '../lib/fetchAllPages';
 import { toast } from 'sonner';
 import { Button } from '../components/ui/button';
 import { Input } from '../components/ui/input';
@@ -43,9 +44,9 @@ function Customers() {
 
   const fetchCustomers = async () => {
     try {
-      const response = await axios.get(`${API}/customers`);
-      setCustomers(response.data);
-      setFilteredCustomers(response.data);
+      const items = await fetchAllPages('/customers');
+      setCustomers(items);
+      setFilteredCustomers(items);
     } catch (error) {
       toast.error('Müşteriler yüklenemedi');
     }
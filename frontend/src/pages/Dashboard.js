@@ -1,7 +1,7 @@
 import React, { useState, useEffect, useRef } from 'react';
 import { useNavigate } from 'react-router-dom';
 import axios from 'axios';
-import { API } from '../App';
+import { API, imageUrl } from '../App';
 import { toast } from 'sonner';
 import { Card, CardContent, CardHeader, CardTitle } from '../components/ui/card';
 import { Dialog, DialogContent, DialogHeader, DialogTitle } from '../components/ui/dialog';
@@ -338,7 +338,7 @@ function Dashboard() {
                   {foundProduct.image_url && (
                     <div className="relative mb-4">
                       <img 
-                        src={foundProduct.image_url} 
+                        src={imageUrl(foundProduct.image_url)} 
                         alt={foundProduct.name} 
                         className="w-full h-64 object-contain rounded-lg bg-white cursor-pointer hover:opacity-90 transition-opacity" 
                         onClick={() => setImagePreviewOpen(true)}
@@ -376,7 +376,7 @@ function Dashboard() {
           {foundProduct?.image_url && (
             <div className="relative w-full rounded-lg overflow-hidden bg-gray-100">
               <img 
-                src={foundProduct.image_url} 
+                src={imageUrl(foundProduct.image_url)} 
                 alt={foundProduct.name} 
                 className="w-full h-auto max-h-[80vh] object-contain"
               />
@@ -1,6 +1,7 @@
 import React, { useState, useEffect, useRef } from 'react';
 import axios from 'axios';
 import { API } from '../App';
+import { queueSale, flushQueuedSales } from '../lib/offlineSales';
 import { toast } from 'sonner';
 import { Button } from '../components/ui/button';
 import { Input } from '../components/ui/input';
@@ -26,6 +27,28 @@ function POS() {
     barcodeRef.current?.focus();
   }, []);
 
+  useEffect(() => {
+    // Çevrimdışıyken kuyruğa alınan satışları bağlantı gelince gönder
+    const syncQueuedSales = async () => {
+      try {
+        const result = await flushQueuedSales();
+        if (!result) return;
+        toast.success(`${result.created + result.duplicates} çevrimdışı satış senkronize edildi`);
+        if (result.rejected > 0) {
+          toast.error(`${result.rejected} çevrimdışı satış kaydedilemedi`);
+        }
+        if (result.stock_warnings.length > 0) {
+          toast.warning(`Stoğu eksiye düşen ürünler: ${result.stock_warnings.map(p => p.name).join(', ')}`);
+        }
+      } catch (error) {
+        // Bağlantı hâlâ yok: bir sonraki 'online' olayında tekrar denenir
+      }
+    };
+    syncQueuedSales();
+    window.addEventListener('online', syncQueuedSales);
+    return () => window.removeEventListener('online', syncQueuedSales);
+  }, []);
+
   const addProductToCart = async (barcode) => {
     try {
       const response = await axios.get(`${API}/products/barcode/${barcode}`);
@@ -190,27 +213,43 @@ function POS() {
     }
 
     setLoading(true);
-    try {
-      const saleData = {
-        items: cart.map(item => ({
-          product_id: item.id,
-          name: item.name,
-          quantity: item.cartQuantity,
-          price: item.sale_price,
-          total: item.sale_price * item.cartQuantity
-        })),
-        total_amount: calculateTotal(),
-        discount: discount,
-        payment_method: paymentMethod
-      };
+    const saleData = {
+      items: cart.map(item => ({
+        product_id: item.id,
+        name: item.name,
+        quantity: item.cartQuantity,
+        price: item.sale_price,
+        total: item.sale_price * item.cartQuantity
+      })),
+      total_amount: calculateTotal(),
+      discount: discount,
+      payment_method: paymentMethod,
+      // İlk denemeden önce üretilir: cevap kaybolsa da tekrar gönderim aynı satışı kaydetmez
+      client_sale_id: crypto.randomUUID()
+    };
 
+    try {
       await axios.post(`${API}/sales`, saleData);
       toast.success('Satış başarıyla tamamlandı!');
       setCart([]);
       setDiscount(0);
       barcodeRef.current?.focus();
     } catch (error) {
-      toast.error('Satış işlemi başarısız!');
+      if (!error.response) {
+        // Sunucuya ulaşılamadı: satış cihazda saklanır, bağlantı gelince gönderilir
+        queueSale(saleData);
+        toast.warning('Bağlantı yok: satış kaydedildi, bağlantı gelince gönderilecek');
+        setCart([]);
+        setDiscount(0);
+        barcodeRef.current?.focus();
+        return;
+      }
+      const shortages = error.response?.status === 409 ? error.response.data?.detail?.items : null;
+      if (shortages?.length) {
+        toast.error(`Yetersiz stok: ${shortages.map(s => `${s.name || s.product_id} (mevcut: ${s.available})`).join(', ')}`);
+      } else {
+        toast.error('Satış işlemi başarısız!');
+      }
     } finally {
       setLoading(false);
     }
@@ -98,6 +98,21 @@ function Reports() {
     }
   };
 
+  // Stok raporunun tamamı sunucuda dosya olarak üretilir ve akış halinde indirilir
+  const downloadStockReport = async (format) => {
+    try {
+      const params = { format };
+      if (selectedBrand) params.brand = selectedBrand;
+      if (selectedCategory) params.category = selectedCategory;
+
+      const response = await axios.get(`${API}/reports/stock`, { params, responseType: 'blob' });
+      saveAs(response.data, `stok-raporu.${format}`);
+      toast.success('Stok raporu indirildi');
+    } catch (error) {
+      toast.error('Rapor indirilemedi');
+    }
+  };
+
   const exportToExcel = (data, filename) => {
     try {
       const ws = XLSX.utils.json_to_sheet(data);
@@ -319,11 +334,19 @@ function Reports() {
                   <Button
                     variant="outline"
                     size="sm"
-                    onClick={() => exportToExcel(stockReport.products, 'stok-raporu')}
+                    onClick={() => downloadStockReport('xlsx')}
                   >
                     <FileSpreadsheet className="w-4 h-4 mr-2" />
                     Excel
                   </Button>
+                  <Button
+                    variant="outline"
+                    size="sm"
+                    onClick={() => downloadStockReport('csv')}
+                  >
+                    <Download className="w-4 h-4 mr-2" />
+                    CSV
+                  </Button>
                   <Button
                     variant="outline"
                     size="sm"
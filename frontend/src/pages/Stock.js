@@ -1,6 +1,8 @@
 import React, { useState, useEffect, useRef } from 'react';
 import axios from 'axios';
-import { API } from '../App';
+import { API, imageUrl } from '../App';
+import { subscribeInventory, applyInventoryEvent } from '../lib/inventoryFeed';
+import { fetchAllPages } from '../lib/fetchAllPages';
 import { toast } from 'sonner';
 import { Button } from '../components/ui/button';
 import { Input } from '../components/ui/input';
@@ -27,6 +29,8 @@ function Stock() {
   const [aiLoading, setAiLoading] = useState(false);
   const [viewMode, setViewMode] = useState('grid'); // 'grid' or 'list'
   const [showFilters, setShowFilters] = useState(false);
+  const [importing, setImporting] = useState(false);
+  const importInputRef = useRef(null);
   const [scannerDialogOpen, setScannerDialogOpen] = useState(false);
   const [cameraError, setCameraError] = useState('');
   const [scannerMode, setScannerMode] = useState('filter'); // 'filter' or 'form'
@@ -59,6 +63,14 @@ function Stock() {
 
   useEffect(() => {
     fetchProducts();
+    // Başka kasalardaki satış/düzenlemeler listeye anlık yansır
+    return subscribeInventory((type, event) => {
+      if (type === 'reset') {
+        fetchProducts();
+      } else {
+        setProducts((current) => applyInventoryEvent(current, type, event));
+      }
+    });
   }, []);
 
   useEffect(() => {
@@ -67,9 +79,9 @@ function Stock() {
 
   const fetchProducts = async () => {
     try {
-      const response = await axios.get(`${API}/products`);
-      setProducts(response.data);
-      setFilteredProducts(response.data);
+      const items = await fetchAllPages('/products');
+      setProducts(items);
+      setFilteredProducts(items);
     } catch (error) {
       toast.error('Ürünler yüklenemedi');
     } finally {
@@ -379,6 +391,32 @@ function Stock() {
     }
   };
 
+  const handleImportFile = async (e) => {
+    const file = e.target.files[0];
+    e.target.value = '';
+    if (!file) return;
+
+    const body = new FormData();
+    body.append('file', file);
+    setImporting(true);
+    try {
+      // Cevap NDJSON: satır hataları + en sonda özet
+      const response = await axios.post(`${API}/products/import`, body, { responseType: 'text' });
+      const lines = response.data.split('\n').filter(Boolean).map((line) => JSON.parse(line));
+      const summary = lines.find((line) => line.type === 'summary');
+      const errors = lines.filter((line) => line.type === 'error');
+      toast.success(`${summary.inserted} ürün eklendi, ${summary.updated} ürün güncellendi`);
+      if (errors.length > 0) {
+        toast.error(`${errors.length} satır aktarılamadı (ilk hata: satır ${errors[0].row} - ${errors[0].error})`);
+      }
+      fetchProducts();
+    } catch (error) {
+      toast.error(error.response?.data?.detail || 'İçe aktarma başarısız');
+    } finally {
+      setImporting(false);
+    }
+  };
+
   const handleSubmit = async (e) => {
     e.preventDefault();
     setLoading(true);
@@ -478,6 +516,22 @@ function Stock() {
             <Filter className="w-4 h-4 mr-2" />
             Filtrele
           </Button>
+          <Button
+            variant="outline"
+            size="sm"
+            disabled={importing}
+            onClick={() => importInputRef.current?.click()}
+          >
+            <Upload className="w-4 h-4 mr-2" />
+            {importing ? 'Aktarılıyor...' : 'İçe Aktar'}
+          </Button>
+          <input
+            ref={importInputRef}
+            type="file"
+            accept=".csv,.xlsx,.ndjson,.jsonl"
+            onChange={handleImportFile}
+            className="hidden"
+          />
           <div className="flex border rounded-md">
             <Button 
               variant={viewMode === 'grid' ? 'default' : 'ghost'} 
@@ -676,7 +730,7 @@ function Stock() {
                     </Button>
                     {formData.image_base64 && (
                       <div className="relative">
-                        <img src={formData.image_base64} alt="Preview" className="w-20 h-20 object-cover rounded-md" />
+                        <img src={imageUrl(formData.image_base64)} alt="Preview" className="w-20 h-20 object-cover rounded-md" />
                         <Button
                           type="button"
                           variant="destructive"
@@ -778,7 +832,7 @@ function Stock() {
               <CardContent className="pt-6">
                 {product.image_url && (
                   <img 
-                    src={product.image_url} 
+                    src={imageUrl(product.thumbnail_url || product.image_url)} 
                     alt={product.name} 
                     className="w-full h-40 object-cover rounded-md mb-3 cursor-pointer hover:opacity-80 transition-opacity" 
                     onClick={() => openProductDetail(product)}
@@ -850,7 +904,7 @@ function Stock() {
                       <td className="px-6 py-4 whitespace-nowrap">
                         {product.image_url ? (
                           <img 
-                            src={product.image_url} 
+                            src={imageUrl(product.thumbnail_url || product.image_url)} 
                             alt={product.name} 
                             className="w-16 h-16 object-cover rounded cursor-pointer hover:opacity-80 transition-opacity" 
                             onClick={() => openProductDetail(product)}
@@ -1045,7 +1099,7 @@ function Stock() {
               {selectedProductDetail.image_url && (
                 <div className="relative w-full rounded-lg overflow-hidden bg-gray-100">
                   <img 
-                    src={selectedProductDetail.image_url} 
+                    src={imageUrl(selectedProductDetail.image_url)} 
                     alt={selectedProductDetail.name} 
                     className="w-full h-auto max-h-[500px] object-contain"
                   />
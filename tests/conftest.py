@@ -0,0 +1,90 @@
+"""Backend testleri: MongoDB yerine süreç içi mongomock-motor kullanılır"""
+import asyncio
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "stokcrm_test")
+os.environ.setdefault("JWT_SECRET", "test-secret")
+os.environ.setdefault("LLM_BACKEND", "fake")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+import httpx  # noqa: E402
+import pytest  # noqa: E402
+from aiohttp import web  # noqa: E402
+from aiohttp.test_utils import TestServer  # noqa: E402
+from mongomock_motor import AsyncMongoMockClient  # noqa: E402
+
+import server  # noqa: E402
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def db(monkeypatch):
+    client = AsyncMongoMockClient()
+    monkeypatch.setattr(server, "client", client)
+    monkeypatch.setattr(server, "db", client[os.environ["DB_NAME"]])
+    monkeypatch.setattr(server, "_transactions_supported", False)
+    server.user_cache.clear()
+    server.barcode_cache.clear()
+    await server.ensure_indexes()
+    yield server.db
+    # Paylaşılan aiohttp oturumu testin event loop'una bağlıdır
+    if server.http_session:
+        await server.http_session.close()
+        server.http_session = None
+
+
+@pytest.fixture
+async def api(db):
+    """Yönetici olarak giriş yapmış API istemcisi"""
+    user_id = str(uuid.uuid4())
+    await db.users.insert_one({
+        "id": user_id,
+        "username": f"test-{user_id[:8]}",
+        "password": "-",
+        "role": "yönetici",
+        "created_at": datetime.now(timezone.utc),
+    })
+    headers = {"Authorization": f"Bearer {server.create_access_token({'sub': user_id})}"}
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test", headers=headers) as c:
+        yield c
+
+
+@pytest.fixture
+async def stub_server():
+    """Dış servisler yerine yerel aiohttp sunucusu; {yol: handler} alır, {yol: URL} döner"""
+    servers = []
+
+    async def start(routes):
+        app = web.Application()
+        for path, handler in routes.items():
+            app.router.add_get(path, handler)
+        test_server = TestServer(app)
+        await test_server.start_server()
+        servers.append(test_server)
+        return {path: str(test_server.make_url(path)) for path in routes}
+
+    yield start
+    for test_server in servers:
+        await test_server.close()
+
+
+async def wait_for_job(db, job_id, timeout=5):
+    """İş running durumundan çıkana kadar bekler, son halini döner"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = await db.jobs.find_one({"id": job_id}, {"_id": 0})
+        if job["status"] != "running":
+            return job
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"job {job_id} did not finish")
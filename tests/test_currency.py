@@ -0,0 +1,98 @@
+import asyncio
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from aiohttp import web
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+N = 20
+
+
+class RatesStub:
+    """Yerel döviz ve metal fiyatı servisi; gate açılana kadar yanıt vermez"""
+
+    def __init__(self):
+        self.calls = Counter()
+        self.gate = asyncio.Event()
+        self.gate.set()
+        self.status = 200
+        self.usd = 0.025
+
+    async def fx(self, request):
+        self.calls["fx"] += 1
+        await self.gate.wait()
+        if self.status != 200:
+            return web.json_response({"error": "stub"}, status=self.status)
+        return web.json_response({"rates": {"USD": self.usd, "EUR": 0.02}})
+
+    async def metal(self, request):
+        self.calls["metal"] += 1
+        await self.gate.wait()
+        return web.json_response({"success": True, "rates": {"XAU": 0.0005, "XAG": 0.04}})
+
+
+@pytest.fixture
+async def rates(db, stub_server, monkeypatch):
+    stub = RatesStub()
+    urls = await stub_server({"/fx": stub.fx, "/metal": stub.metal})
+    monkeypatch.setattr(server, "EXCHANGE_RATE_API_URL", urls["/fx"])
+    monkeypatch.setattr(server, "METAL_PRICE_API_URL", urls["/metal"])
+    monkeypatch.setattr(server, "currency_refresh", None)
+    monkeypatch.setitem(server.currency_cache, "data", None)
+    monkeypatch.setitem(server.currency_cache, "timestamp", None)
+    yield stub
+    stub.gate.set()
+
+
+def stale_cache(usd_try):
+    server.currency_cache["data"] = {"usd_try": usd_try, "eur_try": 50.0, "gold_try": 1.0, "silver_try": 1.0,
+                                     "timestamp": "old"}
+    server.currency_cache["timestamp"] = datetime.now(timezone.utc) - timedelta(seconds=server.CURRENCY_TTL + 1)
+
+
+async def test_concurrent_cold_requests_share_one_upstream_call(api, rates):
+    rates.gate.clear()
+    requests = [asyncio.create_task(api.get("/api/currency")) for _ in range(N)]
+    while not rates.calls:
+        await asyncio.sleep(0.01)
+    await asyncio.sleep(0.05)
+    rates.gate.set()
+    responses = await asyncio.gather(*requests)
+
+    assert rates.calls == {"fx": 1, "metal": 1}
+    assert {response.json()["usd_try"] for response in responses} == {40.0}
+
+
+async def test_stale_value_is_served_while_refreshing(api, rates):
+    stale_cache(30.0)
+    rates.gate.clear()
+
+    responses = await asyncio.gather(*(api.get("/api/currency") for _ in range(N)))
+
+    # Yenileme sürerken hepsi beklemeden eski değeri alır
+    assert {response.json()["usd_try"] for response in responses} == {30.0}
+    assert not server.currency_refresh.done()
+    rates.gate.set()
+    await server.currency_refresh
+    assert rates.calls == {"fx": 1, "metal": 1}
+    assert (await api.get("/api/currency")).json()["usd_try"] == 40.0
+
+
+@pytest.mark.parametrize("failure", ["http_error", "unreachable"])
+async def test_last_good_value_is_kept_when_upstream_fails(api, rates, monkeypatch, failure):
+    stale_cache(30.0)
+    if failure == "http_error":
+        rates.status = 503
+    else:
+        monkeypatch.setattr(server, "EXCHANGE_RATE_API_URL", "http://127.0.0.1:9/fx")
+
+    assert (await api.get("/api/currency")).json()["usd_try"] == 30.0
+    with pytest.raises(Exception):
+        await server.currency_refresh
+
+    assert server.currency_cache["data"]["usd_try"] == 30.0
+    assert (await api.get("/api/currency")).json()["usd_try"] == 30.0
@@ -0,0 +1,154 @@
+import asyncio
+
+import pytest
+
+import server
+from tests.conftest import wait_for_job
+
+pytestmark = pytest.mark.anyio
+
+
+class FakeLlm:
+    """LLM_BACKEND=fake üzerine sayaç: çağrıları kaydeder, istenen ürünlerde hata verir veya bekler"""
+
+    def __init__(self):
+        self.calls = []
+        self.failures = {}
+        self.blocked = {}
+
+    async def __call__(self, system_message, prompt):
+        name = prompt.split("\n", 1)[0].removeprefix("Ürün Adı: ")
+        self.calls.append(name)
+        if name in self.blocked:
+            await self.blocked.pop(name).wait()
+        if self.failures.get(name):
+            self.failures[name] -= 1
+            raise RuntimeError("rate limited")
+        return await fake_llm_complete(system_message, prompt)
+
+
+fake_llm_complete = server.fake_llm_complete
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    assert server.LLM_BACKEND == "fake"
+    fake = FakeLlm()
+    monkeypatch.setattr(server, "fake_llm_complete", fake)
+    monkeypatch.setattr(server, "LLM_BACKOFF_SECONDS", 0)
+    return fake
+
+
+async def add_products(db, names, brand="Marka", category="Tansiyon"):
+    await db.products.insert_many([{
+        "id": f"p{index}",
+        "barcode": f"869{index:010d}",
+        "name": name,
+        "brand": brand,
+        "category": category,
+        "description": "",
+    } for index, name in enumerate(names)])
+
+
+
+async def descriptions(db):
+    return {p["id"]: p["description"] async for p in db.products.find({}, {"_id": 0, "id": 1, "description": 1})}
+
+
+async def test_cache_hit_skips_llm(api, db, llm):
+    first = await api.post("/api/products/generate-description",
+                           json={"name": "Tansiyon Aleti", "brand": "Omron", "category": "Tansiyon"})
+    # Büyük/küçük harf ve boşluk farkı aynı önbellek anahtarına düşer
+    second = await api.post("/api/products/generate-description",
+                            json={"name": "  TANSİYON  aleti", "brand": "omron", "category": "tansiyon"})
+
+    assert first.json()["cached"] is False
+    assert second.json() == {"description": first.json()["description"], "cached": True}
+    assert llm.calls == ["Tansiyon Aleti"]
+    assert await db.ai_descriptions.count_documents({}) == 1
+
+
+async def test_job_reuses_cached_descriptions(api, db, llm, monkeypatch):
+    monkeypatch.setattr(server, "LLM_FAKE_LATENCY", 0.05)
+    await add_products(db, ["Ateş Ölçer", "ateş ölçer", "Nebulizatör"])
+
+    response = await api.post("/api/products/descriptions/jobs", json={"category": "Tansiyon"})
+    job = await wait_for_job(db, response.json()["id"])
+
+    assert (job["status"], job["total"], job["processed"], job["failed"]) == ("completed", 3, 3, 0)
+    # Aynı anahtarlı iki ürün eşzamanlı işlense de LLM bir kez çağrılır
+    assert sorted(llm.calls) == ["Ateş Ölçer", "Nebulizatör"]
+    saved = await descriptions(db)
+    assert saved["p0"] == saved["p1"] != ""
+    assert all(saved.values())
+
+
+async def test_retries_with_exponential_backoff(db, llm, monkeypatch):
+    monkeypatch.setattr(server, "LLM_BACKOFF_SECONDS", 0.01)
+    monkeypatch.setattr(server.random, "random", lambda: 0.5)
+    delays = []
+    sleep = asyncio.sleep
+
+    async def record_sleep(delay):
+        delays.append(delay)
+        await sleep(0)
+
+    monkeypatch.setattr(server.asyncio, "sleep", record_sleep)
+    llm.failures["Ateş Ölçer"] = 2
+
+    description, cached = await server.product_description("Ateş Ölçer", "Marka", "Ateş")
+
+    assert not cached and description
+    assert llm.calls == ["Ateş Ölçer"] * 3
+    assert delays == [0.01, 0.02]
+
+
+async def test_failed_products_are_counted_and_left_empty(api, db, llm):
+    await add_products(db, ["Ateş Ölçer", "Nebulizatör"])
+    llm.failures["Nebulizatör"] = server.LLM_MAX_ATTEMPTS
+
+    response = await api.post("/api/products/descriptions/jobs")
+    job = await wait_for_job(db, response.json()["id"])
+
+    assert (job["status"], job["processed"], job["failed"]) == ("completed", 2, 1)
+    assert llm.calls.count("Nebulizatör") == server.LLM_MAX_ATTEMPTS
+    assert (await descriptions(db))["p1"] == ""
+    assert await db.ai_descriptions.count_documents({}) == 1
+
+
+async def test_job_resumes_where_it_stopped(api, db, llm, monkeypatch):
+    monkeypatch.setattr(server, "LLM_CONCURRENCY", 1)
+    names = [f"Ürün {index}" for index in range(6)]
+    await add_products(db, names)
+    gate = llm.blocked["Ürün 3"] = asyncio.Event()
+
+    job_id = (await api.post("/api/products/descriptions/jobs")).json()["id"]
+    while "Ürün 3" not in llm.calls:
+        await asyncio.sleep(0.01)
+    # Süreç kapandı: görev ölür, açılışta iş interrupted işaretlenir
+    server.background_jobs[job_id][1].cancel()
+    await asyncio.sleep(0)
+    await server.startup_mark_interrupted_jobs()
+    interrupted = await db.jobs.find_one({"id": job_id})
+    assert (interrupted["status"], interrupted["processed"]) == ("interrupted", 3)
+    # Gerçek kapanışta yarım kalan LLM çağrısı da ölür; aynı süreçteki testte bırakılır
+    server.description_requests.clear()
+
+    response = await api.post(f"/api/products/descriptions/jobs/{job_id}/resume")
+    assert response.status_code == 200
+    job = await wait_for_job(db, job_id)
+
+    assert (job["status"], job["total"], job["processed"], job["failed"]) == ("completed", 3, 3, 0)
+    # Yazılmış açıklamalar tekrar üretilmez; yalnızca yarıda kalan ürün ikinci kez istenir
+    assert llm.calls == names[:4] + names[3:]
+    assert all((await descriptions(db)).values())
+    gate.set()
+
+
+async def test_jobs_require_administrator(api, db, llm):
+    await db.users.update_many({}, {"$set": {"role": "satış"}})
+    server.user_cache.clear()
+
+    assert (await api.post("/api/products/descriptions/jobs")).status_code == 403
+    assert (await api.post("/api/products/descriptions/jobs/missing/resume")).status_code == 403
+    assert llm.calls == []
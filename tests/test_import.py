@@ -0,0 +1,69 @@
+import json
+import threading
+from io import BytesIO
+
+import pytest
+from openpyxl import Workbook
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+HEADER = ["barcode", "name", "quantity", "min_quantity", "brand", "category", "purchase_price", "sale_price"]
+
+
+def workbook_bytes(rows):
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(HEADER)
+    for row in rows:
+        sheet.append(row)
+    output = BytesIO()
+    workbook.save(output)
+    return output.getvalue()
+
+
+async def upload(api, name, content):
+    response = await api.post("/api/products/import", files={"file": (name, content)})
+    assert response.status_code == 200
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+async def test_xlsx_is_parsed_off_the_event_loop(api, db, monkeypatch):
+    monkeypatch.setattr(server, "IMPORT_CHUNK_SIZE", 2)
+    threads = []
+    load_workbook, import_records = server.load_workbook, server.import_records
+
+    def recording_load_workbook(*args, **kwargs):
+        threads.append(threading.current_thread())
+        return load_workbook(*args, **kwargs)
+
+    def recording_import_records(*args):
+        for record in import_records(*args):
+            threads.append(threading.current_thread())
+            yield record
+
+    monkeypatch.setattr(server, "load_workbook", recording_load_workbook)
+    monkeypatch.setattr(server, "import_records", recording_import_records)
+    rows = [[f"86900000{index}", f"Ürün {index}", 5, 1, "Marka", "Kategori", 10, 15] for index in range(5)]
+    rows.append(["869000001", "Tekrar", 1, 1, "Marka", "Kategori", 10, 15])
+
+    lines = await upload(api, "katalog.xlsx", workbook_bytes(rows))
+
+    # Dosya açma ve her satırın ayrıştırılması thread havuzunda
+    assert len(threads) == 1 + 6 and threading.main_thread() not in threads
+    assert [line["row"] for line in lines if line["type"] == "error"] == [7]
+    assert {k: lines[-1][k] for k in ("type", "rows", "inserted", "failed")} == \
+        {"type": "summary", "rows": 6, "inserted": 5, "failed": 1}
+    assert await db.products.count_documents({}) == 5
+
+
+async def test_csv_updates_existing_products(api, db):
+    await upload(api, "katalog.csv", "barcode;name;quantity;min_quantity;brand;category;purchase_price;sale_price\n"
+                                     "8690001;Ürün;5;1;Marka;Kategori;10;15\n".encode())
+
+    lines = await upload(api, "katalog.csv", b"barcode;quantity\n8690001;0\n")
+
+    assert lines[-1]["updated"] == 1
+    product = await db.products.find_one({"barcode": "8690001"})
+    assert (product["quantity"], product["is_low_stock"]) == (0, True)
@@ -0,0 +1,35 @@
+import pytest
+from prometheus_client.parser import text_string_to_metric_families
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+
+def samples(text):
+    return {
+        (sample.name, tuple(sorted(sample.labels.items()))): sample.value
+        for family in text_string_to_metric_families(text)
+        for sample in family.samples
+    }
+
+
+async def test_metrics_record_route_timings(api, db):
+    assert (await api.get("/api/products")).status_code == 200
+
+    response = await api.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    values = samples(response.text)
+    route = (("method", "GET"), ("route", "/api/products"), ("status", "200"))
+    assert values[("http_request_duration_seconds_count", route)] >= 1
+    assert values[("http_request_duration_seconds_bucket", (("le", "+Inf"), *route))] >= 1
+    assert values[("http_requests_in_flight", (("method", "GET"), ("route", "/api/products")))] == 0
+
+
+async def test_metrics_token(api, monkeypatch):
+    monkeypatch.setattr(server, "METRICS_TOKEN", "secret")
+
+    assert (await api.get("/metrics")).status_code == 401
+    assert (await api.get("/metrics", headers={"Authorization": "Bearer secret"})).status_code == 200
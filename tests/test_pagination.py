@@ -0,0 +1,46 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def sales(db, monkeypatch):
+    monkeypatch.setattr(server, "DEFAULT_PAGE_SIZE", 2)
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    docs = [{
+        "id": f"s{index}",
+        "items": [],
+        "total_amount": 10.0,
+        "discount": 0,
+        "final_amount": 10.0,
+        "payment_method": "nakit",
+        "customer_id": None,
+        "cashier_id": "cashier",
+        "created_at": start + timedelta(minutes=index),
+    } for index in range(5)]
+    await db.sales.insert_many([dict(doc) for doc in docs])
+    return docs
+
+
+async def test_list_without_limit_is_paged(api, sales):
+    pages, after = [], None
+    while True:
+        response = await api.get("/api/sales", params={"after": after} if after else None)
+        pages.append([sale["id"] for sale in response.json()])
+        after = response.headers.get("X-Next-Cursor")
+        if not after:
+            break
+
+    assert pages == [["s4", "s3"], ["s2", "s1"], ["s0"]]
+
+
+async def test_stream_returns_everything(api, sales):
+    response = await api.get("/api/sales", params={"stream": "true"})
+
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert [json.loads(line)["id"] for line in response.text.splitlines()] == ["s4", "s3", "s2", "s1", "s0"]
@@ -0,0 +1,178 @@
+import asyncio
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from aiohttp import web
+
+import server
+from tests.conftest import wait_for_job
+
+pytestmark = pytest.mark.anyio
+
+
+class SerpApiStub:
+    """Yerel SerpAPI: sorgu başına sıradaki (status, gövde) yanıtını döner, yoksa tek sonuç"""
+
+    def __init__(self):
+        self.responses = {}
+        self.requests = []
+        self.blocked = {}
+
+    async def handle(self, request):
+        query = request.query["q"]
+        self.requests.append((query, time.monotonic()))
+        if query in self.blocked:
+            await self.blocked.pop(query).wait()
+        queued = self.responses.get(query)
+        status, body = queued.pop(0) if queued else (200, None)
+        if status != 200:
+            return web.json_response({"error": "stub"}, status=status, headers={"Retry-After": "0"})
+        if body is None:
+            body = {"shopping_results": [
+                {"source": "Site B", "price": "₺1.250,00", "link": "https://b", "title": query},
+                {"source": "Site A", "price": "₺999,90", "link": "https://a", "title": query},
+            ]}
+        return web.json_response(body)
+
+    def calls(self):
+        return Counter(query for query, _ in self.requests)
+
+
+@pytest.fixture
+async def serpapi(stub_server, monkeypatch):
+    stub = SerpApiStub()
+    urls = await stub_server({"/search.json": stub.handle})
+    monkeypatch.setattr(server, "SERPAPI_URL", urls["/search.json"])
+    monkeypatch.setattr(server, "HTTP_RETRY_BACKOFF_SECONDS", 0)
+    monkeypatch.setattr(server, "serpapi_limiter", server.RateLimiter(0))
+    monkeypatch.setenv("SERPAPI_KEY", "test-key")
+    return stub
+
+
+async def add_products(db, count, category="Tansiyon", start=0):
+    products = [{
+        "id": f"p{index}",
+        "name": f"Ürün {index}",
+        "brand": "Marka",
+        "category": category,
+        "sale_price": 1000.0,
+        "barcode": f"869{index:010d}",
+    } for index in range(start, start + count)]
+    await db.products.insert_many([dict(product) for product in products])
+    return products
+
+
+
+async def test_retries_429_and_5xx(db, serpapi):
+    product = (await add_products(db, 1))[0]
+    serpapi.responses["Marka Ürün 0"] = [(429, None), (503, None)]
+
+    result = await server.compare_product_prices(product, "test-key")
+
+    assert serpapi.calls()["Marka Ürün 0"] == 3
+    assert result["source"] == "SerpAPI Google Shopping"
+    assert [row["price"] for row in result["price_results"]] == [999.9, 1250.0]
+
+
+async def test_gives_up_after_max_attempts_and_skips_client_errors(db, serpapi, monkeypatch):
+    monkeypatch.setattr(server, "SERPAPI_MAX_ATTEMPTS", 2)
+    first, second = await add_products(db, 2)
+    serpapi.responses["Marka Ürün 0"] = [(500, None)] * 5
+    serpapi.responses["Marka Ürün 1"] = [(401, None)]
+
+    results = [await server.compare_product_prices(product, "test-key") for product in (first, second)]
+
+    assert serpapi.calls() == {"Marka Ürün 0": 2, "Marka Ürün 1": 1}
+    assert all(result["source"].startswith("Manuel Arama") for result in results)
+    assert await db.price_comparisons.count_documents({}) == 0
+
+
+async def test_rate_limit_spaces_requests(db, serpapi, monkeypatch):
+    monkeypatch.setattr(server, "serpapi_limiter", server.RateLimiter(20))
+    products = await add_products(db, 6)
+
+    started = time.monotonic()
+    await asyncio.gather(*(server.compare_product_prices(product, "test-key") for product in products))
+
+    arrived = sorted(at for _, at in serpapi.requests)
+    assert len(arrived) == 6
+    # 20/sn: altı istek aynı anda başlasa da son istek ~250 ms sonra gider
+    assert arrived[-1] - started >= 0.24
+    assert arrived[-1] - arrived[0] >= 0.2
+
+
+async def test_job_writes_result_documents(api, db, serpapi):
+    await add_products(db, 3)
+    await add_products(db, 1, category="Diğer", start=3)
+    await db.products.update_one({"id": "p0"}, {"$set": {"id": "empty", "name": "Boş"}})
+    serpapi.responses["Marka Boş"] = [(200, {"shopping_results": []})]
+
+    response = await api.post("/api/price-comparison/jobs", json={"category": "Tansiyon"})
+    job = await wait_for_job(db, response.json()["id"])
+
+    assert job["status"] == "completed"
+    assert (job["total"], job["processed"], job["failed"]) == (3, 3, 1)
+    docs = {doc["_id"]: doc async for doc in db.price_comparisons.find()}
+    assert set(docs) == {"p1", "p2"}
+    assert docs["p1"]["query"] == "Marka Ürün 1"
+    assert [row["site"] for row in docs["p1"]["price_results"]] == ["Site A", "Site B"]
+    assert docs["p1"]["created_at"] is not None
+
+    # Önbellekteki sonuçlar ikinci işte SerpAPI'ye tekrar sorulmaz
+    response = await api.post("/api/price-comparison/jobs", json={"category": "Tansiyon"})
+    await wait_for_job(db, response.json()["id"])
+    assert serpapi.calls() == {"Marka Boş": 2, "Marka Ürün 1": 1, "Marka Ürün 2": 1}
+
+
+async def test_job_requires_admin_and_rejects_concurrent_start(api, db, serpapi):
+    await add_products(db, 1)
+    serpapi.blocked["Marka Ürün 0"] = asyncio.Event()
+    gate = serpapi.blocked["Marka Ürün 0"]
+
+    first = await api.post("/api/price-comparison/jobs", json={})
+    second = await api.post("/api/price-comparison/jobs", json={})
+    invalid = await api.post("/api/price-comparison/jobs", json={"brand": {"$ne": None}})
+    gate.set()
+    await wait_for_job(db, first.json()["id"])
+
+    assert second.status_code == 409
+    assert second.json()["detail"]["job_id"] == first.json()["id"]
+    assert invalid.status_code == 422
+
+    await db.users.update_many({}, {"$set": {"role": "satış"}})
+    server.user_cache.clear()
+    assert (await api.post("/api/price-comparison/jobs", json={})).status_code == 403
+
+
+async def test_refresh_job_resumes_after_restart(api, db, serpapi, monkeypatch):
+    monkeypatch.setattr(server, "PRICE_COMPARISON_CONCURRENCY", 1)
+    products = await add_products(db, 5)
+    stale = datetime.now(timezone.utc) - timedelta(hours=1)
+    await db.price_comparisons.insert_many([
+        {"_id": p["id"], "query": f"Marka {p['name']}", "price_results": [], "created_at": stale} for p in products
+    ])
+    serpapi.blocked["Marka Ürün 2"] = asyncio.Event()
+
+    job_id = (await api.post("/api/price-comparison/jobs", json={"refresh": True})).json()["id"]
+    while "Marka Ürün 2" not in serpapi.calls():
+        await asyncio.sleep(0.01)
+    # Süreç kapandı: görev ölür, açılışta iş interrupted işaretlenir
+    server.background_jobs[job_id][1].cancel()
+    await asyncio.sleep(0)
+    await server.startup_mark_interrupted_jobs()
+    assert (await db.jobs.find_one({"id": job_id}))["status"] == "interrupted"
+
+    response = await api.post(f"/api/price-comparison/jobs/{job_id}/resume")
+    assert response.status_code == 200
+    job = await wait_for_job(db, job_id)
+
+    assert job["status"] == "completed"
+    assert (job["processed"], job["failed"], job["resumed"]) == (5, 0, 1)
+    # Bu işte yenilenmiş ürünler tekrar sorulmaz; yarıda kalan ve kalanlar sorulur
+    assert serpapi.calls() == {"Marka Ürün 0": 1, "Marka Ürün 1": 1, "Marka Ürün 2": 2,
+                               "Marka Ürün 3": 1, "Marka Ürün 4": 1}
+    assert await db.price_comparisons.count_documents({"created_at": {"$lte": stale}}) == 0
+    # Tamamlanmış iş tekrar sürdürülemez
+    assert (await api.post(f"/api/price-comparison/jobs/{job_id}/resume")).status_code == 404
@@ -0,0 +1,92 @@
+from datetime import datetime, timezone
+
+import pytest
+from pymongo import UpdateOne
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+
+async def add_product(db, product_id, quantity, daily_demand, reorder_point):
+    now = datetime.now(timezone.utc)
+    await db.products.insert_one({
+        "id": product_id, "name": product_id, "barcode": f"869{product_id}", "quantity": quantity,
+        "min_quantity": 1, "brand": "Marka", "category": "Kategori", "purchase_price": 10.0,
+        "sale_price": 15.0, "created_at": now, "updated_at": now,
+    })
+    # Tahmin işi gibi: alanlar pipeline update ile yazılır, bayraklar aynı update'te hesaplanır
+    await db.products.bulk_write([UpdateOne({"id": product_id}, server.set_fields_update({
+        "reorder_point": reorder_point, "forecast": {"daily_demand": daily_demand},
+    }))])
+
+
+async def test_flags_follow_stock_changes(api, db):
+    await add_product(db, "fast", quantity=12, daily_demand=2.0, reorder_point=10)
+    await add_product(db, "idle", quantity=0, daily_demand=0.0, reorder_point=0)
+
+    product = await db.products.find_one({"id": "fast"})
+    assert (product["needs_reorder"], product["days_of_cover"]) == (False, 6.0)
+    assert (await db.products.find_one({"id": "idle"}))["days_of_cover"] is None
+
+    response = await api.post("/api/sales", json={
+        "items": [{"product_id": "fast", "name": "fast", "quantity": 3, "price": 15, "total": 45}],
+        "total_amount": 45, "payment_method": "nakit",
+    })
+    assert response.status_code == 200
+
+    product = await db.products.find_one({"id": "fast"})
+    assert (product["quantity"], product["needs_reorder"], product["days_of_cover"]) == (9, True, 4.5)
+
+
+async def test_report_reads_flagged_products_by_days_of_cover(api, db):
+    await add_product(db, "a", quantity=9, daily_demand=1.0, reorder_point=10)
+    await add_product(db, "b", quantity=3, daily_demand=3.0, reorder_point=10)
+    await add_product(db, "c", quantity=50, daily_demand=1.0, reorder_point=10)
+    await add_product(db, "d", quantity=5, daily_demand=0.0, reorder_point=0)
+
+    needed = (await api.get("/api/reports/reorder")).json()["products"]
+    everything = (await api.get("/api/reports/reorder", params={"only_needed": "false"})).json()["products"]
+
+    assert [(p["id"], p["days_of_cover"]) for p in needed] == [("b", 1.0), ("a", 9.0)]
+    assert [p["id"] for p in everything] == ["b", "a", "c"]
+
+
+async def test_product_update_returns_and_publishes_new_flags(api, db):
+    await add_product(db, "fast", quantity=12, daily_demand=2.0, reorder_point=10)
+
+    response = await api.put("/api/products/fast", json={"quantity": 4})
+
+    assert response.status_code == 200
+    product = response.json()
+    assert (product["needs_reorder"], product["days_of_cover"]) == (True, 2.0)
+    event = server.inventory_feed["backlog"][-1]
+    assert event["id"] == "fast"
+    assert (event["changes"]["is_low_stock"], event["changes"]["needs_reorder"], event["changes"]["days_of_cover"]) == (False, True, 2.0)
+
+
+async def test_report_tolerates_products_forecast_before_flags(api, db):
+    await add_product(db, "a", quantity=9, daily_demand=1.0, reorder_point=10)
+    # Bayraklar eklenmeden önce tahmini yazılmış ürün
+    await db.products.insert_one({"id": "legacy", "name": "legacy", "barcode": "869legacy", "quantity": 5,
+                                  "min_quantity": 1, "reorder_point": 10, "forecast": {"daily_demand": 1.0}})
+
+    response = await api.get("/api/reports/reorder", params={"only_needed": "false"})
+
+    assert response.status_code == 200
+    assert {p["id"]: p.get("days_of_cover") for p in response.json()["products"]} == {"legacy": None, "a": 9.0}
+
+
+async def test_cached_barcode_follows_sale_flags(api, db):
+    await add_product(db, "fast", quantity=12, daily_demand=2.0, reorder_point=10)
+    cached = (await api.get("/api/products/barcode/869fast")).json()
+    assert (cached["quantity"], cached["needs_reorder"], cached["days_of_cover"]) == (12, False, 6.0)
+
+    await api.post("/api/sales", json={
+        "items": [{"product_id": "fast", "name": "fast", "quantity": 3, "price": 15, "total": 45}],
+        "total_amount": 45, "payment_method": "nakit",
+    })
+
+    # Satış kaydı önbellekten atmaz, yerinde günceller
+    product = server.barcode_cache["869fast"]
+    assert (product.quantity, product.needs_reorder, product.days_of_cover) == (9, True, 4.5)
@@ -0,0 +1,53 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+
+def sale(product_id, quantity, created_at):
+    return {
+        "id": f"{product_id}-{created_at.isoformat()}", "customer_id": None, "final_amount": 15 * quantity,
+        "created_at": created_at,
+        "items": [{"product_id": product_id, "name": product_id, "quantity": quantity,
+                   "price": 15, "total": 15 * quantity, "purchase_price": 10}],
+    }
+
+
+async def add_sales(db, docs):
+    await db.sales.insert_many([dict(doc) for doc in docs])
+    await server.apply_sale_totals(docs)
+
+
+async def test_reports_share_exact_timestamp_boundaries(api, db):
+    day = datetime(2026, 3, 1, tzinfo=timezone.utc)
+    hours = [-30, 6, 20, 30, 54, 60, 80, 90]  # 27 Şubat - 4 Mart
+    await add_sales(db, [sale("a", quantity, day + timedelta(hours=hour)) for quantity, hour in enumerate(hours, 1)]
+                    + [sale("b", 1, day + timedelta(hours=hour)) for hour in hours])
+
+    params = {"start_date": (day + timedelta(hours=12)).isoformat(), "end_date": (day + timedelta(hours=60)).isoformat()}
+    top = {row["_id"]: row["total_quantity"] for row in (await api.get("/api/reports/top-selling", params=params)).json()}
+    profit = {row["product_id"]: row["total_profit"] for row in (await api.get("/api/reports/top-profit", params=params)).json()}
+    over_time = (await api.get("/api/reports/sales-over-time", params=params)).json()
+    single = (await api.get("/api/reports/sales-over-time", params={**params, "product_id": "a"})).json()
+
+    # 1 Mart 20:00, 2 Mart 06:00, 3 Mart 06:00 ve 3 Mart 12:00 (end dahil)
+    assert top == {"a": 3 + 4 + 5 + 6, "b": 4}
+    assert [(row["day"], row["quantity"]) for row in over_time] == [
+        ("2026-03-01", 3 + 1), ("2026-03-02", 4 + 1), ("2026-03-03", 5 + 6 + 2)
+    ]
+    assert sum(row["quantity"] for row in over_time) == sum(top.values())
+    assert sum(row["profit"] for row in over_time) == sum(profit.values())
+    assert [row["quantity"] for row in single] == [3, 4, 11]
+
+
+async def test_sales_over_time_within_one_day(api, db):
+    day = datetime(2026, 3, 1, tzinfo=timezone.utc)
+    await add_sales(db, [sale("a", 1, day + timedelta(hours=hour)) for hour in (1, 5, 9, 23)])
+
+    params = {"start_date": (day + timedelta(hours=5)).isoformat(), "end_date": (day + timedelta(hours=9)).isoformat()}
+    over_time = (await api.get("/api/reports/sales-over-time", params=params)).json()
+
+    assert over_time == [{"day": "2026-03-01", "quantity": 2, "revenue": 30, "cost": 20, "profit": 10}]
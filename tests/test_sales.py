@@ -0,0 +1,65 @@
+import pytest
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+
+async def add_product(api, barcode="8690000000001", quantity=10):
+    response = await api.post("/api/products", json={
+        "name": "Ürün", "barcode": barcode, "quantity": quantity, "min_quantity": 1,
+        "brand": "Marka", "category": "Kategori", "purchase_price": 10, "sale_price": 15,
+    })
+    assert response.status_code == 200
+    return response.json()
+
+
+def sale_payload(product, quantity=2, client_sale_id="till-1"):
+    return {
+        "items": [{"product_id": product["id"], "name": product["name"], "quantity": quantity,
+                   "price": 15, "total": 15 * quantity}],
+        "total_amount": 15 * quantity,
+        "payment_method": "nakit",
+        "client_sale_id": client_sale_id,
+    }
+
+
+async def stock(db, product):
+    return (await db.products.find_one({"id": product["id"]}))["quantity"]
+
+
+async def test_retried_sale_is_recorded_once(api, db):
+    product = await add_product(api)
+    first = await api.post("/api/sales", json=sale_payload(product))
+    # Cevap kayboldu, kasa aynı satışı tekrar gönderiyor
+    second = await api.post("/api/sales", json=sale_payload(product))
+
+    assert first.status_code == second.status_code == 200
+    assert first.json()["id"] == second.json()["id"]
+    assert await db.sales.count_documents({}) == 1
+    assert await stock(db, product) == 8
+
+
+async def test_queued_replay_of_committed_sale_is_duplicate(api, db):
+    product = await add_product(api)
+    created = (await api.post("/api/sales", json=sale_payload(product))).json()
+
+    response = await api.post("/api/sales/sync", json={"sales": [sale_payload(product)]})
+
+    assert response.json()["results"] == [{"client_sale_id": "till-1", "status": "duplicate", "sale_id": created["id"]}]
+    assert await stock(db, product) == 8
+    day = await db.sales_daily.find_one({})
+    assert day["sales_count"] == 1
+
+
+async def test_concurrent_duplicate_restores_stock(api, db):
+    product = await add_product(api)
+    await api.post("/api/sales", json=sale_payload(product))
+    doc = server.sale_document(server.new_sale({**sale_payload(product), "discount": 0}, "cashier", {}))
+
+    # Ön kontrolü geçmiş eşzamanlı istek: satış yazılamaz, düşülen stok geri eklenir
+    with pytest.raises(server.DuplicateKeyError):
+        await server.commit_sale_without_transaction(doc, {product["id"]: 2})
+
+    assert await stock(db, product) == 8
+    assert (await db.sales_daily.find_one({}))["sales_count"] == 1